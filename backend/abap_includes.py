@@ -0,0 +1,171 @@
+import os
+import re
+import logging
+from typing import Dict, Any, List, Optional, Set, Tuple, Iterable
+
+from abap_source import split_statements, _starts_with
+from abap_static_analyzer import chain_parts, tokenize, analyze_abap_source
+from llm_transport import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Comment line standing in for a shared include whose facts are sent separately
+SUMMARIZED_INCLUDE_MARKER = '* INCLUDE {name}: include bersama, lihat "Fakta include bersama"'
+
+
+def include_references(raw_code: str) -> List[Tuple[int, int, List[str]]]:
+    """(first line, last line, include names) of every INCLUDE statement; TYPE/STRUCTURE includes are skipped"""
+    lines = (raw_code or '').split('\n')
+    references = []
+    for statement in split_statements(lines):
+        if not _starts_with(statement.keyword, ('INCLUDE',)):
+            continue
+        names = []
+        for part in chain_parts(statement):
+            tokens = tokenize(part)
+            if len(tokens) >= 2 and tokens[1].upper() not in ('TYPE', 'STRUCTURE'):
+                names.append(tokens[1].upper())
+        if names:
+            references.append((statement.start, statement.end, names))
+    return references
+
+
+def listing_name(raw_data: Dict[str, Any]) -> str:
+    """Program or include name of an SE38 listing: the page title, else REPORT/PROGRAM, else the file name"""
+    title = (raw_data.get('html_title') or '').replace('Code listing for:', '').strip()
+    if title:
+        return title.split()[0].upper()
+    match = re.search(r"^\s*(?:REPORT|PROGRAM|FUNCTION-POOL)\s+([\w/]+)", raw_data.get('raw_code') or '',
+                      re.IGNORECASE | re.MULTILINE)
+    if match:
+        return match.group(1).upper()
+    return os.path.splitext(raw_data.get('file_name') or '')[0].upper()
+
+
+class ListingBundle:
+    """A batch of SE38 listings resolved into one logical program per report.
+
+    Listings that no other listing includes are the programs; INCLUDE
+    statements are replaced by the included listing's code when it is in the
+    bundle (unknown includes stay as they are). Includes reached from two or
+    more programs are "shared": they can be analyzed once and replaced by a
+    marker line, with their facts handed to every program that uses them.
+    """
+
+    def __init__(self, listings: Dict[str, Dict[str, Any]]):
+        # file path -> raw_data, and program/include name -> file path
+        self.listings = listings
+        self.paths_by_name = {}
+        for path, raw_data in listings.items():
+            self.paths_by_name.setdefault(listing_name(raw_data), path)
+        self.references = {
+            name: [included for *_, names in include_references(self.listings[path].get('raw_code')) for included in names]
+            for name, path in self.paths_by_name.items()
+        }
+
+    def has_includes(self) -> bool:
+        return any(name in self.paths_by_name for names in self.references.values() for name in names)
+
+    def program_names(self) -> List[str]:
+        """Listings not included by any other listing (all of them if includes form a cycle)"""
+        included = {name for names in self.references.values() for name in names}
+        programs = [name for name in self.paths_by_name if name not in included]
+        return programs or list(self.paths_by_name)
+
+    def includes_of(self, name: str, _seen: Optional[Set[str]] = None) -> List[str]:
+        """Every bundled include reached from name, nested ones included, in source order"""
+        seen = _seen if _seen is not None else {name}
+        reached = []
+        for included in self.references.get(name, []):
+            if included in self.paths_by_name and included not in seen:
+                seen.add(included)
+                reached.append(included)
+                reached.extend(self.includes_of(included, seen))
+        return reached
+
+    def included_in(self) -> Dict[str, List[str]]:
+        """File path of each include listing -> programs that use it"""
+        return {self.paths_by_name[name]: users for name, users in self._users_by_include().items()}
+
+    def shared_includes(self, min_tokens: int = 0) -> List[str]:
+        """Includes used by several programs and large enough to be worth a separate analysis"""
+        candidates = {
+            name for name, users in self._users_by_include().items()
+            if len(users) > 1 and estimate_tokens(self.resolve(name)[0]) >= min_tokens
+        }
+        # A shared include nested in another summarized one is covered by that analysis
+        reached = set()
+        for program in self.program_names():
+            reached |= self.resolve(program, candidates)[2]
+        return [name for name in self.paths_by_name if name in reached]
+
+    def _users_by_include(self) -> Dict[str, List[str]]:
+        users = {}
+        for program in self.program_names():
+            for included in self.includes_of(program):
+                users.setdefault(included, []).append(program)
+        return users
+
+    def resolve(self, name: str, summarized: Iterable[str] = (),
+                _stack: Tuple[str, ...] = ()) -> Tuple[str, str, Set[str]]:
+        """(code, comments, summarized includes reached) of a listing with its includes expanded"""
+        summarized = set(summarized)
+        raw_data = self.listings[self.paths_by_name[name]]
+        lines = (raw_data.get('raw_code') or '').split('\n')
+        comments = [raw_data.get('raw_comments') or '']
+        reached = set()
+        stack = _stack + (name,)
+
+        output = []
+        position = 0
+        for start, end, names in include_references(raw_data.get('raw_code')):
+            output.extend(lines[position:start])
+            position = end + 1
+            expanded = []
+            for included in names:
+                if included not in self.paths_by_name or included in stack:
+                    expanded.append(f"INCLUDE {included.lower()}.")
+                elif included in summarized:
+                    expanded.append(SUMMARIZED_INCLUDE_MARKER.format(name=included))
+                    reached.add(included)
+                else:
+                    code, included_comments, nested = self.resolve(included, summarized, stack)
+                    expanded.extend([f"* ---- INCLUDE {included} ----", code, f"* ---- END INCLUDE {included} ----"])
+                    comments.append(included_comments)
+                    reached |= nested
+            # A single unresolved include keeps its original line(s) untouched
+            if expanded == [f"INCLUDE {included.lower()}." for included in names]:
+                expanded = lines[start:end + 1]
+            output.extend(expanded)
+        output.extend(lines[position:])
+        return '\n'.join(output), '\n'.join(comment for comment in comments if comment), reached
+
+    def include_raw_data(self, name: str) -> Dict[str, Any]:
+        """raw_data of a shared include with its own nested includes expanded"""
+        code, comments, _ = self.resolve(name)
+        return dict(self.listings[self.paths_by_name[name]], raw_code=code, raw_comments=comments)
+
+    def program_raw_data(self, path: str, include_facts: Dict[str, Dict[str, Any]] = None) -> Dict[str, Any]:
+        """raw_data of a program: includes expanded, shared ones replaced by their facts.
+
+        The static analysis always sees the fully expanded code, so selection
+        parameters or authorization checks living in a shared include still count.
+        """
+        include_facts = include_facts or {}
+        name = listing_name(self.listings[path])
+        code, comments, reached = self.resolve(name, include_facts)
+        full_code = code if not reached else self.resolve(name)[0]
+        raw_data = dict(
+            self.listings[path],
+            raw_code=code,
+            raw_comments=comments,
+            static_analysis=analyze_abap_source(full_code),
+            includes=self.includes_of(name)
+        )
+        if reached:
+            raw_data['shared_include_facts'] = {included: include_facts[included] for included in sorted(reached)}
+        logger.info(
+            f"Resolved {name}: {len(raw_data['includes'])} includes, "
+            f"{len(reached)} shared includes sent as facts (~{estimate_tokens(full_code)} -> ~{estimate_tokens(code)} code tokens)"
+        )
+        return raw_data
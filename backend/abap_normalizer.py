@@ -0,0 +1,248 @@
+import re
+import logging
+from collections import Counter
+from typing import Dict, Any, List, Set, Tuple
+
+from llm_transport import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Statement keywords that mark a commented-out line as dead code (pretty-printer upper case)
+DEAD_CODE_KEYWORDS = (
+    'DATA', 'TYPES', 'CONSTANTS', 'TABLES', 'PARAMETERS', 'SELECT-OPTIONS', 'SELECT', 'ENDSELECT',
+    'READ TABLE', 'LOOP AT', 'ENDLOOP', 'IF', 'ELSEIF', 'ELSE', 'ENDIF', 'CASE', 'WHEN', 'ENDCASE',
+    'DO', 'ENDDO', 'WHILE', 'ENDWHILE', 'CALL FUNCTION', 'CALL METHOD', 'PERFORM', 'FORM', 'ENDFORM',
+    'APPEND', 'INSERT', 'MODIFY', 'DELETE', 'CLEAR', 'REFRESH', 'FREE', 'MOVE', 'WRITE', 'MESSAGE',
+    'CHECK', 'EXIT', 'CONTINUE', 'SORT', 'COLLECT', 'CONCATENATE', 'SPLIT', 'CONDENSE', 'ASSIGN',
+    'FIELD-SYMBOLS', 'EXPORTING', 'IMPORTING', 'CHANGING', 'EXCEPTIONS', 'AUTHORITY-CHECK', 'RETURN',
+    'INTO', 'FROM', 'WHERE', 'AND', 'OR'
+)
+DEAD_CODE_PATTERN = re.compile(
+    r"^(?:" + '|'.join(re.escape(keyword) for keyword in DEAD_CODE_KEYWORDS) + r")(?=[\s.:,]|$)"
+)
+# "lw_report-bukrs = ls_t001-bukrs." style assignments; the target must look like a variable, not a word
+ASSIGNMENT_PATTERN = re.compile(r"^(?:\w*[_~-]\w*|<\w+>)[\w<>~/-]*\s*\??=\s*\S.*[.,]$")
+# Tokens that only occur in code: names with _ - ~ <>, literals, numbers, comparisons
+CODE_TOKEN_PATTERN = re.compile(r"[\w<>]*[_~<>'`|=][\w<>-]*|\w+-\w+|\b\d+\b|\*")
+# Upper-case additions of ABAP statements (pretty-printer style), e.g. "LOOP AT itab INTO wa."
+CODE_ADDITION_PATTERN = re.compile(
+    r"\b(?:INTO|FROM|WHERE|TABLE|AT|TYPE|LIKE|USING|EXPORTING|IMPORTING|CHANGING|WITH|KEY|INDEX|"
+    r"VALUE|IS|EQ|NE|GT|LT|GE|LE|IN|INITIAL|BY|TO|OF)\b"
+)
+
+# Decoration characters of banner comments such as "*&-----------*"
+BANNER_CHARACTERS = '*&-=_+#~ "'
+
+# Local/global variable and field-symbol names worth aliasing (lt_..., gv_..., <fs_...>)
+ALIAS_CANDIDATE_PATTERN = re.compile(r"(?<![\w<>-])(<?(?:[lgmp][a-z]{1,2}|fs)_\w+>?)(?!\w)", re.IGNORECASE)
+
+
+def _collapse_whitespace(line: str) -> str:
+    """Single spaces between tokens, literals and trailing comments left intact"""
+    output = []
+    in_literal = None
+    pending_space = False
+    for index, char in enumerate(line):
+        if in_literal:
+            output.append(char)
+            if char == in_literal:
+                in_literal = None
+            continue
+        if char == '"':
+            if output and pending_space:
+                output.append(' ')
+            output.append(' '.join(line[index:].split()))
+            return ''.join(output).strip()
+        if char.isspace():
+            pending_space = True
+            continue
+        if pending_space and output:
+            output.append(' ')
+        pending_space = False
+        output.append(char)
+        if char in ("'", '`', '|'):
+            in_literal = char
+    return ''.join(output).strip()
+
+
+def _comment_text(line: str) -> str:
+    """Text of a full-line comment without its * / " prefix and banner decoration"""
+    return line.lstrip('*"').strip(BANNER_CHARACTERS).strip()
+
+
+def _is_full_line_comment(line: str) -> bool:
+    return line.startswith('*') or line.startswith('"')
+
+
+def _is_dead_code(text: str) -> bool:
+    """True when a comment parses as a complete ABAP statement rather than prose.
+
+    The statement must end with a terminator ("." or a chained ":"/","),
+    may only contain a comma mid-line when it is chained with ":", and
+    besides its leading keyword must carry a code token or an upper-case
+    addition ("ENDIF." alone is enough). "* IF no data found, show
+    message" or "* Status = open." stay comments.
+    """
+    code = ''.join(segment if is_code else "'x'" for is_code, segment in _segments(text)
+                   if is_code or not segment.startswith('"')).strip()
+    if not code or code[-1] not in '.:,':
+        return False
+    if ',' in code[:-1] and ':' not in code:
+        return False
+    if ASSIGNMENT_PATTERN.match(code):
+        return True
+    keyword = DEAD_CODE_PATTERN.match(code)
+    if not keyword:
+        return False
+    rest = code[keyword.end():].strip(' .:,')
+    return not rest or bool(CODE_TOKEN_PATTERN.search(rest) or CODE_ADDITION_PATTERN.search(rest))
+
+
+class ABAPSourceNormalizer:
+    """Shrink extracted ABAP source before it is sent to the LLM.
+
+    Steps: whitespace (&nbsp;, indentation, runs of spaces, blank lines),
+    dead code (commented-out statements and pure banner lines), duplicate
+    comments (raw_comments lines already present in the code, repeated
+    comment lines) and, optionally, aliases for long variable names that
+    recur often, listed in a legend at the top of the code.
+    """
+
+    def __init__(self, shorten_identifiers: bool = False, min_identifier_length: int = 16,
+                 min_identifier_uses: int = 4):
+        self.shorten_identifiers = shorten_identifiers
+        self.min_identifier_length = min_identifier_length
+        self.min_identifier_uses = min_identifier_uses
+
+    def normalize(self, raw_code: str, raw_comments: str) -> Tuple[str, str, Dict[str, Any]]:
+        """(code, comments, report) with before/after token estimates"""
+        stats = {'dead_code_lines': 0, 'banner_lines': 0, 'duplicate_comment_lines': 0, 'aliases': 0}
+        code_lines = self._normalize_lines(raw_code, stats)
+        seen_comments = {_comment_text(line) for line in code_lines if _is_full_line_comment(line)}
+        seen_comments |= {_comment_text(segment) for line in code_lines for is_code, segment in _segments(line)
+                          if not is_code and segment.startswith('"')}
+        comment_lines = self._normalize_lines(raw_comments, stats, seen_comments)
+        if self.shorten_identifiers:
+            code_lines = self._alias_identifiers(code_lines, stats)
+
+        code = '\n'.join(code_lines)
+        comments = '\n'.join(comment_lines)
+        before = estimate_tokens(raw_code) + estimate_tokens(raw_comments)
+        after = estimate_tokens(code) + estimate_tokens(comments)
+        report = dict(
+            before_tokens=before,
+            after_tokens=after,
+            saved_tokens=before - after,
+            saved_percent=round(100 * (before - after) / before, 1) if before else 0.0,
+            **stats
+        )
+        return code, comments, report
+
+    def _normalize_lines(self, text: str, stats: Dict[str, int], seen_comments: Set[str] = None) -> List[str]:
+        """Whitespace and dead code for every line; with seen_comments (raw_comments) also drop repeats"""
+        output = []
+        for line in (text or '').replace('\xa0', ' ').split('\n'):
+            line = _collapse_whitespace(line)
+            if not line:
+                continue
+            if seen_comments is None and not _is_full_line_comment(line):
+                output.append(line)
+                continue
+
+            comment = _comment_text(line)
+            if not comment:
+                stats['banner_lines'] += 1
+                continue
+            if _is_dead_code(comment):
+                stats['dead_code_lines'] += 1
+                continue
+            if seen_comments is not None:
+                if comment in seen_comments:
+                    stats['duplicate_comment_lines'] += 1
+                    continue
+                seen_comments.add(comment)
+            output.append(f"\" {comment}" if line.startswith('"') else f"* {comment}")
+        return output
+
+    def _alias_identifiers(self, lines: List[str], stats: Dict[str, int]) -> List[str]:
+        """Replace long, frequent variable names by short aliases declared in a legend comment"""
+        counts = Counter()
+        spellings = {}
+        for line in lines:
+            if _is_full_line_comment(line):
+                continue
+            for is_code, segment in _segments(line):
+                if is_code:
+                    for match in ALIAS_CANDIDATE_PATTERN.finditer(segment):
+                        counts[match.group(1).lower()] += 1
+                        spellings.setdefault(match.group(1).lower(), match.group(1))
+
+        existing = {word.lower() for line in lines for word in re.findall(r"\w+", line)}
+        aliases = {}
+        legend = []
+        number = 0
+        for name, uses in counts.most_common():
+            if len(name) < self.min_identifier_length or uses < self.min_identifier_uses:
+                continue
+            number += 1
+            while f"v{number}" in existing or f"f{number}" in existing:
+                number += 1
+            alias = f"<f{number}>" if name.startswith('<') else f"v{number}"
+            entry = f"{alias} = {spellings[name]}"
+            # Only worth it when the uses save more than the legend entry costs
+            if uses * (len(name) - len(alias)) <= len(entry) + 2:
+                continue
+            aliases[name] = alias
+            legend.append(entry)
+        if not aliases:
+            return lines
+
+        stats['aliases'] = len(aliases)
+        output = [f"* Alias: {'; '.join(legend)}"]
+        for line in lines:
+            if _is_full_line_comment(line):
+                output.append(line)
+                continue
+            output.append(''.join(
+                ALIAS_CANDIDATE_PATTERN.sub(lambda match: aliases.get(match.group(1).lower(), match.group(1)), segment)
+                if is_code else segment
+                for is_code, segment in _segments(line)
+            ))
+        return output
+
+
+def _segments(line: str) -> List[Tuple[bool, str]]:
+    """Split a code line into (is_code, text) parts; literals and the trailing comment are not code"""
+    segments = []
+    start = 0
+    in_literal = None
+    for index, char in enumerate(line):
+        if in_literal:
+            if char == in_literal:
+                segments.append((False, line[start:index + 1]))
+                start = index + 1
+                in_literal = None
+        elif char in ("'", '`', '|'):
+            segments.append((True, line[start:index]))
+            start = index
+            in_literal = char
+        elif char == '"':
+            segments.append((True, line[start:index]))
+            segments.append((False, line[index:]))
+            return segments
+    segments.append((in_literal is None, line[start:]))
+    return segments
+
+
+def normalize_source(raw_data: Dict[str, Any], shorten_identifiers: bool = False) -> Dict[str, Any]:
+    """Copy of raw_data with normalized raw_code/raw_comments and a 'source_normalization' report"""
+    code, comments, report = ABAPSourceNormalizer(shorten_identifiers).normalize(
+        raw_data.get('raw_code', ''), raw_data.get('raw_comments', '')
+    )
+    logger.info(
+        f"Source normalization for {raw_data.get('file_name', 'listing')}: ~{report['before_tokens']} -> "
+        f"~{report['after_tokens']} tokens ({report['saved_percent']}% less; {report['dead_code_lines']} dead code, "
+        f"{report['banner_lines']} banner, {report['duplicate_comment_lines']} duplicate comment lines, "
+        f"{report['aliases']} aliases)"
+    )
+    return dict(raw_data, raw_code=code, raw_comments=comments, source_normalization=report)
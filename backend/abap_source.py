@@ -0,0 +1,294 @@
+import re
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Iterable
+
+from llm_transport import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Marker inserted where lines were cut out of an excerpt (an ABAP full-line comment)
+ELISION_MARKER = "* ..."
+
+# Blocks that enclose a statement well enough to explain it on their own
+ENCLOSING_BLOCKS = {'FORM': 'ENDFORM', 'METHOD': 'ENDMETHOD', 'MODULE': 'ENDMODULE', 'FUNCTION': 'ENDFUNCTION'}
+
+# Event keywords that open the next processing block of a report
+EVENT_KEYWORDS = (
+    'INITIALIZATION', 'AT SELECTION-SCREEN', 'START-OF-SELECTION', 'END-OF-SELECTION',
+    'TOP-OF-PAGE', 'END-OF-PAGE', 'AT LINE-SELECTION', 'AT USER-COMMAND', 'LOAD-OF-PROGRAM',
+    'FORM', 'CLASS', 'MODULE', 'FUNCTION'
+)
+
+# Above this share of the full code a slice saves too little to be worth the lost context
+MAX_SLICE_RATIO = 0.9
+
+
+@dataclass
+class ABAPStatement:
+    """One ABAP statement (possibly chained over several lines)"""
+    start: int
+    end: int
+    text: str
+
+    @property
+    def keyword(self) -> str:
+        return self.text.lstrip().upper()
+
+
+def _strip_line_comment(line: str) -> str:
+    """Drop a trailing double-quote comment, ignoring quotes inside string literals"""
+    in_literal = None
+    for index, char in enumerate(line):
+        if in_literal:
+            if char == in_literal:
+                in_literal = None
+        elif char in ("'", '`', '|'):
+            in_literal = char
+        elif char == '"':
+            return line[:index]
+    return line
+
+
+def split_statements(lines: List[str]) -> List[ABAPStatement]:
+    """Group source lines into statements terminated by a period"""
+    statements = []
+    start = None
+    buffer = []
+    for index, line in enumerate(lines):
+        if line.startswith('*') or not line.strip():
+            continue
+        code = _strip_line_comment(line).rstrip()
+        if not code.strip():
+            continue
+        if start is None:
+            start = index
+        buffer.append(code.strip())
+        if code.endswith('.'):
+            statements.append(ABAPStatement(start, index, ' '.join(buffer)))
+            start = None
+            buffer = []
+    if buffer:
+        statements.append(ABAPStatement(start, len(lines) - 1, ' '.join(buffer)))
+    return statements
+
+
+def _starts_with(keyword_text: str, keywords: Iterable[str]) -> bool:
+    return any(re.match(rf"{re.escape(keyword)}(?![\w-])", keyword_text) for keyword in keywords)
+
+
+class ABAPCodeSlicer:
+    """Cut ABAP source down to the statements an analysis task actually needs.
+
+    Each supported task has a rule picking relevant statements; their lines are
+    kept (plus the enclosing FORM/METHOD where the surrounding logic matters)
+    and everything else is replaced by an elision marker. Tasks without a rule,
+    or whose slice would be empty or barely smaller, get the full code.
+    """
+
+    def __init__(self, raw_code: str):
+        self.raw_code = raw_code or ''
+        self.lines = self.raw_code.split('\n')
+        self.statements = split_statements(self.lines)
+        self.blocks = self._find_enclosing_blocks()
+        self.full_tokens = estimate_tokens(self.raw_code)
+        self._rules = {
+            'selection_screen': self._selection_screen_ranges,
+            'authorization': self._authorization_ranges,
+            'complete_lookup_forms': self._lookup_ranges
+        }
+
+    def supports(self, task_name: str) -> bool:
+        return task_name in self._rules
+
+    def slice_for_tasks(self, task_names: Iterable[str]) -> Optional[str]:
+        """Union of the excerpts for task_names, or None when the full code should be sent"""
+        task_names = list(task_names)
+        label = '+'.join(task_names)
+        if not self.raw_code.strip() or not all(self.supports(name) for name in task_names):
+            return None
+
+        ranges = []
+        for task_name in task_names:
+            ranges.extend(self._rules[task_name]())
+        if not ranges:
+            logger.info(f"Code slice for {label}: no relevant statements found, using full code")
+            return None
+
+        merged = self._merge_ranges(ranges)
+        excerpt = self._render(merged)
+        sliced_tokens = estimate_tokens(excerpt)
+        if sliced_tokens >= self.full_tokens * MAX_SLICE_RATIO:
+            logger.info(f"Code slice for {label}: excerpt barely smaller than source, using full code")
+            return None
+
+        reduction = 100 * (1 - sliced_tokens / self.full_tokens)
+        logger.debug(
+            f"Code slice for {label}: ~{self.full_tokens} -> ~{sliced_tokens} code tokens ({reduction:.0f}% less)"
+        )
+        return excerpt
+
+    # ---- task rules -------------------------------------------------------
+
+    def _selection_screen_ranges(self) -> List[Tuple[int, int]]:
+        """PARAMETERS/SELECT-OPTIONS/SELECTION-SCREEN plus INITIALIZATION and AT SELECTION-SCREEN"""
+        ranges = []
+        for statement in self.statements:
+            keyword = statement.keyword
+            if _starts_with(keyword, ('REPORT', 'PARAMETERS', 'PARAMETER', 'SELECT-OPTIONS', 'SELECTION-SCREEN')):
+                ranges.append((statement.start, statement.end))
+            elif _starts_with(keyword, ('INITIALIZATION', 'AT SELECTION-SCREEN')):
+                ranges.append((statement.start, self._event_block_end(statement)))
+        return ranges
+
+    def _authorization_ranges(self) -> List[Tuple[int, int]]:
+        """AUTHORITY-CHECK statements with the routine that performs them"""
+        return [
+            self._context_range(statement)
+            for statement in self.statements
+            if _starts_with(statement.keyword, ('AUTHORITY-CHECK',))
+        ]
+
+    def _lookup_ranges(self) -> List[Tuple[int, int]]:
+        """READ TABLE and SELECT statements with the routines around them"""
+        ranges = []
+        for statement in self.statements:
+            keyword = statement.keyword
+            if _starts_with(keyword, ('READ TABLE', 'SELECT SINGLE', 'SELECT')) and \
+                    not _starts_with(keyword, ('SELECT-OPTIONS', 'SELECTION-SCREEN')):
+                ranges.append(self._context_range(statement))
+        return ranges
+
+    # ---- helpers ----------------------------------------------------------
+
+    def _find_enclosing_blocks(self) -> List[Tuple[int, int]]:
+        """Line ranges of FORM/METHOD/MODULE/FUNCTION ... END* blocks"""
+        blocks = []
+        open_block = None
+        for statement in self.statements:
+            keyword = statement.keyword
+            if open_block is None:
+                for opener, closer in ENCLOSING_BLOCKS.items():
+                    if _starts_with(keyword, (opener,)):
+                        open_block = (statement.start, closer)
+                        break
+            elif _starts_with(keyword, (open_block[1],)):
+                blocks.append((open_block[0], statement.end))
+                open_block = None
+        return blocks
+
+    def _context_range(self, statement: ABAPStatement, window: int = 3) -> Tuple[int, int]:
+        """The enclosing routine of a statement, or a few lines around it at top level"""
+        for start, end in self.blocks:
+            if start <= statement.start and statement.end <= end:
+                return start, end
+        return max(0, statement.start - window), min(len(self.lines) - 1, statement.end + window)
+
+    def _event_block_end(self, event: ABAPStatement) -> int:
+        """Last line before the next event or routine definition"""
+        for statement in self.statements:
+            if statement.start > event.end and _starts_with(statement.keyword, EVENT_KEYWORDS):
+                return statement.start - 1
+        return len(self.lines) - 1
+
+    @staticmethod
+    def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def _render(self, ranges: List[Tuple[int, int]]) -> str:
+        output = []
+        previous_end = -1
+        for start, end in ranges:
+            if start > previous_end + 1:
+                output.append(ELISION_MARKER)
+            output.extend(self.lines[start:end + 1])
+            previous_end = end
+        if previous_end < len(self.lines) - 1:
+            output.append(ELISION_MARKER)
+        return '\n'.join(output)
+
+
+def task_code_excerpts(raw_code: str, task_groups: Iterable[Tuple[str, ...]]) -> Dict[Tuple[str, ...], str]:
+    """Code excerpts for the task groups that can be sliced; other groups keep the full code"""
+    slicer = ABAPCodeSlicer(raw_code)
+    excerpts = {}
+    for group in task_groups:
+        excerpt = slicer.slice_for_tasks(group)
+        if excerpt is not None:
+            excerpts[tuple(group)] = excerpt
+    return excerpts
+
+
+# Statements that start a new unit when splitting a program into chunks
+CHUNK_BOUNDARY_KEYWORDS = (
+    'FORM', 'CLASS', 'METHOD', 'MODULE', 'FUNCTION',
+    'INITIALIZATION', 'AT SELECTION-SCREEN', 'START-OF-SELECTION', 'END-OF-SELECTION'
+)
+
+
+def _declared_structures(lines: List[str], statements: List[ABAPStatement]) -> List[str]:
+    """Source lines of every TYPES: BEGIN OF ... END OF structure"""
+    output = []
+    start = None
+    for statement in statements:
+        keyword = statement.keyword
+        if start is None and _starts_with(keyword, ('TYPES',)) and 'BEGIN OF' in keyword:
+            start = statement.start
+        if start is not None and 'END OF' in keyword:
+            output.extend(lines[start:statement.end + 1])
+            start = None
+    return output
+
+
+def split_into_chunks(raw_code: str, max_tokens: int) -> List[str]:
+    """Split ABAP source along FORM/METHOD/CLASS/event boundaries into chunks of about max_tokens.
+
+    Units are packed greedily in source order; a single unit larger than the
+    budget is split on line boundaries. Chunks that do not contain the
+    declared TYPES structures get them prepended, so every chunk can still
+    name the output fields its assignments fill.
+    """
+    lines = (raw_code or '').split('\n')
+    statements = split_statements(lines)
+    starts = sorted({0} | {s.start for s in statements if _starts_with(s.keyword, CHUNK_BOUNDARY_KEYWORDS)})
+    units = [lines[start:end] for start, end in zip(starts, starts[1:] + [len(lines)])]
+
+    structures = _declared_structures(lines, statements)
+    structures_text = '\n'.join(structures)
+    # Shared declarations may use at most a quarter of each chunk
+    if estimate_tokens(structures_text) > max_tokens // 4:
+        structures_text = ''
+    budget = max(1, max_tokens - estimate_tokens(structures_text))
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit in units:
+        unit_tokens = estimate_tokens('\n'.join(unit))
+        pieces = [unit]
+        if unit_tokens > budget:
+            lines_per_piece = max(1, int(len(unit) * budget / unit_tokens))
+            pieces = [unit[i:i + lines_per_piece] for i in range(0, len(unit), lines_per_piece)]
+        for piece in pieces:
+            piece_tokens = estimate_tokens('\n'.join(piece))
+            if current and current_tokens + piece_tokens > budget:
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.extend(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append(current)
+
+    output = []
+    for chunk in chunks:
+        text = '\n'.join(chunk)
+        if structures_text and structures[0] not in chunk:
+            text = f"{structures_text}\n{ELISION_MARKER}\n{text}"
+        output.append(text)
+    return output
@@ -0,0 +1,232 @@
+import re
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from abap_source import ABAPStatement, split_statements, _strip_line_comment, _starts_with
+
+logger = logging.getLogger(__name__)
+
+# static_analysis modes: off, enrich (LLM only fills descriptions) or replace (skip the LLM task)
+STATIC_ANALYSIS_MODES = ('off', 'enrich', 'replace')
+
+# Additions that end the TYPE/LIKE/FOR clause of a PARAMETERS or SELECT-OPTIONS declaration
+DECLARATION_ADDITIONS = {
+    'OBLIGATORY', 'DEFAULT', 'NO', 'NO-EXTENSION', 'NO-DISPLAY', 'AS', 'RADIOBUTTON', 'LOWER',
+    'MATCHCODE', 'MEMORY', 'MODIF', 'VALUE', 'VALUE-REQUEST', 'HELP-REQUEST', 'USER-COMMAND',
+    'VISIBLE', 'OPTION', 'SIGN'
+}
+
+# Structure names that hold the report output (gty_report, lty_hr_report, gty_output, ...)
+OUTPUT_STRUCTURE_PATTERN = re.compile(r"report|output|alv|result", re.IGNORECASE)
+
+
+def _split_outside_literals(text: str, separator: str) -> List[str]:
+    """Split on separator, ignoring occurrences inside literals or parentheses"""
+    parts = []
+    in_literal = None
+    depth = 0
+    start = 0
+    for index, char in enumerate(text):
+        if in_literal:
+            if char == in_literal:
+                in_literal = None
+        elif char in ("'", '`', '|'):
+            in_literal = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth = max(0, depth - 1)
+        elif char == separator and depth == 0:
+            parts.append(text[start:index])
+            start = index + 1
+    parts.append(text[start:])
+    return parts
+
+
+def chain_parts(statement: ABAPStatement) -> List[str]:
+    """Expand a chained statement ("PARAMETERS: a ..., b ....") into one text per declaration"""
+    text = statement.text.strip()
+    if text.endswith('.'):
+        text = text[:-1]
+    head, *tail = _split_outside_literals(text, ':')
+    if not tail:
+        return [text.strip()]
+    body = ':'.join(tail)
+    return [f"{head.strip()} {part.strip()}".strip() for part in _split_outside_literals(body, ',') if part.strip()]
+
+
+def tokenize(text: str) -> List[str]:
+    """Whitespace tokens, keeping quoted literals in one piece"""
+    return re.findall(r"'(?:[^']|'')*'|`[^`]*`|\S+", text)
+
+
+def _unquote(token: str) -> str:
+    if len(token) >= 2 and token[0] == token[-1] and token[0] in ("'", '`'):
+        return token[1:-1]
+    return token
+
+
+class ABAPStaticAnalyzer:
+    """Derive FSD sections that are spelled out literally in ABAP declarations.
+
+    Selection parameters come from PARAMETERS / SELECT-OPTIONS, authorization
+    objects from AUTHORITY-CHECK OBJECT and the field skeleton from the
+    TYPES: BEGIN OF ... structure holding the report output. Results use the
+    same JSON shape as the matching LLM tasks so they can be mapped, merged or
+    shown to the model as-is.
+    """
+
+    def __init__(self, raw_code: str):
+        self.lines = (raw_code or '').split('\n')
+        self.statements = split_statements(self.lines)
+
+    def analyze(self) -> Dict[str, Any]:
+        structure_name, fields = self.output_structure()
+        result = {
+            'selection_parameters': self.selection_parameters(),
+            'authorization_objects': self.authorization_objects(),
+            'output_structure': structure_name,
+            'field_skeleton': fields
+        }
+        logger.info(
+            f"Static analysis: {len(result['selection_parameters'])} selection parameters, "
+            f"{len(result['authorization_objects'])} authorization objects, "
+            f"{len(fields)} output fields{f' ({structure_name})' if structure_name else ''}"
+        )
+        return result
+
+    # ---- selection screen -------------------------------------------------
+
+    def selection_parameters(self) -> List[Dict[str, Any]]:
+        parameters = []
+        block_name = ''
+        for statement in self.statements:
+            keyword = statement.keyword
+            if _starts_with(keyword, ('SELECTION-SCREEN',)):
+                tokens = tokenize(keyword)
+                if 'BEGIN' in tokens and 'BLOCK' in tokens:
+                    block_name = tokens[tokens.index('BLOCK') + 1].rstrip('.,').lower() if len(tokens) > tokens.index('BLOCK') + 1 else ''
+                elif 'END' in tokens and 'BLOCK' in tokens:
+                    block_name = ''
+                continue
+            if not _starts_with(keyword, ('PARAMETERS', 'PARAMETER', 'SELECT-OPTIONS')):
+                continue
+            for part in chain_parts(statement):
+                parameter = self._parse_declaration(part, statement)
+                if parameter:
+                    parameter['block_name'] = block_name
+                    parameters.append(parameter)
+        return parameters
+
+    def _parse_declaration(self, text: str, statement: ABAPStatement) -> Optional[Dict[str, Any]]:
+        tokens = tokenize(text)
+        if len(tokens) < 2:
+            return None
+        is_select_option = tokens[0].upper() == 'SELECT-OPTIONS'
+        name = tokens[1].split('(', 1)[0]
+        upper = [token.upper() for token in tokens]
+
+        # Bare type reference (BUKRS, P0015-LGART), written the way the FSD tables always showed it
+        type_tokens = []
+        for index in range(2, len(tokens)):
+            if upper[index] in ('TYPE', 'LIKE', 'FOR'):
+                for token_upper in upper[index + 1:]:
+                    if token_upper in DECLARATION_ADDITIONS:
+                        break
+                    type_tokens.append(token_upper)
+                break
+        if not type_tokens and 'CHECKBOX' in upper:
+            type_tokens = ['CHECKBOX']
+        elif not type_tokens and 'RADIOBUTTON' in upper:
+            type_tokens = ['RADIOBUTTON']
+
+        default_value = ''
+        if 'DEFAULT' in upper:
+            position = upper.index('DEFAULT') + 1
+            value = tokens[position:position + 1]
+            if upper[position + 1:position + 2] == ['TO']:
+                value = tokens[position:position + 3]
+            default_value = ' '.join(_unquote(token) for token in value)
+
+        return {
+            'name': name.upper(),
+            'type': ' '.join(type_tokens),
+            'description': self._trailing_comment(statement, name),
+            'is_mandatory': 'OBLIGATORY' in upper,
+            'is_select_option': is_select_option,
+            'has_no_intervals': any(upper[i:i + 2] == ['NO', 'INTERVALS'] for i in range(len(upper))),
+            'default_value': default_value
+        }
+
+    def _trailing_comment(self, statement: ABAPStatement, name: str) -> str:
+        """The "-comment on the source line declaring name, which usually describes it"""
+        pattern = re.compile(rf"(?<![\w-]){re.escape(name)}(?![\w-])", re.IGNORECASE)
+        for line in self.lines[statement.start:statement.end + 1]:
+            code = _strip_line_comment(line)
+            if pattern.search(code) and len(code) < len(line):
+                return line[len(code):].lstrip('"').strip()
+        return ''
+
+    # ---- authorization ----------------------------------------------------
+
+    def authorization_objects(self) -> List[str]:
+        objects = []
+        for statement in self.statements:
+            if not _starts_with(statement.keyword, ('AUTHORITY-CHECK',)):
+                continue
+            tokens = tokenize(statement.text.rstrip('.'))
+            upper = [token.upper() for token in tokens]
+            if 'OBJECT' not in upper or upper.index('OBJECT') + 1 >= len(tokens):
+                continue
+            name = tokens[upper.index('OBJECT') + 1]
+            # A variable object name cannot be resolved statically; leave it to the LLM
+            if name[0] in ("'", '`') and _unquote(name).upper() not in objects:
+                objects.append(_unquote(name).upper())
+        return objects
+
+    # ---- output structure -------------------------------------------------
+
+    def structures(self) -> Dict[str, List[Dict[str, str]]]:
+        """Fields of every TYPES BEGIN OF ... END OF structure, in declaration order"""
+        structures = {}
+        stack = []
+        for statement in self.statements:
+            if not _starts_with(statement.keyword, ('TYPES',)):
+                continue
+            for part in chain_parts(statement):
+                tokens = tokenize(part)[1:]
+                upper = [token.upper() for token in tokens]
+                if upper[:2] == ['BEGIN', 'OF'] and len(tokens) > 2:
+                    stack.append(tokens[2].lower())
+                    structures.setdefault(stack[-1], [])
+                elif upper[:2] == ['END', 'OF']:
+                    if stack:
+                        stack.pop()
+                elif stack and tokens and upper[0] != 'INCLUDE':
+                    structures[stack[0]].append(self._structure_field(tokens))
+        return structures
+
+    @staticmethod
+    def _structure_field(tokens: List[str]) -> Dict[str, str]:
+        name = tokens[0].split('(', 1)[0].lower()
+        type_ref = ' '.join(tokens[1:])
+        # "TYPE t001-bukrs" names the table the value usually comes from
+        source_table = ''
+        match = re.search(r"\b(?:TYPE|LIKE)\s+([A-Za-z/][\w/]*)-\w+", type_ref, re.IGNORECASE)
+        if match and match.group(1).upper() not in ('SY', 'SYST'):
+            source_table = match.group(1).upper()
+        return {'technical_field': name, 'type': type_ref, 'source_table': source_table}
+
+    def output_structure(self) -> Tuple[str, List[Dict[str, str]]]:
+        """The structure that looks like the report output, with its fields"""
+        candidates = [(name, fields) for name, fields in self.structures().items()
+                      if fields and OUTPUT_STRUCTURE_PATTERN.search(name)]
+        if not candidates:
+            return '', []
+        # Prefer gty_report-style names, then the widest structure
+        name, fields = max(candidates, key=lambda item: ('report' in item[0], len(item[1])))
+        return name, fields
+
+
+def analyze_abap_source(raw_code: str) -> Dict[str, Any]:
+    return ABAPStaticAnalyzer(raw_code).analyze()
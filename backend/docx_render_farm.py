@@ -0,0 +1,107 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DocxRenderTimeout(Exception):
+    """A render did not finish within the configured time"""
+
+
+class DocxRenderFarm:
+    """Process pool that renders documents off the event loop.
+
+    Jobs are a module-level function plus plain (picklable) data, so the
+    worker processes never share state with the server. Workers are
+    spawned rather than forked: the server process holds threads, SQLite
+    connections and an event loop that must not be copied. A render that
+    exceeds the timeout is reported as failed and its pool is replaced so
+    the stuck worker is terminated; renders that were running in that
+    pool at the same time are retried once on the new pool. With
+    workers=0, renders run in a thread of the server process instead;
+    there the timeout only stops waiting for the thread.
+    """
+
+    def __init__(self, workers: int = 2, timeout_seconds: float = 300):
+        self.workers = max(0, int(workers))
+        self.timeout_seconds = float(timeout_seconds) if timeout_seconds else None
+        self.renders = 0
+        self.timeouts = 0
+        self.render_seconds = 0.0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> "DocxRenderFarm":
+        return cls(
+            int(config.get('docx_render_workers', min(4, os.cpu_count() or 1))),
+            float(config.get('docx_render_timeout_seconds', 300))
+        )
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _retire(self, pool: ProcessPoolExecutor):
+        """Drop a pool and terminate its workers; the next render starts a fresh one"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        # ProcessPoolExecutor cannot cancel a running call, so the processes are stopped directly
+        processes = list((getattr(pool, '_processes', None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    async def render(self, function: Callable[[Dict[str, Any]], Any], job: Dict[str, Any]) -> Any:
+        """Run function(job) in a worker, raising DocxRenderTimeout when it takes too long"""
+        started = time.perf_counter()
+        try:
+            if self.workers == 0:
+                return await asyncio.wait_for(asyncio.to_thread(function, job), self.timeout_seconds)
+            for attempt in range(2):
+                pool = self._executor()
+                try:
+                    return await asyncio.wait_for(
+                        asyncio.get_running_loop().run_in_executor(pool, function, job), self.timeout_seconds
+                    )
+                except asyncio.TimeoutError:
+                    self._retire(pool)
+                    raise
+                except BrokenProcessPool:
+                    self._retire(pool)
+                    if attempt:
+                        raise
+                    logger.warning("Render worker pool broke, retrying the render on a new pool")
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise DocxRenderTimeout(f"Render did not finish within {self.timeout_seconds:g}s")
+        finally:
+            self.renders += 1
+            self.render_seconds += time.perf_counter() - started
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'timeout_seconds': self.timeout_seconds,
+            'renders': self.renders,
+            'timeouts': self.timeouts,
+            'average_render_seconds': round(self.render_seconds / self.renders, 3) if self.renders else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,201 @@
+import os
+import re
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Iterator, List, Pattern, Tuple
+
+from docx import Document as DocxDocument
+from docxtpl import DocxTemplate
+
+logger = logging.getLogger(__name__)
+
+# {{jinja_style}}, [*Masukkan ...*] instructions and the "(Nama File)" title marker
+PLACEHOLDER_PATTERN = re.compile(r"\{\{.*?\}\}|\[\*Masukkan.*?\*\]|\(Nama File\)")
+
+# ('body', paragraph) or ('table', table, row, cell, paragraph) indexes, as python-docx enumerates them
+Location = Tuple
+
+
+def iter_table_rows(document) -> Iterator[Tuple[Tuple[int, int], List[Any]]]:
+    """((table index, row index), cells) of every table row; row.cells is computed once per row"""
+    for table_index, table in enumerate(document.tables):
+        for row_index, row in enumerate(table.rows):
+            yield (table_index, row_index), row.cells
+
+
+def iter_paragraphs(document) -> Iterator[Tuple[Location, Any]]:
+    """Body paragraphs, then the paragraphs of every table cell, with their locations"""
+    for index, paragraph in enumerate(document.paragraphs):
+        yield ('body', index), paragraph
+    for (table_index, row_index), cells in iter_table_rows(document):
+        for cell_index, cell in enumerate(cells):
+            for index, paragraph in enumerate(cell.paragraphs):
+                yield ('table', table_index, row_index, cell_index, index), paragraph
+
+
+def paragraph_at(document, location: Location):
+    """The paragraph at a location from iter_paragraphs() in a document with the same structure"""
+    if location[0] == 'body':
+        return document.paragraphs[location[1]]
+    _, table_index, row_index, cell_index, index = location
+    return document.tables[table_index].rows[row_index].cells[cell_index].paragraphs[index]
+
+
+def compile_replacements(replacements: Dict[str, str]) -> Pattern:
+    """One alternation matching every key of an ordered dict of literal replacements.
+
+    Applying the dict key by key means a key that contains an earlier key
+    can never match (the earlier one is already gone), so such keys are
+    left out; the rest are tried longest first.
+    """
+    keys = []
+    for key in replacements:
+        if key and not any(earlier in key for earlier in keys):
+            keys.append(key)
+    if not keys:
+        return re.compile(r"(?!)")
+    return re.compile('|'.join(re.escape(key) for key in sorted(keys, key=len, reverse=True)))
+
+
+class ParagraphIndex:
+    """Every paragraph of a document read once, with its text kept alongside.
+
+    python-docx builds new proxies on each doc.paragraphs access and joins
+    the run texts on each paragraph.text access, so scanning the document
+    once per placeholder costs paragraphs x placeholders. The index walks
+    the body and the table cells once (body paragraphs first, so their
+    positions equal doc.paragraphs indexes); edits made on an indexed
+    paragraph must be followed by refresh(). Tables inserted later are
+    not indexed.
+    """
+
+    def __init__(self, document):
+        self.locations: List[Location] = []
+        self.paragraphs: List[Any] = []
+        self.row_cells: Dict[Tuple[int, int], List[Any]] = {}
+        # A merged cell appears once per grid column it spans, so one paragraph can have several positions
+        self._positions_of: Dict[Any, List[int]] = {}
+        for index, paragraph in enumerate(document.paragraphs):
+            self._add(('body', index), paragraph)
+        self.body_count = len(self.paragraphs)
+        for (table_index, row_index), cells in iter_table_rows(document):
+            self.row_cells[(table_index, row_index)] = cells
+            for cell_index, cell in enumerate(cells):
+                for index, paragraph in enumerate(cell.paragraphs):
+                    self._add(('table', table_index, row_index, cell_index, index), paragraph)
+        self.texts: List[str] = [paragraph.text for paragraph in self.paragraphs]
+
+    def _add(self, location: Location, paragraph):
+        self._positions_of.setdefault(paragraph._p, []).append(len(self.paragraphs))
+        self.locations.append(location)
+        self.paragraphs.append(paragraph)
+
+    def refresh(self, position: int) -> str:
+        """Re-read the text of an edited paragraph"""
+        text = self.paragraphs[position].text
+        for same in self._positions_of[self.paragraphs[position]._p]:
+            self.texts[same] = text
+        return text
+
+    def body(self) -> range:
+        return range(self.body_count)
+
+    def cells(self) -> range:
+        return range(self.body_count, len(self.paragraphs))
+
+    def find(self, needle: str, positions: Iterable[int] = None) -> Iterator[int]:
+        """Positions whose current text contains needle, in document order (all paragraphs by default)"""
+        for position in (range(len(self.paragraphs)) if positions is None else positions):
+            if needle in self.texts[position]:
+                yield position
+
+
+class CompiledTemplate:
+    """A parsed .docx template kept in memory with an index of its placeholders.
+
+    clone() hands out an independent deep copy of the parsed document, which
+    is cheaper than unzipping and parsing the package again. The cached
+    original is never read through python-docx proxies: those cache lxml
+    sub-elements (e.g. the body) that deepcopy would copy detached from the
+    tree, so the index is built on a clone. Locations in the index are valid
+    in every clone.
+    """
+
+    def __init__(self, path: str, document):
+        self.path = path
+        self._pristine = document
+        self.placeholders: Dict[str, List[Location]] = {}
+        for location, paragraph in iter_paragraphs(self.clone()):
+            for match in PLACEHOLDER_PATTERN.finditer(paragraph.text):
+                self.placeholders.setdefault(match.group(), []).append(location)
+
+    def clone(self):
+        return copy.deepcopy(self._pristine)
+
+    def docx_template(self) -> DocxTemplate:
+        """DocxTemplate over a clone; docxtpl only reads the file itself when no document is loaded"""
+        template = DocxTemplate(self.path)
+        template.docx = self.clone()
+        return template
+
+    def locations(self, placeholder: str) -> List[Location]:
+        return self.placeholders.get(placeholder, [])
+
+
+class TemplateCache:
+    """Compiled templates keyed by path, modification time and size.
+
+    A replaced template file gets a new key, so the next render parses the
+    new version and the old entry ages out. Use shared() for the cache of
+    the current process (each render worker keeps its own).
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple[str, int, int], CompiledTemplate]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> "TemplateCache":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def get(self, template_path: str) -> CompiledTemplate:
+        path = os.path.abspath(str(template_path))
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            compiled = self.entries.get(key)
+            if compiled is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+            compiled = CompiledTemplate(path, DocxDocument(path))
+            self.entries[key] = compiled
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        logger.info(f"Compiled template {path}: {sum(map(len, compiled.placeholders.values()))} placeholders indexed")
+        return compiled
+
+    def stats(self) -> Dict[str, Any]:
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def template_document(template_path: str):
+    """A fresh python-docx Document of the template, cloned from the shared cache"""
+    return TemplateCache.shared().get(template_path).clone()
+
+
+def template_docxtpl(template_path: str) -> DocxTemplate:
+    """A fresh DocxTemplate of the template, cloned from the shared cache"""
+    return TemplateCache.shared().get(template_path).docx_template()
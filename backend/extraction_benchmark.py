@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+from typing import Dict, Any, List
+
+from main import ABAPHTMLExtractor
+
+ENGINES = ('bs4', 'scanner')
+
+
+def write_synthetic_listing(path: str, code_lines: int):
+    """SE38-style export with alternating comment and code blocks"""
+    parts = [
+        '<html><head><title>ZBENCH_REPORT</title></head><body>',
+        '<table class="outerTable"><tr><td><h2>Code listing for: ZBENCH_REPORT</h2>',
+        '<h3> Description: Benchmark &amp; synthetic listing</h3></td></tr><tr><td>'
+    ]
+    for block in range(0, code_lines, 20):
+        parts.append('<div class="codeComment">\n<font color="#0000FF">*&amp;--- block '
+                     f'{block}&nbsp;&quot;text&quot;</font><br />\n</div>')
+        lines = [f"&nbsp;&nbsp;lw_report-field_{line}&nbsp;=&nbsp;&apos;X&apos;.&nbsp;&quot;value &lt;= {line}"
+                 for line in range(block, min(block + 20, code_lines))]
+        parts.append('<div class="code">\n<font color ="#000000">' + '<br />\n'.join(lines) + '</font><br />\n</div>')
+    parts.append('</td></tr></table></body></html>')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(parts))
+
+
+def run_engine(path: str, engine: str, repeat: int) -> Dict[str, Any]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        raw_data = ABAPHTMLExtractor(path, engine=engine).extract_all()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    ABAPHTMLExtractor(path, engine=engine).extract_all()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'raw_data': raw_data, 'best_seconds': min(timings), 'peak_mb': peak / (1024 * 1024)}
+
+
+def benchmark(paths: List[str], repeat: int) -> bool:
+    identical = True
+    for path in paths:
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"\n{os.path.basename(path)} ({size_mb:.1f} MB)")
+        results = {engine: run_engine(path, engine, repeat) for engine in ENGINES}
+        reference = results['bs4']
+        for engine, result in results.items():
+            same = result['raw_data'] == reference['raw_data']
+            identical = identical and same
+            speedup = reference['best_seconds'] / result['best_seconds'] if result['best_seconds'] else 0
+            print(f"  {engine:<8} {result['best_seconds']:8.3f}s  peak {result['peak_mb']:8.1f} MB  "
+                  f"x{speedup:5.1f}  {'identical' if same else 'DIFFERENT raw_data'}")
+    return identical
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare ABAP HTML extraction engines')
+    parser.add_argument('files', nargs='*', help='SE38 HTML exports to extract')
+    parser.add_argument('--synthetic-lines', type=int, default=0,
+                        help='Also benchmark a generated listing with this many code lines')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per engine (best time is reported)')
+    args = parser.parse_args()
+
+    paths = list(args.files)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.synthetic_lines or not paths:
+            synthetic_path = os.path.join(temp_dir, 'synthetic_listing.html')
+            write_synthetic_listing(synthetic_path, args.synthetic_lines or 100000)
+            paths.append(synthetic_path)
+        identical = benchmark(paths, max(1, args.repeat))
+
+    print('\nAll engines produced identical raw_data' if identical else '\nraw_data differs between engines')
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when the extracted fields or the static analysis change shape, so older entries are ignored
+EXTRACTION_CACHE_VERSION = 1
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of the file bytes, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """On-disk cache of ABAPHTMLExtractor output keyed by the SHA-256 of the HTML file.
+
+    The same listing uploaded twice, under any name, is parsed only once.
+    Entries hold the extracted code, comments, title and description plus
+    the static analysis derived from them, zlib-compressed in SQLite.
+    Least recently used entries are evicted beyond max_entries.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 2000):
+        self.db_path = str(db_path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_extractions_last_access ON extractions(last_access)")
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config) -> Optional["ExtractionCache"]:
+        """Build the cache from ConfigManager settings, or return None when disabled"""
+        if str(config.get('extraction_cache_enabled', True)).lower() not in ('1', 'true', 'yes'):
+            return None
+        try:
+            return cls(
+                config.get('extraction_cache_path', './cache/extractions.sqlite3'),
+                max_entries=int(config.get('extraction_cache_max_entries', 2000))
+            )
+        except Exception as exc:
+            logger.warning(f"Extraction cache disabled, could not open database: {exc}")
+            return None
+
+    @staticmethod
+    def _key(content_hash: str) -> str:
+        return f"v{EXTRACTION_CACHE_VERSION}:{content_hash}"
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Return the cached extraction for a file hash, or None on a miss"""
+        key = self._key(content_hash)
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE extractions SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put(self, content_hash: str, extraction: Dict[str, Any]):
+        """Store an extraction and evict least recently used entries beyond max_entries"""
+        payload = zlib.compress(json.dumps(extraction, ensure_ascii=False).encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, payload, size, last_access) VALUES (?, ?, ?, ?)",
+                (self._key(content_hash), payload, len(payload), time.time())
+            )
+            self._conn.execute(
+                """
+                DELETE FROM extractions WHERE key IN (
+                    SELECT key FROM extractions ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'path': self.db_path,
+            'entries': count,
+            'size_bytes': total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,200 @@
+import json
+import gzip
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# LLMClient backends: live Gemini calls, live calls that are also recorded, or recordings only
+LLM_BACKEND_MODES = ('live', 'record', 'replay')
+
+
+class ReplayMissError(Exception):
+    """No recording exists for a request in replay mode"""
+
+
+def model_name_from_url(api_url: str) -> str:
+    """'.../models/gemini-1.5-pro-latest:generateContent' -> 'gemini-1.5-pro-latest'"""
+    last_segment = urlsplit(api_url or '').path.rstrip('/').rsplit('/', 1)[-1]
+    return last_segment.split(':', 1)[0]
+
+
+def recording_key(payload: Dict[str, Any], model_name: str) -> str:
+    """Hash of the model plus the full request body (prompt and generation config)"""
+    material = json.dumps({'model': model_name, 'payload': payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class RecordingStore:
+    """Directory of gzip-compressed request/response pairs keyed by request hash.
+
+    One file per request (``<key>.json.gz``) keeps recordings easy to copy
+    between machines, check into a fixtures folder or prune by hand. The key
+    only depends on the model name and request body, never on the host, so
+    recordings made against Gemini also match requests sent to the stub server.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config) -> Optional["RecordingStore"]:
+        """Build the store for record/replay mode, or return None for live calls"""
+        if str(config.get('llm_backend', 'live')).lower() not in ('record', 'replay'):
+            return None
+        return cls(config.get('llm_recordings_dir', './recordings/llm'))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json.gz"
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, key: str, model_name: str, payload: Dict[str, Any], response: Dict[str, Any],
+             latency_seconds: float):
+        record = {
+            'model': model_name,
+            'request': payload,
+            'response': response,
+            'latency_seconds': round(latency_seconds, 3),
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+        # Write to a unique temp file then rename, so a concurrent replay never reads a
+        # half-written file and two recordings of the same key never share a temp file
+        with tempfile.NamedTemporaryFile(dir=self.directory, prefix=f"{key}.", suffix='.tmp', delete=False) as raw:
+            temp_path = Path(raw.name)
+            try:
+                with gzip.GzipFile(fileobj=raw, mode='wb') as compressed:
+                    compressed.write(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+            except BaseException:
+                raw.close()
+                temp_path.unlink(missing_ok=True)
+                raise
+        temp_path.replace(self._path(key))
+
+
+class ReplayBackend:
+    """Serve recorded responses with simulated latency instead of calling Gemini.
+
+    Latency is either fixed (latency_seconds) or the recorded wall time
+    multiplied by latency_scale, so a replayed batch keeps realistic timing.
+    """
+
+    def __init__(self, store: RecordingStore, latency_seconds: Optional[float] = None, latency_scale: float = 1.0):
+        self.store = store
+        self.latency_seconds = latency_seconds
+        self.latency_scale = latency_scale
+
+    @classmethod
+    def from_config(cls, config, store: RecordingStore) -> "ReplayBackend":
+        latency = config.get('llm_replay_latency_seconds')
+        return cls(
+            store,
+            latency_seconds=float(latency) if latency not in (None, '') else None,
+            latency_scale=float(config.get('llm_replay_latency_scale', 1.0))
+        )
+
+    def lookup(self, model_name: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self.store.load(recording_key(payload, model_name))
+
+    def delay_for(self, record: Dict[str, Any]) -> float:
+        if self.latency_seconds is not None:
+            return self.latency_seconds
+        return float(record.get('latency_seconds') or 0) * self.latency_scale
+
+    async def generate(self, model_name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        record = self.lookup(model_name, payload)
+        if record is None:
+            raise ReplayMissError(f"No recording for this {model_name} request in {self.store.directory}")
+        await asyncio.sleep(self.delay_for(record))
+        return record['response']
+
+
+# ================================
+# LOCAL STUB SERVER
+# ================================
+
+def _fallback_response(text: str = '{}') -> Dict[str, Any]:
+    return {
+        'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finishReason': 'STOP'}],
+        'usageMetadata': {'promptTokenCount': 0, 'candidatesTokenCount': 0, 'totalTokenCount': 0}
+    }
+
+
+def create_stub_app(backend: ReplayBackend, fallback_empty: bool = True, stream_chunks: int = 8) -> web.Application:
+    """aiohttp app answering Gemini's generateContent / streamGenerateContent from recordings.
+
+    Point GEMINI_API_URL at http://host:port/v1beta/models/<model>:generateContent
+    to run the whole pipeline offline. Unrecorded requests get an empty JSON
+    answer (or a 404 when fallback_empty is off).
+    """
+
+    async def handle(request: web.Request) -> web.StreamResponse:
+        model_name, _, method = request.match_info['model_method'].partition(':')
+        payload = await request.json()
+        record = backend.lookup(model_name, payload)
+        if record is None and not fallback_empty:
+            return web.json_response({'error': {'code': 404, 'message': 'No recording for request'}}, status=404)
+
+        response = record['response'] if record else _fallback_response()
+        delay = backend.delay_for(record) if record else (backend.latency_seconds or 0)
+
+        if method != 'streamGenerateContent':
+            await asyncio.sleep(delay)
+            return web.json_response(response)
+
+        # Stream the recorded text in a few SSE events spread over the simulated latency
+        candidate = (response.get('candidates') or [{}])[0]
+        text = ''.join(part.get('text', '') for part in candidate.get('content', {}).get('parts', []))
+        size = max(1, -(-len(text) // stream_chunks))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or ['']
+
+        stream = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await stream.prepare(request)
+        for index, piece in enumerate(pieces):
+            await asyncio.sleep(delay / len(pieces))
+            event = {'candidates': [{'content': {'parts': [{'text': piece}], 'role': 'model'}}]}
+            if index == len(pieces) - 1:
+                event['candidates'][0]['finishReason'] = candidate.get('finishReason', 'STOP')
+                if response.get('usageMetadata'):
+                    event['usageMetadata'] = response['usageMetadata']
+            await stream.write(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode('utf-8'))
+        await stream.write_eof()
+        return stream
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post('/{version}/models/{model_method}', handle)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Gemini stub server replaying recorded LLM responses')
+    parser.add_argument('--recordings', default='./recordings/llm', help='Recordings directory')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, help='Fixed simulated latency in seconds (default: recorded)')
+    parser.add_argument('--latency-scale', type=float, default=1.0, help='Multiplier for recorded latency')
+    parser.add_argument('--strict', action='store_true', help='Return 404 for unrecorded requests')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    backend = ReplayBackend(RecordingStore(args.recordings), args.latency, args.latency_scale)
+    web.run_app(create_stub_app(backend, fallback_empty=not args.strict), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """Persistent content-addressed cache for Gemini responses backed by SQLite.
+
+    Entries are keyed by a SHA-256 of everything that influences the answer
+    (full prompt, model URL, temperature, max tokens). Eviction is LRU on
+    ``last_access`` bounded by entry count and total stored bytes, and entries
+    older than the TTL are treated as misses and dropped.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 5000, max_bytes: int = 512 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = 7 * 24 * 3600):
+        self.db_path = str(db_path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config) -> Optional["LLMResponseCache"]:
+        """Build the cache from ConfigManager settings, or return None when disabled"""
+        if str(config.get('llm_cache_enabled', True)).lower() not in ('1', 'true', 'yes'):
+            return None
+        ttl_hours = float(config.get('llm_cache_ttl_hours', 168))
+        try:
+            return cls(
+                config.get('llm_cache_path', './cache/llm_responses.sqlite3'),
+                max_entries=int(config.get('llm_cache_max_entries', 5000)),
+                max_bytes=int(float(config.get('llm_cache_max_mb', 512)) * 1024 * 1024),
+                ttl_seconds=ttl_hours * 3600 if ttl_hours > 0 else None
+            )
+        except Exception as exc:
+            logger.warning(f"LLM response cache disabled, could not open database: {exc}")
+            return None
+
+    @staticmethod
+    def make_key(prompt: str, model_url: str, temperature: Any, max_tokens: Any) -> str:
+        """Hash every input that changes the model response"""
+        material = json.dumps(
+            {'prompt': prompt, 'model_url': model_url, 'temperature': temperature, 'max_tokens': max_tokens},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            payload, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                self.evictions += 1
+                return None
+
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+
+        return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+    def put(self, key: str, response: Dict[str, Any]):
+        """Store a response and evict least recently used entries beyond the limits"""
+        payload = zlib.compress(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, payload, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        """Drop expired entries, then the least recently used ones until within limits"""
+        if self.ttl_seconds:
+            cursor = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            self.evictions += max(cursor.rowcount, 0)
+
+        count, total_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC"):
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total_bytes -= size
+
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def clear(self):
+        """Remove every cached response"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            count, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'path': self.db_path,
+            'entries': count,
+            'size_bytes': total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
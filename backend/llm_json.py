@@ -0,0 +1,258 @@
+import json
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StreamAbortedError(Exception):
+    """Raised when a streamed LLM answer is abandoned as runaway output"""
+
+
+class IncrementalJSONAssembler:
+    """Assemble a JSON document from streamed text fragments.
+
+    Fragments are scanned once as they arrive, tracking string/escape state
+    and the container stack, so progress is known without re-parsing the
+    whole buffer: every array item that completes is counted under the key
+    that owns the array (e.g. ``field_mappings``). Runaway answers - too long
+    or repeating the same item over and over - raise StreamAbortedError.
+    """
+
+    def __init__(self, max_chars: int = 0, max_duplicate_items: int = 0):
+        self.max_chars = max_chars
+        self.max_duplicate_items = max_duplicate_items
+        self.item_counts: Dict[str, int] = {}
+        self.duplicate_items = 0
+        self._parts: List[str] = []
+        self._length = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = ''
+        self._pending_key: Optional[str] = None
+        # Stack entries: [container type, owning key, start offset of the current item]
+        self._stack: List[list] = []
+        self._item_hashes: Dict[str, set] = {}
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._parts)
+
+    def feed(self, fragment: str) -> Dict[str, int]:
+        """Consume the next text fragment and return the item counts so far"""
+        if not fragment:
+            return self.item_counts
+        offset = self._length
+        self._parts.append(fragment)
+        self._length += len(fragment)
+        if self.max_chars and self._length > self.max_chars:
+            raise StreamAbortedError(f"streamed answer exceeded {self.max_chars} characters")
+
+        text = None
+        for index, char in enumerate(fragment, offset):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    text = text if text is not None else self.text
+                    self._last_string = text[self._string_start:index]
+                continue
+
+            if char == '"':
+                self._start_item(index)
+                self._in_string = True
+                self._string_start = index + 1
+            elif char == ':' and self._stack and self._stack[-1][0] == 'object':
+                self._pending_key = self._last_string
+            elif char in '{[':
+                owner = self._pending_key
+                self._pending_key = None
+                self._start_item(index)
+                self._stack.append(['object' if char == '{' else 'array', owner, None])
+            elif char in '}]':
+                if char == ']':
+                    text = text if text is not None else self.text
+                    self._finish_item(text, index)
+                if self._stack:
+                    self._stack.pop()
+            elif char == ',':
+                self._pending_key = None
+                text = text if text is not None else self.text
+                self._finish_item(text, index)
+            elif not char.isspace():
+                self._start_item(index)
+        return self.item_counts
+
+    def _start_item(self, index: int):
+        if self._stack and self._stack[-1][0] == 'array' and self._stack[-1][2] is None:
+            self._stack[-1][2] = index
+
+    def _finish_item(self, text: str, end: int):
+        """Count the array item that just ended (if the innermost container is an array)"""
+        if not self._stack or self._stack[-1][0] != 'array' or self._stack[-1][2] is None:
+            return
+        _, owner, start = self._stack[-1]
+        self._stack[-1][2] = None
+        owner = owner or 'items'
+        self.item_counts[owner] = self.item_counts.get(owner, 0) + 1
+
+        if self.max_duplicate_items:
+            digest = hashlib.sha1(text[start:end].strip().encode('utf-8')).hexdigest()
+            seen = self._item_hashes.setdefault(owner, set())
+            if digest in seen:
+                self.duplicate_items += 1
+                if self.duplicate_items > self.max_duplicate_items:
+                    raise StreamAbortedError(f"streamed answer keeps repeating {owner} items")
+            seen.add(digest)
+
+    def result(self) -> Dict[str, Any]:
+        """Parse the assembled text"""
+        return json.loads(self.text)
+
+    def progress(self) -> Dict[str, Any]:
+        return {'chars': self._length, 'items': dict(self.item_counts)}
+
+
+# Item fields that identify an already received list element in follow-up prompts
+ITEM_ID_FIELDS = ('technical_field', 'name', 'error_code', 'error_description', 'condition', 'data', 'source_table')
+
+
+def _strip_code_fence(text: str) -> str:
+    text = (text or '').strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+        if text.rstrip().endswith('```'):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+def repair_truncated_json(text: str, max_attempts: int = 50) -> Optional[Any]:
+    """Salvage the complete elements of a JSON document that was cut off.
+
+    The text is scanned once, remembering every position where a value has
+    just been completed or an array has just been opened, together with the
+    containers still open there. Cuts inside objects that sit in an array
+    are skipped, so a half-written list item is dropped as a whole (a list
+    cut inside its first item comes back empty). The latest cut point whose
+    closed-off prefix parses wins.
+    """
+    text = _strip_code_fence(text)
+    stack = []
+    cut_points = []
+    in_string = False
+    escape = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            boundary = _is_item_boundary(stack)
+            stack.append('}' if char == '{' else ']')
+            if char == '[' and boundary:
+                cut_points.append((index + 1, ''.join(reversed(stack))))
+        elif char in '}]':
+            if not stack:
+                break
+            stack.pop()
+            if _is_item_boundary(stack):
+                cut_points.append((index + 1, ''.join(reversed(stack))))
+        elif char == ',' and stack and _is_item_boundary(stack):
+            cut_points.append((index, ''.join(reversed(stack))))
+
+    for end, closers in reversed(cut_points[-max_attempts:]):
+        try:
+            return json.loads(text[:end] + closers)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def _is_item_boundary(stack: List[str]) -> bool:
+    """True when the innermost open container is an array, or an object not inside any array"""
+    return not stack or stack[-1] == ']' or ']' not in stack
+
+
+def parse_llm_json(text: str) -> Tuple[Any, bool]:
+    """Parse a model answer; returns (data, repaired) where repaired means elements may be missing"""
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+    stripped = _strip_code_fence(text)
+    try:
+        return json.loads(stripped), False
+    except json.JSONDecodeError:
+        pass
+    try:
+        # A complete document followed by prose is not truncated
+        return json.JSONDecoder().raw_decode(stripped)[0], False
+    except json.JSONDecodeError:
+        pass
+    return repair_truncated_json(text), True
+
+
+def merge_json_parts(base: Any, extra: Any) -> Any:
+    """Stitch a follow-up answer onto a partial one: lists are concatenated without duplicates,
+    objects are merged key by key and scalars keep the first non-empty value"""
+    if isinstance(base, dict) and isinstance(extra, dict):
+        merged = dict(base)
+        for key, value in extra.items():
+            merged[key] = merge_json_parts(merged[key], value) if key in merged else value
+        return merged
+    if isinstance(base, list) and isinstance(extra, list):
+        merged = list(base)
+        positions = {_item_id(item): index for index, item in enumerate(merged)}
+        for item in extra:
+            item_id = _item_id(item)
+            if item_id in positions:
+                # Repeated item: complete the earlier copy instead of duplicating it
+                merged[positions[item_id]] = merge_json_parts(merged[positions[item_id]], item)
+            else:
+                positions[item_id] = len(merged)
+                merged.append(item)
+        return merged
+    return base if base not in (None, '', [], {}) else extra
+
+
+def received_items_summary(data: Any, max_chars: int = 4000) -> Dict[str, List[str]]:
+    """Short identifiers of the list items already received, per list key"""
+    summary = {}
+
+    def visit(value: Any):
+        if not isinstance(value, dict):
+            return
+        for key, child in value.items():
+            if isinstance(child, list):
+                summary[key] = [_item_id(item) for item in child]
+            else:
+                visit(child)
+
+    visit(data)
+    text = json.dumps(summary, ensure_ascii=False)
+    while len(text) > max_chars and any(summary.values()):
+        # Keep the most recent identifiers, they matter most for "continue after"
+        longest = max(summary, key=lambda key: len(summary[key]))
+        summary[longest] = summary[longest][len(summary[longest]) // 2 + 1:]
+        text = json.dumps(summary, ensure_ascii=False)
+    return summary
+
+
+def _item_id(item: Any) -> str:
+    if isinstance(item, dict):
+        for field in ITEM_ID_FIELDS:
+            if item.get(field):
+                return str(item[field])[:80]
+        return json.dumps(item, ensure_ascii=False)[:80]
+    return str(item)[:80]
@@ -0,0 +1,575 @@
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any
+from urllib.parse import urlsplit
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: timeouts, throttling and transient server errors
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate for Gemini (about 4 characters per token)"""
+    return len(text or '') // 4 + 1
+
+
+class GeminiAPIError(Exception):
+    """Non-200 response from the Gemini API"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"API call failed with status {status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRYABLE_STATUSES
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 2.0, cap: float = 60.0, retry_after: Optional[float] = None) -> float:
+    """Exponential backoff with full jitter, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class SharedHTTPClient:
+    """Long-lived pooled aiohttp session shared by every LLMClient of an app or CLI run.
+
+    Keeps TCP/TLS connections alive and caches DNS lookups so consecutive
+    Gemini calls across files and jobs reuse the same sockets instead of
+    paying a fresh handshake each time.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 20, dns_cache_ttl: int = 300,
+                 keepalive_timeout: float = 60, timeout_seconds: float = 300):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout_seconds = timeout_seconds
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @classmethod
+    def from_config(cls, config) -> "SharedHTTPClient":
+        """Build the pool from ConfigManager settings"""
+        return cls(
+            limit=int(config.get('http_pool_limit', 100)),
+            limit_per_host=int(config.get('http_pool_limit_per_host', 20)),
+            dns_cache_ttl=int(config.get('http_dns_cache_ttl', 300)),
+            keepalive_timeout=float(config.get('http_keepalive_timeout', 60)),
+            timeout_seconds=float(config.get('http_timeout_seconds', 300))
+        )
+
+    @property
+    def session(self) -> Optional[aiohttp.ClientSession]:
+        """The pooled session, or None when the pool is not started"""
+        if self._session is None or self._session.closed:
+            return None
+        return self._session
+
+    async def start(self, warm_url: str = None):
+        """Open the pooled session and optionally pre-establish a connection to warm_url's host"""
+        if self.session is not None:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout_seconds)
+        )
+        logger.info(
+            f"Started shared HTTP pool (limit={self.limit}, per_host={self.limit_per_host}, "
+            f"dns_ttl={self.dns_cache_ttl}s, keepalive={self.keepalive_timeout}s)"
+        )
+
+        if warm_url:
+            await self.warm(warm_url)
+
+    async def warm(self, url: str):
+        """Resolve DNS and complete the TLS handshake for url's host ahead of the first real call"""
+        parts = urlsplit(url)
+        if not parts.scheme or not parts.netloc:
+            return
+        origin = f"{parts.scheme}://{parts.netloc}/"
+        try:
+            async with self._session.get(origin, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                await response.read()
+            logger.info(f"Warmed HTTP pool connection to {parts.netloc}")
+        except Exception as exc:
+            logger.warning(f"Could not warm HTTP pool connection to {parts.netloc}: {exc}")
+
+    async def close(self):
+        """Close the pooled session and all kept-alive connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("Closed shared HTTP pool")
+        self._session = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+class TokenBucketRateLimiter:
+    """Client-side token bucket sized by requests per minute and tokens per minute.
+
+    A limit of 0 disables that dimension. Callers wait until both buckets hold
+    enough budget, so batch jobs stay under quota instead of bursting into 429s.
+    """
+
+    def __init__(self, requests_per_minute: float = 60, tokens_per_minute: float = 0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_budget = float(requests_per_minute)
+        self._token_budget = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._request_budget = min(self.requests_per_minute,
+                                       self._request_budget + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._token_budget = min(self.tokens_per_minute,
+                                     self._token_budget + elapsed * self.tokens_per_minute / 60)
+
+    async def acquire(self, tokens: int = 0):
+        """Wait until one request carrying roughly `tokens` tokens fits the budget"""
+        if self.tokens_per_minute:
+            # A single oversized prompt must still be able to pass once the bucket is full
+            tokens = min(tokens, self.tokens_per_minute)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if self.requests_per_minute and self._request_budget < 1:
+                    wait = max(wait, (1 - self._request_budget) * 60 / self.requests_per_minute)
+                if self.tokens_per_minute and self._token_budget < tokens:
+                    wait = max(wait, (tokens - self._token_budget) * 60 / self.tokens_per_minute)
+                if wait <= 0:
+                    if self.requests_per_minute:
+                        self._request_budget -= 1
+                    if self.tokens_per_minute:
+                        self._token_budget -= tokens
+                    return
+                await asyncio.sleep(wait)
+
+    def try_acquire(self, tokens: int = 0) -> bool:
+        """Take the budget of one request only if it is available right now; never waits"""
+        if self._lock.locked():
+            # Other callers are already waiting for budget
+            return False
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        now = time.monotonic()
+        self._refill(now)
+        if self._paused_until > now:
+            return False
+        if self.requests_per_minute and self._request_budget < 1:
+            return False
+        if self.tokens_per_minute and self._token_budget < tokens:
+            return False
+        if self.requests_per_minute:
+            self._request_budget -= 1
+        if self.tokens_per_minute:
+            self._token_budget -= tokens
+        return True
+
+    def pause(self, seconds: float):
+        """Hold every caller back, e.g. for the Retry-After of a 429"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD controller for the number of in-flight Gemini requests.
+
+    Each success grows the limit additively (about +1 per window of requests),
+    each throttling response shrinks it multiplicatively. Decreases are
+    rate-limited by a cooldown so one burst of 429s only halves the limit once.
+    """
+
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 32,
+                 decrease_factor: float = 0.5, decrease_cooldown: float = 5.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.in_flight = 0
+        self.throttle_events = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now; never waits"""
+        if not self.has_capacity():
+            return False
+        self.in_flight += 1
+        return True
+
+    async def release(self, outcome: str = 'success'):
+        """Free a slot and adapt the limit; outcome is 'success', 'throttled' or 'error'"""
+        async with self._condition:
+            self.in_flight -= 1
+            if outcome == 'success':
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            elif outcome == 'throttled':
+                self.throttle_events += 1
+                now = time.monotonic()
+                if now - self._last_decrease >= self.decrease_cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                    logger.warning(f"Gemini throttling detected, concurrency limit reduced to {int(self.limit)}")
+            self._condition.notify_all()
+
+
+class GeminiThrottle:
+    """Shared admission control for Gemini calls: rate limiting plus adaptive concurrency"""
+
+    def __init__(self, rate_limiter: TokenBucketRateLimiter, concurrency: AdaptiveConcurrencyLimiter):
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+
+    @classmethod
+    def from_config(cls, config) -> "GeminiThrottle":
+        """Build the throttle from ConfigManager settings"""
+        return cls(
+            TokenBucketRateLimiter(
+                requests_per_minute=float(config.get('llm_requests_per_minute', 60)),
+                tokens_per_minute=float(config.get('llm_tokens_per_minute', 1000000))
+            ),
+            AdaptiveConcurrencyLimiter(
+                initial=int(config.get('llm_initial_concurrency', 8)),
+                minimum=int(config.get('llm_min_concurrency', 1)),
+                maximum=int(config.get('llm_max_concurrency', 32))
+            )
+        )
+
+    async def acquire(self, tokens: int = 0):
+        await self.concurrency.acquire()
+        try:
+            await self.rate_limiter.acquire(tokens)
+        except BaseException:
+            await self.concurrency.release('error')
+            raise
+
+    def try_acquire(self, tokens: int = 0) -> bool:
+        """Admit an optional request (e.g. a hedge) only if a slot and the rate budget are free right now.
+
+        Release it with release() and its own outcome, like any other request.
+        """
+        if not self.concurrency.has_capacity() or not self.rate_limiter.try_acquire(tokens):
+            return False
+        return self.concurrency.try_acquire()
+
+    async def release(self, outcome: str = 'success', retry_after: Optional[float] = None):
+        if outcome == 'throttled' and retry_after:
+            self.rate_limiter.pause(retry_after)
+        await self.concurrency.release(outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'concurrency_limit': int(self.concurrency.limit),
+            'in_flight': self.concurrency.in_flight,
+            'throttle_events': self.concurrency.throttle_events,
+            'requests_per_minute': self.rate_limiter.requests_per_minute,
+            'tokens_per_minute': self.rate_limiter.tokens_per_minute
+        }
+
+
+class RequestHedger:
+    """Tail-latency hedging policy shared by every LLMClient.
+
+    Latencies of successful calls are kept per task in a rolling window.
+    Once a call has been running longer than the configured percentile of
+    its task's recent latencies (or of all recent latencies while the task
+    has too few samples), one duplicate request may be fired. Hedges are
+    capped per minute so a slow Gemini period cannot double quota usage,
+    and each one must get its own GeminiThrottle slot or it is skipped.
+    """
+
+    def __init__(self, percentile: float = 95, min_samples: int = 20, window: int = 200,
+                 max_hedges_per_minute: int = 10, min_delay_seconds: float = 1.0):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.max_hedges_per_minute = max_hedges_per_minute
+        self.min_delay_seconds = min_delay_seconds
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+        self.hedges_throttled = 0
+        self._latencies: Dict[str, deque] = {}
+        self._all_latencies = deque(maxlen=window)
+        self._hedge_times = deque()
+
+    @classmethod
+    def from_config(cls, config) -> Optional["RequestHedger"]:
+        """Build the hedger from ConfigManager settings, or return None when hedging is off"""
+        if str(config.get('llm_hedging_enabled', False)).lower() != 'true':
+            return None
+        return cls(
+            percentile=float(config.get('llm_hedge_percentile', 95)),
+            min_samples=int(config.get('llm_hedge_min_samples', 20)),
+            max_hedges_per_minute=int(config.get('llm_hedge_max_per_minute', 10))
+        )
+
+    @staticmethod
+    def _task_key(task_name: str) -> str:
+        # Chunked calls ("complete_field_mappings#3") share their task's latency profile
+        return (task_name or 'unknown').split('#', 1)[0]
+
+    def observe(self, task_name: str, latency: float):
+        """Record the latency of a successful call"""
+        self._latencies.setdefault(self._task_key(task_name), deque(maxlen=self.window)).append(latency)
+        self._all_latencies.append(latency)
+
+    def hedge_delay(self, task_name: str) -> Optional[float]:
+        """Seconds to wait before hedging a call of this task, or None without enough history"""
+        samples = self._latencies.get(self._task_key(task_name))
+        if not samples or len(samples) < self.min_samples:
+            samples = self._all_latencies
+        if len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay_seconds, ordered[index])
+
+    def has_budget(self) -> bool:
+        """Whether the per-minute hedge budget allows one more hedge"""
+        now = time.monotonic()
+        while self._hedge_times and now - self._hedge_times[0] > 60:
+            self._hedge_times.popleft()
+        return len(self._hedge_times) < self.max_hedges_per_minute
+
+    def try_acquire(self) -> bool:
+        """Take one hedge from the per-minute budget"""
+        if not self.has_budget():
+            return False
+        self._hedge_times.append(time.monotonic())
+        self.hedges_fired += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'percentile': self.percentile,
+            'hedges_fired': self.hedges_fired,
+            'hedge_wins': self.hedge_wins,
+            'hedges_throttled': self.hedges_throttled,
+            'max_hedges_per_minute': self.max_hedges_per_minute,
+            'samples': len(self._all_latencies)
+        }
+
+
+class GeminiContextCache:
+    """Explicit Gemini context caches (cachedContents) for prompt prefixes shared by several calls.
+
+    Each distinct (model, system instruction, prefix) is uploaded once and
+    referenced by name from later generateContent calls. Prefixes below the
+    provider's minimum size are not cached, creation failures are remembered
+    so they are not retried for every task, and close() deletes what was
+    created so no storage is billed after the file is done.
+    """
+
+    def __init__(self, api_key: str, ttl_seconds: int = 600, min_tokens: int = 4096):
+        self.api_key = api_key
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self._handles: Dict[str, "asyncio.Future"] = {}
+        self._created: Dict[str, str] = {}
+
+    @classmethod
+    def from_config(cls, config, api_key: str) -> Optional["GeminiContextCache"]:
+        """Build the registry from ConfigManager settings, or return None when explicit caching is off"""
+        if str(config.get('llm_context_caching', False)).lower() != 'true':
+            return None
+        return cls(
+            api_key,
+            ttl_seconds=int(config.get('llm_context_cache_ttl_seconds', 600)),
+            min_tokens=int(config.get('llm_context_cache_min_tokens', 4096))
+        )
+
+    async def handle_for(self, session: aiohttp.ClientSession, api_url: str, model_name: str,
+                         system_instruction: Dict[str, Any], prefix: str) -> Optional[str]:
+        """Name of a cachedContents entry holding prefix, creating it on first use; None if unavailable"""
+        if not prefix or estimate_tokens(prefix) < self.min_tokens or '/models/' not in api_url:
+            return None
+        key = hashlib.sha256(f"{model_name}\n{system_instruction}\n{prefix}".encode('utf-8')).hexdigest()
+        if key not in self._handles:
+            # Concurrent tasks with the same prefix wait for a single creation request
+            self._handles[key] = asyncio.ensure_future(
+                self._create(session, api_url, model_name, system_instruction, prefix, key)
+            )
+        return await asyncio.shield(self._handles[key])
+
+    async def _create(self, session: aiohttp.ClientSession, api_url: str, model_name: str,
+                      system_instruction: Dict[str, Any], prefix: str, key: str) -> Optional[str]:
+        base_url = api_url.split('/models/', 1)[0]
+        body = {
+            'model': f"models/{model_name}",
+            'systemInstruction': system_instruction,
+            'contents': [{'role': 'user', 'parts': [{'text': prefix}]}],
+            'ttl': f"{self.ttl_seconds}s"
+        }
+        try:
+            async with session.post(f"{base_url}/cachedContents?key={self.api_key}", json=body) as response:
+                if response.status != 200:
+                    logger.warning(f"Context cache not created for {model_name} ({response.status}): "
+                                   f"{(await response.text())[:200]}")
+                    return None
+                name = (await response.json()).get('name')
+        except Exception as exc:
+            logger.warning(f"Context cache not created for {model_name}: {exc}")
+            return None
+        if name:
+            self._created[name] = base_url
+            logger.info(f"Created context cache {name} for ~{estimate_tokens(prefix)} prefix tokens")
+        return name
+
+    async def close(self, session: Optional[aiohttp.ClientSession]):
+        """Delete every cache created by this registry"""
+        for name, base_url in list(self._created.items()):
+            try:
+                if session is not None and not session.closed:
+                    async with session.delete(f"{base_url}/{name}?key={self.api_key}") as response:
+                        await response.read()
+            except Exception as exc:
+                logger.warning(f"Could not delete context cache {name}: {exc}")
+        self._created.clear()
+        self._handles.clear()
+
+
+# usageMetadata counters summed per task and per batch
+USAGE_TOKEN_FIELDS = {
+    'promptTokenCount': 'prompt_tokens',
+    'candidatesTokenCount': 'candidate_tokens',
+    'cachedContentTokenCount': 'cached_content_tokens',
+    'thoughtsTokenCount': 'thoughts_tokens',
+    'totalTokenCount': 'total_tokens'
+}
+
+
+class LLMUsageTracker:
+    """Per-call token, latency and retry accounting for one file's Gemini calls.
+
+    Cache hits are recorded with zero tokens so totals reflect what was
+    actually billed; their wall time is still counted.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def record(self, task_name: str, response: Optional[Dict[str, Any]], wall_time: float,
+               retries: int = 0, cache_hit: bool = False, error: Optional[str] = None):
+        usage = {} if cache_hit else (response or {}).get('usageMetadata') or {}
+        candidate = ((response or {}).get('candidates') or [{}])[0]
+        call = {
+            'task': task_name,
+            'finish_reason': candidate.get('finishReason'),
+            'retries': retries,
+            'wall_time_seconds': round(wall_time, 3),
+            'cache_hit': cache_hit,
+            'error': error
+        }
+        for source_field, field_name in USAGE_TOKEN_FIELDS.items():
+            call[field_name] = int(usage.get(source_field) or 0)
+        self.calls.append(call)
+
+    def per_task(self) -> Dict[str, Dict[str, Any]]:
+        """Totals per task name, in the order the tasks were first recorded"""
+        tasks = {}
+        for call in self.calls:
+            _accumulate(tasks.setdefault(call['task'], _empty_usage()), call)
+        return tasks
+
+    def summary(self) -> Dict[str, Any]:
+        totals = _empty_usage()
+        for call in self.calls:
+            _accumulate(totals, call)
+        return _with_cache_rates({'tasks': self.per_task(), 'totals': totals})
+
+
+def _empty_usage() -> Dict[str, Any]:
+    usage = {field_name: 0 for field_name in USAGE_TOKEN_FIELDS.values()}
+    usage.update({'calls': 0, 'cache_hits': 0, 'errors': 0, 'retries': 0,
+                  'wall_time_seconds': 0.0, 'finish_reasons': {}})
+    return usage
+
+
+def _accumulate(target: Dict[str, Any], call: Dict[str, Any]):
+    """Add one call (or an already aggregated usage dict) onto target"""
+    aggregated = 'calls' in call
+    for field_name in USAGE_TOKEN_FIELDS.values():
+        target[field_name] += call.get(field_name, 0)
+    target['calls'] += call['calls'] if aggregated else 1
+    target['cache_hits'] += call['cache_hits'] if aggregated else int(call['cache_hit'])
+    target['errors'] += call['errors'] if aggregated else int(bool(call['error']))
+    target['retries'] += call['retries']
+    target['wall_time_seconds'] = round(target['wall_time_seconds'] + call['wall_time_seconds'], 3)
+    reasons = call['finish_reasons'] if aggregated else ({call['finish_reason']: 1} if call['finish_reason'] else {})
+    for reason, count in reasons.items():
+        target['finish_reasons'][reason] = target['finish_reasons'].get(reason, 0) + count
+
+
+def _with_cache_rates(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the share of prompt tokens served from provider-side context caching"""
+    for usage in list(summary['tasks'].values()) + [summary['totals']]:
+        prompt_tokens = usage['prompt_tokens']
+        usage['cached_token_rate'] = round(usage['cached_content_tokens'] / prompt_tokens, 4) if prompt_tokens else 0.0
+    return summary
+
+
+def combine_usage(summaries) -> Dict[str, Any]:
+    """Aggregate LLMUsageTracker summaries of several files into one batch summary"""
+    tasks = {}
+    totals = _empty_usage()
+    for summary in summaries:
+        if not summary:
+            continue
+        for task_name, usage in summary.get('tasks', {}).items():
+            _accumulate(tasks.setdefault(task_name, _empty_usage()), usage)
+        _accumulate(totals, summary.get('totals') or _empty_usage())
+    return _with_cache_rates({'tasks': tasks, 'totals': totals})
@@ -1,6 +1,8 @@
 import os
 import re
 import json
+import time
+import hashlib
 import logging
 import asyncio
 import aiohttp
@@ -9,7 +11,7 @@ from bs4 import BeautifulSoup
 from datetime import datetime
 from dataclasses import dataclass, field, asdict, is_dataclass
 from enum import Enum
-from typing import Dict, List, Optional, Any, Union, Set
+from typing import Dict, List, Optional, Any, Union, Set, Callable, Tuple
 from pathlib import Path
 import markdown
 from docx import Document
@@ -18,11 +20,25 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml import parse_xml
 from docx.oxml.ns import nsdecls, qn
 from docx import Document as DocxDocument
-from docxtpl import DocxTemplate
-from md_to_docs_converter import TitlePageGenerator
+from md_to_docs_converter import TitlePageGenerator, default_title_info, finalize_title_info
+from llm_cache import LLMResponseCache
+from extraction_cache import ExtractionCache, file_sha256
+from abap_source import task_code_excerpts, split_into_chunks
+from abap_static_analyzer import STATIC_ANALYSIS_MODES, analyze_abap_source
+from se38_scanner import SE38ListingScanner, is_se38_listing
+from abap_includes import ListingBundle
+from abap_normalizer import normalize_source
+from requirement_list import RequirementListIndex
+from docx_render_farm import DocxRenderFarm
+from docx_template_cache import template_document, template_docxtpl
+from llm_json import IncrementalJSONAssembler, parse_llm_json, merge_json_parts, received_items_summary
+from llm_backends import RecordingStore, ReplayBackend, recording_key, model_name_from_url
+from llm_transport import (
+    SharedHTTPClient, GeminiThrottle, GeminiAPIError, parse_retry_after, backoff_delay, estimate_tokens,
+    LLMUsageTracker, combine_usage, RequestHedger, GeminiContextCache
+)
 import markdown2
 from io import StringIO
-import openpyxl
 import uuid
 import tempfile
 import shutil
@@ -165,6 +181,31 @@ def dataclass_to_dict(obj: Any) -> Any:
         logger.warning(f"Could not serialize object {type(obj)}: {e}")
         return str(obj)  # Fallback to string representation
 
+def fsd_document_from_dict(data: Dict[str, Any]) -> FSDDocument:
+    """Rebuild an FSDDocument from dataclass_to_dict output (e.g. in a render worker)"""
+    def rows(key: str, row_type: type) -> list:
+        return [row_type(**row) for row in data.get(key) or []]
+    
+    def field_mapping(row: Dict[str, Any]) -> FieldMapping:
+        try:
+            processing_type = FieldProcessingType(row.get('processing_type'))
+        except ValueError:
+            processing_type = FieldProcessingType.DIRECT
+        return FieldMapping(**dict(row, processing_type=processing_type))
+    
+    nested = {
+        'selection_parameters': rows('selection_parameters', SelectionParameter),
+        'field_mappings': [field_mapping(row) for row in data.get('field_mappings') or []],
+        'valid_dataset_rules': rows('valid_dataset_rules', DataConditionRow),
+        'country_info': rows('country_info', DataConditionRow),
+        'currency_t500c': rows('currency_t500c', DataConditionRow),
+        'currency_t001': rows('currency_t001', DataConditionRow),
+        'error_scenarios': rows('error_scenarios', ErrorScenario),
+        'test_scenarios': rows('test_scenarios', TestScenario)
+    }
+    known = {name for name in FSDDocument.__dataclass_fields__}
+    return FSDDocument(**{key: value for key, value in data.items() if key in known and key not in nested}, **nested)
+
 # ================================
 # CONFIGURATION MANAGEMENT
 # ================================
@@ -188,9 +229,96 @@ class ConfigManager:
             'template_dir': os.getenv('TEMPLATE_DIR', './Template/FSD'),
             'default_output_dir': os.getenv('OUTPUT_DIR', '/Users/wahyu.perwira/Documents/Project/poc/SAP-AUTOMATE-FD-TD/backend/output/output'),
             'temperature': float(os.getenv('TEMPERATURE', '0.1')),
-            'requirement_list_excel': os.getenv('REQUIREMENT_LIST_EXCEL', 'lookup-sheets/Requirement-List.xlsx')
+            'requirement_list_excel': os.getenv('REQUIREMENT_LIST_EXCEL', 'lookup-sheets/Requirement-List.xlsx'),
+            # Analysis execution: "concurrent" fans the per-file LLM tasks out, "sequential" runs them one by one
+            'analysis_mode': os.getenv('ANALYSIS_MODE', 'concurrent'),
+            'analysis_concurrency': int(os.getenv('ANALYSIS_CONCURRENCY', '4')),
+            # per_task (one call per section), fused (single call) or grouped (a few calls)
+            'analysis_strategy': os.getenv('ANALYSIS_STRATEGY', 'per_task'),
+            # HTML extraction: auto (scanner for SE38 listings, else bs4), scanner or bs4
+            'extraction_engine': os.getenv('EXTRACTION_ENGINE', 'auto'),
+            # Batches: expand INCLUDEs into one program per report, analyze shared includes once
+            'resolve_includes': os.getenv('RESOLVE_INCLUDES', 'false').lower() == 'true',
+            'shared_include_min_tokens': int(os.getenv('SHARED_INCLUDE_MIN_TOKENS', '1000')),
+            # Shrink the source sent to the LLM: whitespace, commented-out code, duplicate comments
+            'normalize_source': os.getenv('NORMALIZE_SOURCE', 'true').lower() == 'true',
+            # Also alias long, frequent variable names (legend line at the top of the code)
+            'normalize_shorten_identifiers': os.getenv('NORMALIZE_SHORTEN_IDENTIFIERS', 'false').lower() == 'true',
+            # Parse declarations deterministically: off, enrich (LLM only describes) or replace (skip LLM task)
+            'static_analysis': os.getenv('STATIC_ANALYSIS', 'enrich'),
+            # Send selection screen / authorization / lookup tasks only the code they need
+            'code_slicing_enabled': os.getenv('CODE_SLICING_ENABLED', 'true').lower() == 'true',
+            # Map-reduce large programs: auto (above the threshold), always or never
+            'chunked_analysis': os.getenv('CHUNKED_ANALYSIS', 'auto'),
+            'chunking_token_threshold': int(os.getenv('CHUNKING_TOKEN_THRESHOLD', '60000')),
+            'chunk_max_tokens': int(os.getenv('CHUNK_MAX_TOKENS', '25000')),
+            # On-disk Gemini response cache
+            'llm_cache_enabled': os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true',
+            'llm_cache_bypass': os.getenv('LLM_CACHE_BYPASS', 'false').lower() == 'true',
+            'llm_cache_path': os.getenv('LLM_CACHE_PATH', './cache/llm_responses.sqlite3'),
+            'llm_cache_max_entries': int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000')),
+            'llm_cache_max_mb': float(os.getenv('LLM_CACHE_MAX_MB', '512')),
+            'llm_cache_ttl_hours': float(os.getenv('LLM_CACHE_TTL_HOURS', '168')),
+            # Parsed HTML listings keyed by file content hash
+            'extraction_cache_enabled': os.getenv('EXTRACTION_CACHE_ENABLED', 'true').lower() == 'true',
+            'extraction_cache_path': os.getenv('EXTRACTION_CACHE_PATH', './cache/extractions.sqlite3'),
+            'extraction_cache_max_entries': int(os.getenv('EXTRACTION_CACHE_MAX_ENTRIES', '2000')),
+            # Also write the FSD as markdown; the final DOCX is rendered from the document itself
+            'markdown_output': os.getenv('MARKDOWN_OUTPUT', 'true').lower() == 'true',
+            # DOCX rendering in worker processes, off the event loop (0 workers renders in a thread)
+            'docx_render_workers': int(os.getenv('DOCX_RENDER_WORKERS', str(min(4, os.cpu_count() or 1)))),
+            'docx_render_timeout_seconds': float(os.getenv('DOCX_RENDER_TIMEOUT_SECONDS', '300')),
+            # Shared HTTP connection pool for Gemini calls
+            'http_pool_limit': int(os.getenv('HTTP_POOL_LIMIT', '100')),
+            'http_pool_limit_per_host': int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', '20')),
+            'http_dns_cache_ttl': int(os.getenv('HTTP_DNS_CACHE_TTL', '300')),
+            'http_keepalive_timeout': float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '60')),
+            'http_timeout_seconds': float(os.getenv('HTTP_TIMEOUT_SECONDS', '300')),
+            # Gemini quota protection: rate limits, retries and adaptive concurrency
+            'llm_requests_per_minute': float(os.getenv('LLM_REQUESTS_PER_MINUTE', '60')),
+            'llm_tokens_per_minute': float(os.getenv('LLM_TOKENS_PER_MINUTE', '1000000')),
+            'llm_max_retries': int(os.getenv('LLM_MAX_RETRIES', '5')),
+            'llm_backoff_base_seconds': float(os.getenv('LLM_BACKOFF_BASE_SECONDS', '2')),
+            'llm_backoff_max_seconds': float(os.getenv('LLM_BACKOFF_MAX_SECONDS', '60')),
+            'llm_initial_concurrency': int(os.getenv('LLM_INITIAL_CONCURRENCY', '8')),
+            'llm_min_concurrency': int(os.getenv('LLM_MIN_CONCURRENCY', '1')),
+            'llm_max_concurrency': int(os.getenv('LLM_MAX_CONCURRENCY', '32')),
+            # Stream answers via streamGenerateContent and abort runaway outputs early
+            'llm_streaming': os.getenv('LLM_STREAMING', 'false').lower() == 'true',
+            'llm_stream_max_chars': int(os.getenv('LLM_STREAM_MAX_CHARS', '200000')),
+            'llm_stream_max_duplicate_items': int(os.getenv('LLM_STREAM_MAX_DUPLICATE_ITEMS', '25')),
+            # Offline runs: "record" saves live responses, "replay" serves only saved ones
+            'llm_backend': os.getenv('LLM_BACKEND', 'live'),
+            'llm_recordings_dir': os.getenv('LLM_RECORDINGS_DIR', './recordings/llm'),
+            'llm_replay_latency_seconds': os.getenv('LLM_REPLAY_LATENCY_SECONDS', ''),
+            'llm_replay_latency_scale': float(os.getenv('LLM_REPLAY_LATENCY_SCALE', '1.0')),
+            # Tail-latency hedging: duplicate calls slower than this percentile of recent latency
+            'llm_hedging_enabled': os.getenv('LLM_HEDGING_ENABLED', 'false').lower() == 'true',
+            'llm_hedge_percentile': float(os.getenv('LLM_HEDGE_PERCENTILE', '95')),
+            'llm_hedge_min_samples': int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20')),
+            'llm_hedge_max_per_minute': int(os.getenv('LLM_HEDGE_MAX_PER_MINUTE', '10')),
+            # Follow-up calls for answers cut off at maxOutputTokens
+            'llm_max_continuations': int(os.getenv('LLM_MAX_CONTINUATIONS', '2')),
+            # Per-task model routing: {"task_name": {"model" | "api_url", "max_tokens", "temperature"}}
+            'llm_task_routes': self._load_json_env('LLM_TASK_ROUTES', {}),
+            # Explicit Gemini context caching of the shared source prefix (implicit caching needs no setup)
+            'llm_context_caching': os.getenv('LLM_CONTEXT_CACHING', 'false').lower() == 'true',
+            'llm_context_cache_ttl_seconds': int(os.getenv('LLM_CONTEXT_CACHE_TTL_SECONDS', '600')),
+            'llm_context_cache_min_tokens': int(os.getenv('LLM_CONTEXT_CACHE_MIN_TOKENS', '4096'))
         })
     
+    @staticmethod
+    def _load_json_env(name: str, default: Any) -> Any:
+        """Read a JSON-encoded environment variable, falling back to default when unset or invalid"""
+        value = os.getenv(name)
+        if not value:
+            return default
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            logger.warning(f"Ignoring invalid JSON in {name}")
+            return default
+    
     def _load_file_config(self, config_file: str):
         """Load configuration from JSON file"""
         try:
@@ -206,6 +334,9 @@ class ConfigManager:
     
     def validate_required(self):
         """Validate required configuration"""
+        # Replaying recordings never talks to Gemini, so no key is needed
+        if str(self.get('llm_backend', 'live')).lower() == 'replay':
+            return
         if not os.getenv('GEMINI_API_KEY'):
             raise ValueError(
                 "GEMINI_API_KEY is required. Set it as environment variable or in config file."
@@ -308,14 +439,14 @@ class WordTemplateProcessor:
     def load_template(self):
         """Load the Word template"""
         try:
-            # Try loading as DocxTemplate first
-            self.template_doc = DocxTemplate(self.template_path)
+            # Try loading as DocxTemplate first (cloned from the parsed template cache)
+            self.template_doc = template_docxtpl(self.template_path)
             logger.info(f"Loaded template as DocxTemplate: {self.template_path}")
         except Exception as e:
             logger.warning(f"Could not load as DocxTemplate: {e}")
             try:
                 # Fallback to regular Document
-                self.document = DocxDocument(self.template_path)
+                self.document = template_document(self.template_path)
                 logger.info(f"Loaded template as Document: {self.template_path}")
             except Exception as e2:
                 logger.error(f"Could not load template: {e2}")
@@ -456,7 +587,7 @@ class WordTemplateProcessor:
             if self.document:
                 doc = self.document
             else:
-                doc = DocxDocument(self.template_path)
+                doc = template_document(self.template_path)
             
             # Replace placeholders in paragraphs
             self._replace_placeholders_in_document(doc, parsed_data)
@@ -594,8 +725,18 @@ class WordTemplateProcessor:
 class EnhancedOutputGenerator:
     """Fixed output generator that ensures complete sections are always generated"""
     
-    def __init__(self, config: ConfigManager):
+    # Polished texts remembered across documents and jobs, keyed by normalized input
+    IMPROVED_TEXT_MEMO_SIZE = 2000
+    
+    def __init__(self, config: ConfigManager, response_cache: Optional[LLMResponseCache] = None,
+                 http_client: Optional[SharedHTTPClient] = None, throttle: Optional[GeminiThrottle] = None,
+                 hedger: Optional[RequestHedger] = None):
         self.config = config
+        self.response_cache = response_cache
+        self.http_client = http_client
+        self.throttle = throttle
+        self.hedger = hedger
+        self.improved_texts: Dict[str, str] = {}
         self.output_dir = Path(config.get('default_output_dir'))
         self.template_dir = Path(config.get('template_dir'))
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -604,14 +745,16 @@ class EnhancedOutputGenerator:
                            template_path: str = None) -> Dict[str, str]:
         """Generate all output formats including Word document"""
         outputs = {}
+        markdown_content = None
         
-        # Generate markdown first (single source of truth)
-        md_file = self.output_dir / f"{base_filename}_fsd.md"
-        markdown_content = self._generate_markdown(fsd_document)
-        
-        with open(md_file, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
-        outputs['markdown'] = str(md_file)
+        # Markdown is an optional artifact; the final DOCX uses build_title_info() instead
+        if self.config.get('markdown_output', True):
+            md_file = self.output_dir / f"{base_filename}_fsd.md"
+            markdown_content = self._generate_markdown(fsd_document)
+            
+            with open(md_file, 'w', encoding='utf-8') as f:
+                f.write(markdown_content)
+            outputs['markdown'] = str(md_file)
         
         # Generate JSON
         json_file = self.output_dir / f"{base_filename}_fsd.json"
@@ -622,14 +765,16 @@ class EnhancedOutputGenerator:
         if template_path and os.path.exists(template_path):
             docx_file = self.output_dir / f"{base_filename}_fsd.docx"
             outputs['docx'] = str(docx_file)
-            self._generate_word_document(markdown_content, template_path, docx_file)
+            self._generate_word_document(markdown_content or self._generate_markdown(fsd_document),
+                                         template_path, docx_file)
         else:
             # Try to find template in template directory
             template_file = self._find_template_file()
             if template_file:
                 docx_file = self.output_dir / f"{base_filename}_fsd.docx"
                 outputs['docx'] = str(docx_file)
-                self._generate_word_document(markdown_content, template_file, docx_file)
+                self._generate_word_document(markdown_content or self._generate_markdown(fsd_document),
+                                             template_file, docx_file)
             else:
                 logger.warning("No template file found, skipping Word document generation")
         
@@ -667,73 +812,100 @@ class EnhancedOutputGenerator:
         except Exception as e:
             logger.error(f"Failed to generate Word document: {e}")
     
+    def _requirement_list(self) -> RequirementListIndex:
+        """Shared in-memory index of the Requirement-List workbook, reloaded when the file changes"""
+        return RequirementListIndex.shared(self.config.get('requirement_list_excel'))
+    
     def _lookup_assign_nodin(self, ricefw_id: str) -> Optional[str]:
         """Lookup Assign Nodin value for a given RICEFW ID from Excel sheet"""
-        excel_path = Path(self.config.get('requirement_list_excel'))
-        if not excel_path.exists():
-            return None
-        try:
-            wb = openpyxl.load_workbook(excel_path, data_only=True)
-            ws = wb.active
-            headers = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-            id_idx = headers.index('SAP WRICEF ID')
-            nodin_idx = headers.index('Assign Nodin')
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if str(row[id_idx]).strip() == ricefw_id:
-                    return str(row[nodin_idx]).strip() if row[nodin_idx] is not None else None
-        except Exception as exc:
-            logger.warning(f"Failed to lookup Assign Nodin for {ricefw_id}: {exc}")
-        return None
+        return self._requirement_list().lookup(ricefw_id, 'Assign Nodin')
     
     def _lookup_requirement_description(self, ricefw_id: str) -> Optional[str]:
         """Lookup Requirement Description for a given RICEFW ID from Excel sheet"""
-        excel_path = Path(self.config.get('requirement_list_excel'))
-        if not excel_path.exists():
-            return None
-        try:
-            wb = openpyxl.load_workbook(excel_path, data_only=True)
-            ws = wb.active
-            headers = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-            id_idx = headers.index('SAP WRICEF ID')
-            desc_idx = headers.index('Requirement Description')
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if str(row[id_idx]).strip() == ricefw_id:
-                    return str(row[desc_idx]).strip() if row[desc_idx] is not None else None
-        except Exception as exc:
-            logger.warning(f"Failed to lookup Requirement Description for {ricefw_id}: {exc}")
-        return None
+        return self._requirement_list().lookup(ricefw_id, 'Requirement Description')
 
+    @staticmethod
+    def _improve_key(text: str) -> str:
+        return ' '.join(text.split()).lower()
+    
     def _improve_text(self, text: str) -> str:
-        """Use LLM to improve Indonesian phrasing"""
-        async def _run(text_val: str) -> str:
-            async with LLMClient(self.config) as llm:
-                prompt = (
-                    "Sempurnakan kalimat berikut agar lebih jelas dan profesional tetang kebutuhan pengguna SAP dalam Bahasa Indonesia dengan menjabarkan detail yang lengkap. "
-                    "Kembalikan JSON {\"result\": \"kalimat\"}.\n\nKalimat: " + text_val
-                )
-                result = await llm.analyze(prompt, {"task": "improve_requirement"})
-                return result.get('result', text_val)
-
+        """Polished phrasing prepared by improve_texts(), or the text itself"""
+        return self.improved_texts.get(self._improve_key(text), text) if text else text
+    
+    def _texts_to_improve(self, fsd_document: FSDDocument) -> List[str]:
+        """Texts _generate_markdown will polish: the requirement from Excel and the composed report description"""
+        texts = []
+        requirement = self._first_requirement_description(fsd_document)
+        if requirement:
+            texts.append(requirement)
+        if not fsd_document.desain_report_description:
+            texts.append(self._draft_report_description(fsd_document))
+        return texts
+    
+    async def improve_texts(self, fsd_documents: List[FSDDocument],
+                            usage_tracker: Optional[LLMUsageTracker] = None):
+        """Polish the Indonesian phrasing of every text the documents need with one LLM call.
+        
+        Pass all documents of a batch to share the call; results are memoized by
+        normalized text, so repeated requirements are never sent twice.
+        """
+        pending = {}
+        for fsd_document in fsd_documents:
+            for text in self._texts_to_improve(fsd_document):
+                key = self._improve_key(text)
+                if key and key not in self.improved_texts:
+                    pending.setdefault(key, text)
+        if not pending:
+            return
+        
+        texts = list(pending.values())
+        numbered = "\n".join(f"{index}. {text}" for index, text in enumerate(texts, 1))
+        prompt = (
+            "Sempurnakan setiap kalimat berikut agar lebih jelas dan profesional tetang kebutuhan pengguna SAP dalam Bahasa Indonesia dengan menjabarkan detail yang lengkap. "
+            f"Kembalikan JSON {{\"results\": [\"kalimat 1\", ...]}} berisi tepat {len(texts)} kalimat dengan urutan yang sama.\n\n"
+            f"Kalimat:\n{numbered}"
+        )
         try:
-            return asyncio.run(_run(text))
+            async with LLMClient(self.config, cache=self.response_cache, http_client=self.http_client,
+                                 throttle=self.throttle, usage_tracker=usage_tracker, hedger=self.hedger) as llm:
+                result = await llm.analyze(prompt, {"task": "improve_requirement"})
         except Exception as exc:
             logger.warning(f"Failed to improve text via LLM: {exc}")
-            return text
+            return
+        
+        improved = result.get('results') if isinstance(result, dict) else None
+        if not isinstance(improved, list) or len(improved) != len(texts):
+            # Unmatched answers are not memoized, the next document tries again
+            logger.warning(f"Text improvement returned {len(improved or [])} of {len(texts)} texts, keeping originals")
+            return
+        for key, text in zip(pending, improved):
+            if isinstance(text, str) and text.strip():
+                self.improved_texts[key] = text.strip()
+        while len(self.improved_texts) > self.IMPROVED_TEXT_MEMO_SIZE:
+            self.improved_texts.pop(next(iter(self.improved_texts)))
+    
+    def improved_texts_for(self, fsd_document: FSDDocument) -> Dict[str, str]:
+        """The memo entries one document needs, to hand to a render worker"""
+        keys = {self._improve_key(text) for text in self._texts_to_improve(fsd_document)}
+        return {key: self.improved_texts[key] for key in keys if key in self.improved_texts}
+    
+    def _first_requirement_description(self, fsd_document: FSDDocument) -> Optional[str]:
+        """Requirement Description from Excel for the first RICEFW ID of the document"""
+        for doc in fsd_document.related_documents:
+            if doc.startswith("RICEFW ID:"):
+                return self._lookup_requirement_description(doc.split(":", 1)[1].strip())
+        return None
         
     def _compose_report_description(self, fsd_document: FSDDocument) -> str:
         """Generate a fallback report description if none provided"""
         if fsd_document.desain_report_description:
             return fsd_document.desain_report_description
-
-        base_desc = ""
+        return self._improve_text(self._draft_report_description(fsd_document))
+    
+    def _draft_report_description(self, fsd_document: FSDDocument) -> str:
+        """Report description from the Excel requirement (or user requirements) and the document counts"""
         # Try to use requirement description from Excel
-        for doc in fsd_document.related_documents:
-            if doc.startswith("RICEFW ID:"):
-                ricefw_id = doc.split(":", 1)[1].strip()
-                lookup_desc = self._lookup_requirement_description(ricefw_id)
-                if lookup_desc:
-                    base_desc = lookup_desc
-                break
+        base_desc = self._first_requirement_description(fsd_document) or ""
 
         if not base_desc:
             base_desc = fsd_document.user_requirements
@@ -753,12 +925,164 @@ class EnhancedOutputGenerator:
                 "Report ini dirancang untuk memenuhi kebutuhan bisnis yang telah ditentukan."
             )
 
-        description = " ".join(parts)
-        return self._improve_text(description)
+        return " ".join(parts)
             
+    def _document_values(self, fsd_document: FSDDocument) -> Dict[str, Any]:
+        """Values the markdown and the title page show instead of the raw document fields (Excel lookups, polished texts)"""
+        nodins = self._requirement_list().lookup_many(
+            [doc.split(":", 1)[1].strip() for doc in fsd_document.related_documents if doc.startswith("RICEFW ID:")],
+            'Assign Nodin'
+        )
+        related_documents = []
+        for doc in fsd_document.related_documents:
+            # related_documents.append(doc) - innitial code
+            if doc.startswith("RICEFW ID:"):
+                ricefw_id = doc.split(":", 1)[1].strip()
+                nodin = nodins.get(ricefw_id)
+                if nodin:
+                    related_documents.append(f"RICEFW ID: {nodin}")
+                else:
+                    related_documents.append(doc)
+            else:
+                related_documents.append(doc)
+        
+        # Determine user requirement from Excel if possible
+        requirement_value = fsd_document.user_requirements
+        desc = self._first_requirement_description(fsd_document)
+        if desc:
+            requirement_value = self._improve_text(desc)
+        
+        # Existing SAP Objects - for loop from the excell information
+        program_name_value = fsd_document.program_name
+        for doc in fsd_document.related_documents:
+            if doc.startswith("RICEFW ID:"):
+                nodin_val = nodins.get(doc.split(":", 1)[1].strip())
+                if nodin_val:
+                    program_name_value = nodin_val
+                break
+        
+        return {
+            'related_documents': related_documents,
+            'user_requirements': requirement_value,
+            'program_name': program_name_value,
+            'design_description': self._compose_report_description(fsd_document)
+        }
+    
+    def build_title_info(self, fsd_document: FSDDocument) -> Dict[str, Any]:
+        """title_info for TitlePageGenerator straight from the document, without writing and re-parsing markdown.
+
+        Unlike the markdown round trip:
+        - related_documents, reviewers and version_history are filled (the
+          markdown reader always returned them empty);
+        - detail_processing_table keeps fields whose text contains "|" or line
+          breaks (the markdown table parser dropped those rows);
+        - valid_datasets_table keeps every dataset (the markdown reader kept
+          only some, e.g. 2 of 5 for ZHR_R_IT0015, dropping P0001, P0015 and
+          P0032);
+        - missing values such as source_table and error_code stay None instead
+          of the string 'None', so the DOCX no longer says "Ambil count dari
+          tabel None";
+        - test_data stays a dict (the table cell renders the same str() text).
+        """
+        values = self._document_values(fsd_document)
+        now = datetime.now()
+        title_info = default_title_info()
+        title_info.update(
+            program_name=fsd_document.program_name.strip(),
+            description=fsd_document.report_description.strip(),
+            generated_date=now.strftime('%Y-%m-%d'),
+            generated_time=now.strftime('%H:%M:%S'),
+            generated_datetime=now.strftime('%Y-%m-%d %H:%M:%S'),
+            document_location=fsd_document.document_location.strip(),
+            related_documents=values['related_documents'],
+            reviewers=[f"{reviewer.get('role', '')}: {reviewer.get('name', '')}" for reviewer in fsd_document.reviewers],
+            version_history=[
+                f"{version.get('version', '')}: {version.get('change', '')} by {version.get('author', '')} on {version.get('date', '')}"
+                for version in fsd_document.version_history
+            ],
+            user_requirements=str(values['user_requirements'] or '').strip(),
+            assumptions=[assumption.strip() for assumption in fsd_document.assumptions],
+            sap_program_name=str(values['program_name'] or '').strip(),
+            transaction_code=fsd_document.transaction_code.strip(),
+            menu_path=fsd_document.menu_path.strip()
+        )
+        if fsd_document.project_name and fsd_document.project_name.strip():
+            title_info['project_name'] = fsd_document.project_name.strip()
+        
+        # Last RHR id mentioned in the document header, as the markdown reader picks it
+        header_texts = [fsd_document.program_name, fsd_document.report_description, *values['related_documents'],
+                        title_info['user_requirements'], *fsd_document.assumptions, title_info['sap_program_name']]
+        ricefw_ids = re.findall(r'RHR\d+', '\n'.join(str(text) for text in header_texts))
+        if ricefw_ids:
+            title_info['ricefw_id'] = ricefw_ids[-1]
+        
+        title_info['selection_screen_table'] = [
+            {
+                'parameter': param.name,
+                'type': param.type,
+                'description': param.description,
+                'mandatory': "Yes" if param.is_mandatory else "No",
+                'select_option': "Yes" if param.is_select_option else "No",
+                'no_intervals': "Yes" if param.has_no_intervals else "No"
+            }
+            for param in fsd_document.selection_parameters
+        ]
+        title_info['detail_processing_table'] = [
+            {
+                'field_name': field.display_name,
+                'technical_field': field.technical_field,
+                'source_table': field.source_table,
+                'processing_logic': field.processing_logic,
+                'processing_type': field.processing_type.value if isinstance(field.processing_type, Enum) else str(field.processing_type)
+            }
+            for field in fsd_document.field_mappings
+        ]
+        for key, rows in (('valid_datasets_table', fsd_document.valid_dataset_rules),
+                          ('country_info_table', fsd_document.country_info),
+                          ('currency_t500c_table', fsd_document.currency_t500c),
+                          ('currency_t001_table', fsd_document.currency_t001)):
+            title_info[key] = [{'data': row.data, 'condition': row.condition} for row in rows]
+        title_info['error_handling_table'] = [
+            {
+                'no': str(i),
+                'error_description': error.error_description,
+                'resolution': error.resolution,
+                'error_code': error.error_code,
+                'severity': error.severity
+            }
+            for i, error in enumerate(fsd_document.error_scenarios, 1)
+        ]
+        title_info['testing_requirements_table'] = [
+            {
+                'no': str(i),
+                'test_condition': test.condition,
+                'expected_result': test.expected_result,
+                'test_data': test.test_data,
+                'priority': test.priority
+            }
+            for i, test in enumerate(fsd_document.test_scenarios, 1)
+        ]
+        
+        # Numbered sections as _generate_markdown writes them
+        design_subsections = ["Description detail dari Report"]
+        if fsd_document.selection_parameters:
+            design_subsections.append("Selection Screen")
+        if fsd_document.field_mappings:
+            design_subsections.append("Detail Processing")
+        if fsd_document.valid_dataset_rules:
+            design_subsections.append("Detail Process Only valid datasets")
+        sections = [("INFORMASI DOKUMEN", []), ("PERSYARATAN UMUM", []), ("EXISTING SAP OBJECTS", []),
+                    ("DESAIN", design_subsections)]
+        if fsd_document.error_scenarios:
+            sections.append(("PENANGANAN ERROR", []))
+        if fsd_document.test_scenarios:
+            sections.append(("PERSYARATAN PENGUJIAN", []))
+        return finalize_title_info(title_info, sections)
+    
     def _generate_markdown(self, fsd_document: FSDDocument) -> str:
         """Generate Markdown content"""
         md_lines = []
+        values = self._document_values(fsd_document)
         
         # Title
         md_lines.extend([
@@ -781,17 +1105,8 @@ class EnhancedOutputGenerator:
         
         if fsd_document.related_documents:
             md_lines.append("- **Related Documents**:")
-            for doc in fsd_document.related_documents:
-                # md_lines.append(f"  - {doc}") - innitial code
-                if doc.startswith("RICEFW ID:"):
-                    ricefw_id = doc.split(":", 1)[1].strip()
-                    nodin = self._lookup_assign_nodin(ricefw_id)
-                    if nodin:
-                        md_lines.append(f"  - RICEFW ID: {nodin}")
-                    else:
-                        md_lines.append(f"  - {doc}")
-                else:
-                    md_lines.append(f"  - {doc}")
+            for doc in values['related_documents']:
+                md_lines.append(f"  - {doc}")
             md_lines.append("")
         
         if fsd_document.reviewers:
@@ -806,22 +1121,12 @@ class EnhancedOutputGenerator:
                 md_lines.append(f"  - {version.get('version', '')}: {version.get('change', '')} by {version.get('author', '')} on {version.get('date', '')}")
             md_lines.append("")
         
-        # Determine user requirement from Excel if possible
-        requirement_value = fsd_document.user_requirements
-        for doc in fsd_document.related_documents:
-            if doc.startswith("RICEFW ID:"):
-                ricefw_id = doc.split(":", 1)[1].strip()
-                desc = self._lookup_requirement_description(ricefw_id)
-                if desc:
-                    requirement_value = self._improve_text(desc)
-                break
-        
         # General Requirements
         md_lines.extend([
             "## 2. PERSYARATAN UMUM",
             "",
             # f"**User Requirements**: {fsd_document.user_requirements}",
-            f"**User Requirements**: {requirement_value}",
+            f"**User Requirements**: {values['user_requirements']}",
             "",
             "**Assumptions**:",
         ])
@@ -830,36 +1135,24 @@ class EnhancedOutputGenerator:
             md_lines.append(f"- {assumption}")
         md_lines.append("")
 
-        # Existing SAP Objects - for loop from the excell information
-        program_name_value = fsd_document.program_name
-        for doc in fsd_document.related_documents:
-            if doc.startswith("RICEFW ID:"):
-                ricefw_id = doc.split(":", 1)[1].strip()
-                nodin_val = self._lookup_assign_nodin(ricefw_id)
-                if nodin_val:
-                    program_name_value = nodin_val
-                break
-
-        
         # Existing SAP Objects
         md_lines.extend([
             "## 3. EXISTING SAP OBJECTS",
             "",
             # f"- **Program Name**: {fsd_document.program_name}",
-            f"- **Program Name**: {program_name_value}",
+            f"- **Program Name**: {values['program_name']}",
             f"- **Transaction Code**: {fsd_document.transaction_code}",
             f"- **Menu Path**: {fsd_document.menu_path}",
             ""
         ])
 
         #Additional Design Section
-        desain_description_value = self._compose_report_description(fsd_document)
         md_lines.extend([
             "## 4. DESAIN",
             "",
             "### 4.1 Description detail dari Report",
             "",
-            desain_description_value,
+            values['design_description'],
             ""
         ])
         
@@ -1004,109 +1297,460 @@ class EnhancedOutputGenerator:
 class LLMClient:
     """Asynchronous LLM client for Gemini API"""
     
-    def __init__(self, config: ConfigManager):
+    # Sent as systemInstruction so every prompt starts with the shared source prefix
+    SYSTEM_INSTRUCTION = """
+        Anda adalah seorang pengembang SAP ABAP sekaligus konsultan fungsional yang sangat berpengalaman dalam membuat
+        dokumen Functional Specification Design (FSD). Anda menganalisis kode ABAP dan mengekstrak informasi penting untuk
+        menyusun dokumentasi FSD yang komprehensif.
+
+        Tugas Anda adalah:
+        1. Menganalisis kode ABAP beserta komentar yang diberikan.
+        2. Menghasilkan informasi terstruktur untuk setiap bagian FSD.
+
+        Ketentuan:
+        - Selalu berikan respons dalam format JSON yang valid.
+        - Analisis harus teliti dan akurat.
+        - Anda **WAJIB** menjawab **HANYA** dalam **Bahasa Indonesia**; dilarang menggunakan bahasa lain.
+        """
+    
+    def __init__(self, config: ConfigManager, cache: Optional[LLMResponseCache] = None,
+                 http_client: Optional[SharedHTTPClient] = None, throttle: Optional[GeminiThrottle] = None,
+                 progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                 usage_tracker: Optional[LLMUsageTracker] = None, hedger: Optional[RequestHedger] = None):
         self.config = config
         self.session = None
+        self.progress_callback = progress_callback
+        self.usage_tracker = usage_tracker
+        self.hedger = hedger
+        self.max_continuations = int(config.get('llm_max_continuations', 2))
+        self.streaming = str(config.get('llm_streaming', False)).lower() == 'true'
+        self.stream_max_chars = int(config.get('llm_stream_max_chars', 200000))
+        self.stream_max_duplicate_items = int(config.get('llm_stream_max_duplicate_items', 25))
+        self.http_client = http_client
+        self.throttle = throttle
+        self.max_retries = int(config.get('llm_max_retries', 5))
+        self.backoff_base = float(config.get('llm_backoff_base_seconds', 2))
+        self.backoff_max = float(config.get('llm_backoff_max_seconds', 60))
+        self._owns_session = False
+        self.cache = cache
+        self.cache_bypass = str(config.get('llm_cache_bypass', False)).lower() == 'true'
         # self.api_key = os.getenv('GEMINI_API_KEY')
         # self.api_url = config.get('gemini_api_url')
         self.api_key = os.getenv('GEMINI_API_KEY', '').strip('"')
         self.api_url = config.get('gemini_api_url', '').strip('"')
         self.max_tokens = config.get('max_tokens')
         self.temperature = config.get('temperature')
+        self.model_name = model_name_from_url(self.api_url)
+        self.task_routes = config.get('llm_task_routes') or {}
+        self.backend_mode = str(config.get('llm_backend', 'live')).lower()
+        self.recording_store = RecordingStore.from_config(config)
+        self.replay_backend = None
+        if self.backend_mode == 'replay' and self.recording_store:
+            self.replay_backend = ReplayBackend.from_config(config, self.recording_store)
+        # Cache handles are per run, so recordings keyed on the request body would never match again
+        self.context_cache = GeminiContextCache.from_config(config, self.api_key) if self.backend_mode == 'live' else None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        # Reuse the app-wide pooled session when available, otherwise fall back to a private one
+        shared_session = self.http_client.session if self.http_client else None
+        if shared_session is not None:
+            self.session = shared_session
+            self._owns_session = False
+        else:
+            self.session = aiohttp.ClientSession()
+            self._owns_session = True
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
+        if self.context_cache:
+            await self.context_cache.close(self.session)
+        if self.session and self._owns_session:
             await self.session.close()
+        self.session = None
     
-    async def analyze(self, prompt: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Send analysis request to LLM"""
+    async def analyze(self, prompt: str, context: Dict[str, Any] = None,
+                      bypass_cache: bool = False, shared_prefix: str = None) -> Dict[str, Any]:
+        """Send analysis request to LLM, serving repeated prompts from the response cache.
+        
+        shared_prefix (e.g. the ABAP source) is placed before the task prompt and is
+        identical across the tasks of a file, so Gemini can cache it.
+        """
+        task_name = (context or {}).get('task', 'unknown')
+        started = time.perf_counter()
+        call_stats = {'retries': 0}
         try:
             full_prompt = self._build_prompt(prompt, context)
-            response = await self._call_api(full_prompt)
-            return self._parse_response(response)
+            
+            cache_key = None
+            if self.cache:
+                route = self._route_for(task_name)
+                cache_key = self.cache.make_key(
+                    f"{self.SYSTEM_INSTRUCTION}\n{shared_prefix or ''}{full_prompt}",
+                    route['api_url'], route['temperature'], route['max_tokens']
+                )
+                if not (bypass_cache or self.cache_bypass):
+                    cached_response = await asyncio.to_thread(self.cache.get, cache_key)
+                    if cached_response is not None:
+                        logger.info(f"LLM cache hit for task: {task_name}")
+                        parsed = self._parse_response(cached_response)
+                        self._record_usage(task_name, cached_response, started, call_stats, cache_hit=True)
+                        self._report_progress(task_name, self._completed_progress(parsed, cached=True))
+                        return parsed
+            
+            response = await self._call_api(full_prompt, task_name, call_stats, shared_prefix)
+            parsed, truncated = self._parse_response_checked(response)
+            self._record_usage(task_name, response, started, call_stats)
+            if truncated:
+                parsed = await self._continue_truncated(full_prompt, parsed, task_name, shared_prefix)
+                # Cache the stitched answer so a rerun does not repeat the follow-ups
+                response = self._stitched_response(parsed)
+            self._report_progress(task_name, self._completed_progress(parsed))
+            
+            # Only remember answers that parsed, so a broken response is retried next run
+            if cache_key and parsed:
+                await asyncio.to_thread(self.cache.put, cache_key, response)
+            return parsed
         except Exception as e:
             logger.error(f"LLM analysis failed: {e}")
+            self._record_usage(task_name, None, started, call_stats, error=str(e))
+            self._report_progress(task_name, {'status': 'failed', 'error': str(e)})
             return {}
     
+    def _record_usage(self, task_name: str, response: Optional[Dict[str, Any]], started: float,
+                      call_stats: Dict[str, Any], cache_hit: bool = False, error: str = None):
+        """Record tokens, finish reason, retries and wall time of one analyze call"""
+        if self.usage_tracker:
+            self.usage_tracker.record(task_name, response, time.perf_counter() - started,
+                                      retries=call_stats['retries'], cache_hit=cache_hit, error=error)
+    
+    def _report_progress(self, task_name: str, progress: Dict[str, Any]):
+        """Forward per-task progress to the caller (e.g. the job status), never failing the call"""
+        if not self.progress_callback:
+            return
+        try:
+            self.progress_callback(task_name, progress)
+        except Exception as e:
+            logger.warning(f"Progress callback failed for {task_name}: {e}")
+    
+    @staticmethod
+    def _completed_progress(parsed: Dict[str, Any], cached: bool = False) -> Dict[str, Any]:
+        items = {key: len(value) for key, value in parsed.items() if isinstance(value, list)}
+        return {'status': 'completed' if parsed else 'empty', 'items': items, 'cached': cached}
+    
     def _build_prompt(self, prompt: str, context: Dict[str, Any] = None) -> str:
-        system_prompt = """
-        Anda adalah seorang pengembang SAP ABAP sekaligus konsultan fungsional yang sangat berpengalaman dalam membuat
-        dokumen Functional Specification Design (FSD). Anda menganalisis kode ABAP dan mengekstrak informasi penting untuk
-        menyusun dokumentasi FSD yang komprehensif.
-
-        Tugas Anda adalah:
-        1. Menganalisis kode ABAP beserta komentar yang diberikan.
-        2. Menghasilkan informasi terstruktur untuk setiap bagian FSD.
-
-        Ketentuan:
-        - Selalu berikan respons dalam format JSON yang valid.
-        - Analisis harus teliti dan akurat.
-        - Anda **WAJIB** menjawab **HANYA** dalam **Bahasa Indonesia**; dilarang menggunakan bahasa lain.
-        """
-        
+        """Task part of the prompt; the system prompt travels separately as systemInstruction"""
         context_section = ""
         if context:
             context_section = f"\n\nContext Information:\n{json.dumps(context, indent=2)}"
         
-        return f"{system_prompt}\n\n{prompt}{context_section}"
+        return f"{prompt}{context_section}"
     
-    async def _call_api(self, prompt: str) -> Dict[str, Any]:
+    async def _call_api(self, prompt: str, task_name: str = 'unknown',
+                        call_stats: Optional[Dict[str, Any]] = None, shared_prefix: str = None) -> Dict[str, Any]:
         """Make API call to Gemini"""
+        route = self._route_for(task_name)
         headers = {
             "Content-Type": "application/json"
         }
+        system_instruction = {"parts": [{"text": self.SYSTEM_INSTRUCTION}]}
+        
+        # Shared prefix first, task suffix last: either referenced through an explicit
+        # context cache or sent inline, where Gemini's implicit prefix caching can hit
+        cache_name = None
+        if self.context_cache and shared_prefix and self.session is not None:
+            cache_name = await self.context_cache.handle_for(
+                self.session, route['api_url'], route['model_name'], system_instruction, shared_prefix
+            )
         
         payload = {
             "contents": [
                 {
+                    "role": "user",
                     "parts": [
-                        {"text": prompt}
+                        {"text": prompt if cache_name else f"{shared_prefix or ''}{prompt}"}
                     ]
                 }
             ],
             "generationConfig": {
-                "temperature": self.temperature,
+                "temperature": route['temperature'],
                 "topK": 1,
                 "topP": 1,
-                "maxOutputTokens": self.max_tokens,
+                "maxOutputTokens": route['max_tokens'],
                 "response_mime_type": "application/json"
             }
         }
-        
-        url = f"{self.api_url}?key={self.api_key}"
-        print(f"[Debug - Call API] Calling LLM API: {url}")
-        # print(f"[Debug - Call API] Payload: {json.dumps(payload, indent=2)}")
-        
+        if cache_name:
+            payload["cachedContent"] = cache_name
+        else:
+            payload["systemInstruction"] = system_instruction
+        
+        # Replay mode answers from recordings only, without quota or network
+        if self.replay_backend:
+            return await self.replay_backend.generate(route['model_name'], payload)
+        
+        url = f"{route['api_url']}?key={self.api_key}"
+        stream_url = self._stream_url(route['api_url'])
+        # Never log the full URL, it carries the API key
+        logger.debug(f"Calling LLM API: {route['api_url']} (task: {task_name})")
+        
+        estimated_tokens = estimate_tokens(prompt) + int(route['max_tokens'] or 0)
+        attempt = 0
+        while True:
+            if self.throttle:
+                await self.throttle.acquire(estimated_tokens)
+            outcome, retry_after = 'error', None
+            try:
+                request_started = time.perf_counter()
+                if stream_url:
+                    send = lambda: self._post_stream(stream_url, headers, payload, task_name)
+                else:
+                    send = lambda: self._post(url, headers, payload)
+                result = await self._send_hedged(send, task_name, estimated_tokens)
+                outcome = 'success'
+                if self.backend_mode == 'record' and self.recording_store:
+                    await self._record_response(route['model_name'], payload, result,
+                                                time.perf_counter() - request_started)
+                return result
+            except GeminiAPIError as e:
+                retry_after = e.retry_after
+                if e.status == 429:
+                    outcome = 'throttled'
+                if not e.retryable or attempt >= self.max_retries:
+                    raise
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                error = e
+            finally:
+                if self.throttle:
+                    await self.throttle.release(outcome, retry_after)
+            
+            delay = backoff_delay(attempt, self.backoff_base, self.backoff_max, retry_after)
+            attempt += 1
+            if call_stats is not None:
+                call_stats['retries'] = attempt
+            logger.warning(f"Gemini call failed ({error}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+    
+    async def _send_hedged(self, send: Callable[[], Any], task_name: str, estimated_tokens: int = 0) -> Dict[str, Any]:
+        """Run send(); if it is slower than the hedging percentile, race a duplicate and keep the first success"""
+        started = time.perf_counter()
+        if not self.hedger:
+            return await send()
+        
+        primary = asyncio.ensure_future(send())
+        pending = {primary}
+        try:
+            hedge_delay = self.hedger.hedge_delay(task_name)
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done and self.hedger.has_budget():
+                    # The duplicate is a request of its own: it needs a free throttle slot, or it is skipped
+                    if self.throttle and not self.throttle.try_acquire(estimated_tokens):
+                        self.hedger.hedges_throttled += 1
+                        logger.debug(f"Not hedging {task_name}: no throttle slot free")
+                    elif self.hedger.try_acquire():
+                        logger.info(f"Hedging {task_name}: no answer after {hedge_delay:.1f}s, firing duplicate request")
+                        pending.add(asyncio.ensure_future(self._send_hedge(send)))
+            
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedger.hedge_wins += 1
+                        self.hedger.observe(task_name, time.perf_counter() - started)
+                        return task.result()
+            # Every attempt failed: surface the primary's error to the retry loop
+            raise primary.exception()
+        finally:
+            # Cancel the loser (or everything, if we were cancelled ourselves)
+            for task in pending:
+                task.cancel()
+    
+    async def _send_hedge(self, send: Callable[[], Any]) -> Dict[str, Any]:
+        """Run the duplicate request, releasing its throttle slot with its own outcome"""
+        outcome, retry_after = 'error', None
+        try:
+            result = await send()
+            outcome = 'success'
+            return result
+        except GeminiAPIError as e:
+            retry_after = e.retry_after
+            if e.status == 429:
+                outcome = 'throttled'
+            raise
+        finally:
+            if self.throttle:
+                await self.throttle.release(outcome, retry_after)
+    
+    async def _post(self, url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Single POST to Gemini, raising GeminiAPIError on any non-200 status"""
         async with self.session.post(url, headers=headers, json=payload) as response:
             if response.status == 200:
-                result = await response.json()
-                return result
-            else:
+                return await response.json()
+            error_text = await response.text()
+            raise GeminiAPIError(response.status, error_text, parse_retry_after(response.headers.get('Retry-After')))
+    
+    async def _record_response(self, model_name: str, payload: Dict[str, Any], response: Dict[str, Any],
+                               latency: float):
+        """Save a live response for later replay; a failed write never fails the call"""
+        try:
+            await asyncio.to_thread(self.recording_store.save, recording_key(payload, model_name),
+                                    model_name, payload, response, latency)
+        except Exception as e:
+            logger.warning(f"Could not record LLM response: {e}")
+    
+    def _route_for(self, task_name: str) -> Dict[str, Any]:
+        """Model endpoint, max_tokens and temperature for a task, from the routing table or the defaults"""
+        # Chunk and continuation calls follow their base task; a fused call only
+        # follows a route when every task in it is routed the same way
+        base_name = (task_name or '').split('#', 1)[0].split('+continuation', 1)[0]
+        if base_name.startswith('fused:'):
+            routes = [self.task_routes.get(name) for name in base_name[len('fused:'):].split('+')]
+            task_route = routes[0] if routes and all(route == routes[0] for route in routes) else None
+        else:
+            task_route = self.task_routes.get(base_name)
+        task_route = task_route or {}
+        
+        api_url = task_route.get('api_url') or self.api_url
+        if task_route.get('model') and not task_route.get('api_url'):
+            api_url = re.sub(r'/models/[^/:]+', f"/models/{task_route['model']}", self.api_url)
+        return {
+            'api_url': api_url,
+            'model_name': model_name_from_url(api_url),
+            'max_tokens': task_route.get('max_tokens', self.max_tokens),
+            'temperature': task_route.get('temperature', self.temperature)
+        }
+    
+    def _stream_url(self, api_url: str) -> Optional[str]:
+        """Server-sent-events URL for streamGenerateContent, or None when streaming is off or unsupported"""
+        if not self.streaming or ':generateContent' not in api_url:
+            return None
+        return f"{api_url.replace(':generateContent', ':streamGenerateContent')}?alt=sse&key={self.api_key}"
+    
+    async def _post_stream(self, url: str, headers: Dict[str, str], payload: Dict[str, Any],
+                           task_name: str) -> Dict[str, Any]:
+        """Streaming POST to Gemini, assembling the chunks into a generateContent-shaped response"""
+        assembler = IncrementalJSONAssembler(self.stream_max_chars, self.stream_max_duplicate_items)
+        finish_reason = None
+        usage_metadata = None
+        
+        async with self.session.post(url, headers=headers, json=payload) as response:
+            if response.status != 200:
                 error_text = await response.text()
-                raise Exception(f"API call failed with status {response.status}: {error_text}")
+                raise GeminiAPIError(response.status, error_text, parse_retry_after(response.headers.get('Retry-After')))
+            
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8').strip()
+                if not line.startswith('data:'):
+                    continue
+                chunk = json.loads(line[len('data:'):].strip())
+                candidate = (chunk.get('candidates') or [{}])[0]
+                for part in candidate.get('content', {}).get('parts', []):
+                    assembler.feed(part.get('text', ''))
+                finish_reason = candidate.get('finishReason', finish_reason)
+                usage_metadata = chunk.get('usageMetadata', usage_metadata)
+                self._report_progress(task_name, dict(assembler.progress(), status='streaming'))
+        
+        result = {
+            "candidates": [{
+                "content": {"parts": [{"text": assembler.text}], "role": "model"},
+                "finishReason": finish_reason
+            }]
+        }
+        if usage_metadata:
+            result["usageMetadata"] = usage_metadata
+        return result
     
     def _parse_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
         """Parse API response and extract JSON content"""
+        parsed, _ = self._parse_response_checked(response)
+        return parsed
+    
+    def _parse_response_checked(self, response: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """Parse API response, also reporting whether the answer was cut off"""
         try:
-            content = response.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "{}")
-            return json.loads(content)
-        except (json.JSONDecodeError, KeyError) as e:
+            candidate = response.get("candidates", [{}])[0]
+            content = candidate.get("content", {}).get("parts", [{}])[0].get("text", "{}")
+        except (KeyError, IndexError, AttributeError) as e:
             logger.error(f"Failed to parse LLM response: {e}")
-            return {}
+            return {}, False
+        
+        parsed, repaired = parse_llm_json(content)
+        if repaired:
+            if parsed is None:
+                logger.error("Failed to parse LLM response: JSON could not be repaired")
+            else:
+                logger.warning("LLM response was not valid JSON, salvaged its complete elements")
+        if not isinstance(parsed, dict):
+            parsed = {}
+        return parsed, repaired or candidate.get('finishReason') == 'MAX_TOKENS'
+    
+    async def _continue_truncated(self, full_prompt: str, parsed: Dict[str, Any], task_name: str,
+                                  shared_prefix: str = None) -> Dict[str, Any]:
+        """Ask for the items a truncated answer is missing and stitch them onto what was received"""
+        for round_number in range(1, self.max_continuations + 1):
+            follow_up_task = f"{task_name}+continuation{round_number}"
+            logger.warning(f"LLM answer for {task_name} was truncated, requesting the remaining items ({follow_up_task})")
+            started = time.perf_counter()
+            call_stats = {'retries': 0}
+            try:
+                response = await self._call_api(self._build_continuation_prompt(full_prompt, parsed),
+                                                follow_up_task, call_stats, shared_prefix)
+            except Exception as e:
+                logger.warning(f"Continuation request for {task_name} failed: {e}")
+                self._record_usage(follow_up_task, None, started, call_stats, error=str(e))
+                break
+            
+            extra, truncated = self._parse_response_checked(response)
+            self._record_usage(follow_up_task, response, started, call_stats)
+            if not extra:
+                break
+            parsed = merge_json_parts(parsed, extra)
+            if not truncated:
+                break
+        return parsed
+    
+    def _build_continuation_prompt(self, full_prompt: str, parsed: Dict[str, Any]) -> str:
+        received = json.dumps(received_items_summary(parsed), ensure_ascii=False, indent=2)
+        return f"""{full_prompt}
+
+        PERHATIAN: Jawaban sebelumnya untuk tugas ini TERPOTONG karena batas panjang output.
+        Item yang SUDAH diterima (per key):
+        {received}
+
+        Kembalikan JSON dengan format yang SAMA, tetapi HANYA berisi item yang BELUM ada di daftar di atas.
+        Jangan ulangi item yang sudah diterima. Jika semua item sudah lengkap, kembalikan list kosong.
+        """
+    
+    @staticmethod
+    def _stitched_response(parsed: Dict[str, Any]) -> Dict[str, Any]:
+        """generateContent-shaped response carrying a stitched answer"""
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": json.dumps(parsed, ensure_ascii=False)}], "role": "model"},
+                "finishReason": "STOP"
+            }]
+        }
 
 # ================================
 # ABAP HTML EXTRACTOR
 # ================================
 
+# HTML extraction engines; "scanner" only understands the SE38 "Code listing for:" export layout
+EXTRACTION_ENGINES = ('auto', 'scanner', 'bs4')
+
 class ABAPHTMLExtractor:
     """Enhanced ABAP HTML extractor"""
     
-    def __init__(self, html_file_path: str):
+    def __init__(self, html_file_path: str, engine: str = None):
         self.file_path = html_file_path
+        self.engine = (engine or 'auto').lower()
+        if self.engine not in EXTRACTION_ENGINES:
+            logger.warning(f"Unknown extraction engine '{engine}', using auto")
+            self.engine = 'auto'
         self.soup = None
         self.raw_data = {}
     
@@ -1115,6 +1759,19 @@ class ABAPHTMLExtractor:
         if not os.path.exists(self.file_path):
             raise FileNotFoundError(f"File not found: {self.file_path}")
         
+        engine = self.engine
+        if engine == 'auto':
+            engine = 'scanner' if is_se38_listing(self.file_path) else 'bs4'
+        
+        if engine == 'scanner':
+            # Memory-mapped single pass, no DOM; same raw_data as the BeautifulSoup path
+            self.raw_data = {
+                'file_path': self.file_path,
+                'file_name': os.path.basename(self.file_path),
+                **SE38ListingScanner(self.file_path).scan()
+            }
+            return self.raw_data
+        
         with open(self.file_path, 'r', encoding='utf-8') as file:
             html_content = file.read()
         
@@ -1154,65 +1811,436 @@ class ABAPHTMLExtractor:
             return h3_elem.get_text().replace('Description: ', '').strip()
         return ""
 
+def extract_listing(html_file_path: str, engine: str = None, cache: Optional[ExtractionCache] = None,
+                    content_hash: str = None) -> Dict[str, Any]:
+    """Extracted raw_data plus its static analysis, reused by file content hash when a cache is given"""
+    if cache is not None:
+        content_hash = content_hash or file_sha256(html_file_path)
+        cached = cache.get(content_hash)
+        if cached is not None:
+            logger.info(f"Extraction cache hit for {os.path.basename(html_file_path)} ({content_hash[:12]})")
+            return {'file_path': html_file_path, 'file_name': os.path.basename(html_file_path), **cached}
+    
+    raw_data = ABAPHTMLExtractor(html_file_path, engine=engine).extract_all()
+    raw_data['static_analysis'] = analyze_abap_source(raw_data.get('raw_code', ''))
+    if cache is not None:
+        # Path and name belong to this upload, the content to every copy of it
+        cache.put(content_hash, {key: value for key, value in raw_data.items() if key not in ('file_path', 'file_name')})
+    return raw_data
+
+# Analysis strategies: one call per task, one call for everything, or a few grouped calls
+ANALYSIS_STRATEGIES = ('per_task', 'fused', 'grouped')
+
+# Example routing table: the fast model for short structured answers, the pro model (default URL) for the rest
+SAMPLE_LLM_TASK_ROUTES = {
+    "basic_info": {"model": "gemini-1.5-flash-latest", "max_tokens": 2048},
+    "selection_screen": {"model": "gemini-1.5-flash-latest", "max_tokens": 2048},
+    "authorization": {"model": "gemini-1.5-flash-latest", "max_tokens": 1024},
+    "validation_rules": {"model": "gemini-1.5-flash-latest", "max_tokens": 2048},
+    "complete_field_mappings": {"max_tokens": 8192},
+    "complete_lookup_forms": {"max_tokens": 8192}
+}
+
+# Task groups for the "grouped" strategy, balanced so no single answer gets too long
+ANALYSIS_TASK_GROUPS = [
+    ("basic_info", "selection_screen", "validation_rules", "authorization"),
+    ("complete_field_mappings",),
+    ("complete_valid_datasets", "complete_lookup_forms"),
+    ("error_handling", "test_scenarios")
+]
+
+# Tasks answered per code chunk in chunked mode: list key and the item fields used to deduplicate
+CHUNKED_TASK_MERGE_KEYS = {
+    "complete_field_mappings": ("field_mappings", ("technical_field",)),
+    "error_handling": ("error_scenarios", ("error_code", "error_description")),
+    "test_scenarios": ("test_scenarios", ("condition",))
+}
+
 class IntelligentFSDMapper:
     """Fixed Intelligent FSD mapper with comprehensive structure analysis"""
     
-    def __init__(self, config: ConfigManager):
+    def __init__(self, config: ConfigManager, response_cache: Optional[LLMResponseCache] = None,
+                 http_client: Optional[SharedHTTPClient] = None, throttle: Optional[GeminiThrottle] = None,
+                 hedger: Optional[RequestHedger] = None, extraction_cache: Optional[ExtractionCache] = None):
         self.config = config
-        self.fsd_document = FSDDocument()
-        self.fsd_document.project_name = config.get('project_name')
-        
-    async def analyze_and_map(self, html_file_path: str) -> FSDDocument:
-        """Main method to analyze HTML and create FSD document"""
+        self.response_cache = response_cache
+        self.http_client = http_client
+        self.throttle = throttle
+        self.hedger = hedger
+        self.extraction_cache = extraction_cache
+        
+    async def analyze_and_map(self, html_file_path: str, analysis_strategy: str = None,
+                              progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                              usage_tracker: Optional[LLMUsageTracker] = None,
+                              raw_data: Optional[Dict[str, Any]] = None) -> Tuple[FSDDocument, Optional[Dict[str, Any]]]:
+        """Main method to analyze HTML and create FSD document; also returns the source normalization report"""
         logger.info(f"Starting fixed comprehensive FSD mapping for: {html_file_path}")
         
-        # Extract raw data from HTML
-        extractor = ABAPHTMLExtractor(html_file_path)
-        raw_data = extractor.extract_all()
+        # The document is local to this call: the mapper is shared by every concurrent job
+        fsd_document = FSDDocument()
+        fsd_document.project_name = self.config.get('project_name')
+        
+        # Extract raw data from HTML (and the declarations parsed from it), cached by content hash;
+        # batches with resolved includes pass the logical program instead
+        if raw_data is None:
+            raw_data = await asyncio.to_thread(
+                extract_listing, html_file_path, self.config.get('extraction_engine'), self.extraction_cache
+            )
         
         # Set basic document info
-        self.fsd_document.document_location = raw_data['file_name']
+        fsd_document.document_location = raw_data['file_name']
+        
+        # Selection screen, authorization objects and output fields straight from the declarations
+        if self._static_analysis_mode() == 'off':
+            raw_data.pop('static_analysis', None)
+        
+        # Fewer prompt tokens; the static analysis above already ran on the original code
+        raw_data = self._normalize_source(raw_data)
         
         # Fixed comprehensive LLM analysis
-        async with LLMClient(self.config) as llm:
-            await self._analyze_with_fixed_comprehensive_llm(llm, raw_data)
+        async with LLMClient(self.config, cache=self.response_cache, http_client=self.http_client,
+                             throttle=self.throttle, progress_callback=progress_callback,
+                             usage_tracker=usage_tracker, hedger=self.hedger) as llm:
+            await self._analyze_with_fixed_comprehensive_llm(llm, raw_data, fsd_document, analysis_strategy)
         
         logger.info("Fixed comprehensive FSD mapping completed successfully")
-        return self.fsd_document
+        return fsd_document, raw_data.get('source_normalization')
+    
+    async def analyze_shared_includes(self, includes: Dict[str, Dict[str, Any]],
+                                      progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                                      usage_tracker: Optional[LLMUsageTracker] = None) -> Dict[str, Dict[str, Any]]:
+        """Condense each shared include into reusable facts with one LLM call per include"""
+        async with LLMClient(self.config, cache=self.response_cache, http_client=self.http_client,
+                             throttle=self.throttle, progress_callback=progress_callback,
+                             usage_tracker=usage_tracker, hedger=self.hedger) as llm:
+            includes = {name: self._normalize_source(raw_data) for name, raw_data in includes.items()}
+            analysis_tasks = [
+                (f"include_facts#{name}", self._create_include_facts_prompt(raw_data, include_source=False),
+                 self._source_block(raw_data))
+                for name, raw_data in includes.items()
+            ]
+            call_results = await self._run_analysis_tasks(llm, analysis_tasks)
+        return {name: call_results.get(f"include_facts#{name}") or {} for name in includes}
+    
+    def _analysis_prompt_builders(self) -> List[tuple]:
+        """Analysis tasks in mapping order with their prompt builders"""
+        return [
+            ("basic_info", self._create_enhanced_basic_info_prompt),
+            ("selection_screen", self._create_enhanced_selection_screen_prompt),
+            ("complete_field_mappings", self._create_complete_field_mappings_prompt),  # FIXED
+            ("complete_valid_datasets", self._create_complete_valid_datasets_prompt),  # FIXED
+            ("complete_lookup_forms", self._create_complete_lookup_forms_prompt),      # FIXED
+            ("error_handling", self._create_error_handling_prompt),
+            ("test_scenarios", self._create_test_scenarios_prompt),
+            ("validation_rules", self._create_validation_rules_prompt),
+            ("authorization", self._create_authorization_prompt)
+        ]
+    
+    def _normalize_source(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+        """raw_data with the token-saving source normalization applied, when enabled"""
+        if not self.config.get('normalize_source', True):
+            return raw_data
+        return normalize_source(raw_data, bool(self.config.get('normalize_shorten_identifiers', False)))
+    
+    def _static_analysis_mode(self) -> str:
+        mode = str(self.config.get('static_analysis', 'enrich')).lower()
+        if mode not in STATIC_ANALYSIS_MODES:
+            logger.warning(f"Unknown static analysis mode '{mode}', using enrich")
+            return 'enrich'
+        return mode
+    
+    def _static_task_results(self, raw_data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """LLM-shaped results for the tasks the static analyzer could answer"""
+        static = raw_data.get('static_analysis') or {}
+        results = {}
+        if static.get('selection_parameters'):
+            results['selection_screen'] = {'selection_parameters': static['selection_parameters']}
+        if static.get('authorization_objects'):
+            results['authorization'] = {'authorization_objects': static['authorization_objects']}
+        return results
+    
+    def _resolve_analysis_strategy(self, analysis_strategy: str = None) -> str:
+        """Pick the analysis strategy from the request, falling back to configuration"""
+        strategy = (analysis_strategy or self.config.get('analysis_strategy') or 'per_task').lower()
+        if strategy not in ANALYSIS_STRATEGIES:
+            logger.warning(f"Unknown analysis strategy '{strategy}', using per_task")
+            return 'per_task'
+        return strategy
     
-    async def _analyze_with_fixed_comprehensive_llm(self, llm: LLMClient, raw_data: Dict[str, Any]):
+    async def _analyze_with_fixed_comprehensive_llm(self, llm: LLMClient, raw_data: Dict[str, Any],
+                                                    fsd_document: FSDDocument, analysis_strategy: str = None):
         """Perform fixed comprehensive LLM analysis"""
+        strategy = self._resolve_analysis_strategy(analysis_strategy)
+        builders = dict(self._analysis_prompt_builders())
+        
+        # per_task sends one prompt per section; fused/grouped share the source between sections
+        if strategy == 'fused':
+            task_groups = [tuple(builders)]
+        elif strategy == 'grouped':
+            task_groups = ANALYSIS_TASK_GROUPS
+        else:
+            task_groups = [(task_name,) for task_name in builders]
+        
+        # Tasks fully answered by the static analyzer need no LLM call in replace mode
+        static_results = self._static_task_results(raw_data)
+        if static_results and self._static_analysis_mode() == 'replace':
+            task_groups = [tuple(task_name for task_name in group if task_name not in static_results)
+                           for group in task_groups]
+            task_groups = [group for group in task_groups if group]
+            logger.info(f"Static analysis replaces LLM tasks: {', '.join(static_results)}")
+        logger.info(f"Analysis strategy: {strategy} ({len(task_groups)} LLM calls)")
+        
+        # Large programs: run the list-style tasks per code chunk and merge them afterwards
+        code_chunks = self._split_code_for_chunked_analysis(raw_data.get('raw_code', ''))
+        if code_chunks:
+            task_groups = [
+                tuple(task_name for task_name in group if task_name not in CHUNKED_TASK_MERGE_KEYS)
+                for group in task_groups
+            ]
+            task_groups = [group for group in task_groups if group]
         
-        # Enhanced analysis tasks with FIXED prompts
-        analysis_tasks = [
-            ("basic_info", self._create_enhanced_basic_info_prompt(raw_data)),
-            ("selection_screen", self._create_enhanced_selection_screen_prompt(raw_data)),
-            ("complete_field_mappings", self._create_complete_field_mappings_prompt(raw_data)),  # FIXED
-            ("complete_valid_datasets", self._create_complete_valid_datasets_prompt(raw_data)),  # FIXED
-            ("complete_lookup_forms", self._create_complete_lookup_forms_prompt(raw_data)),      # FIXED
-            ("error_handling", self._create_error_handling_prompt(raw_data)),
-            ("test_scenarios", self._create_test_scenarios_prompt(raw_data)),
-            ("validation_rules", self._create_validation_rules_prompt(raw_data)),
-            ("authorization", self._create_authorization_prompt(raw_data))
-        ]
+        # Slice the source per call so tasks only see the statements they analyze
+        if str(self.config.get('code_slicing_enabled', True)).lower() == 'true':
+            code_excerpts = task_code_excerpts(raw_data.get('raw_code', ''), task_groups)
+        else:
+            code_excerpts = {}
+        
+        # Enhanced analysis tasks with FIXED prompts: (name, short task suffix, shared source prefix)
+        analysis_tasks = []
+        full_source_tokens = estimate_tokens(self._source_block(raw_data)) if code_excerpts else 0
+        for group in task_groups:
+            task_data = raw_data
+            if group in code_excerpts:
+                task_data = dict(raw_data, raw_code=code_excerpts[group])
+                # Comments and shared include facts are sent in full, so count the whole source block
+                sliced_tokens = estimate_tokens(self._source_block(task_data))
+                logger.info(
+                    f"Source slice for {'+'.join(group)}: ~{full_source_tokens} -> ~{sliced_tokens} tokens "
+                    f"({100 * (1 - sliced_tokens / max(1, full_source_tokens)):.0f}% less, comments included)"
+                )
+            if len(group) == 1:
+                task_prompt = builders[group[0]](task_data, include_source=False)
+                analysis_tasks.append((group[0], task_prompt, self._source_block(task_data)))
+            else:
+                task_prompt = self._create_fused_prompt(task_data, group, include_source=False)
+                analysis_tasks.append((f"fused:{'+'.join(group)}", task_prompt, self._source_block(task_data)))
+        
+        for task_name in (CHUNKED_TASK_MERGE_KEYS if code_chunks else ()):
+            for index, chunk in enumerate(code_chunks, 1):
+                # No "all fields required" hint per chunk; the skeleton is completed after merging.
+                # Comments cannot be mapped to chunk lines, so they and the include facts go with chunk 1 only
+                header = f"* Bagian {index} dari {len(code_chunks)} program (analisis per bagian"
+                header += "; komentar program disertakan di bagian ini)" if index == 1 else "; komentar ada di bagian 1)"
+                chunk_data = dict(raw_data, raw_code=f"{header}\n{chunk}", static_analysis=None)
+                if index > 1:
+                    chunk_data.update(raw_comments='', shared_include_facts=None)
+                analysis_tasks.append((f"{task_name}#{index}", builders[task_name](chunk_data, include_source=False),
+                                       self._source_block(chunk_data)))
         
         # Execute all analyses
+        call_results = await self._run_analysis_tasks(llm, analysis_tasks)
+        
+        # Split grouped answers back into per-task results, always in mapping order
         results = {}
-        for task_name, prompt in analysis_tasks:
-            try:
-                logger.info(f"Analyzing with fixed prompt: {task_name}")
-                result = await llm.analyze(prompt, {"task": task_name})
-                results[task_name] = result
-            except Exception as e:
-                logger.error(f"Failed to analyze {task_name}: {e}")
-                results[task_name] = {}
+        if code_chunks:
+            for task_name in CHUNKED_TASK_MERGE_KEYS:
+                chunk_results = [call_results.get(f"{task_name}#{index}") or {} for index in range(1, len(code_chunks) + 1)]
+                results[task_name] = self._merge_chunk_results(task_name, chunk_results)
+        for group, (call_name, *_) in zip(task_groups, analysis_tasks):
+            call_result = call_results.get(call_name) or {}
+            for task_name in group:
+                if len(group) == 1:
+                    results[task_name] = call_result
+                else:
+                    task_result = call_result.get(task_name)
+                    results[task_name] = task_result if isinstance(task_result, dict) else {}
+        results = {task_name: results.get(task_name, {}) for task_name in builders}
+        
+        # Parsed declarations win over the model for everything the source states literally
+        for task_name, static_result in static_results.items():
+            results[task_name] = self._merge_static_result(task_name, static_result, results[task_name])
+        results['complete_field_mappings'] = self._complete_field_skeleton(
+            results['complete_field_mappings'], (raw_data.get('static_analysis') or {}).get('field_skeleton', [])
+        )
         
         # Map results to FSD document
-        await self._map_fixed_results_to_fsd(results)
+        await self._map_fixed_results_to_fsd(fsd_document, results)
+    
+    def _merge_static_result(self, task_name: str, static_result: Dict[str, Any],
+                             llm_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Combine parsed declarations with the model's descriptions and anything the parser missed"""
+        llm_result = llm_result or {}
+        if task_name == 'selection_screen':
+            described = {
+                str(param.get('name', '')).lower(): param
+                for param in llm_result.get('selection_parameters', []) if isinstance(param, dict)
+            }
+            parameters = []
+            for param in static_result['selection_parameters']:
+                merged = dict(param)
+                enriched = described.pop(param['name'].lower(), {})
+                for attribute in ('description', 'default_value', 'block_name', 'validation_logic'):
+                    if not merged.get(attribute) and enriched.get(attribute):
+                        merged[attribute] = enriched[attribute]
+                parameters.append(merged)
+            # Declarations the parser could not see (macros, dynamic screens) still come through
+            parameters.extend(param for param in described.values() if param.get('type'))
+            return dict(llm_result, selection_parameters=parameters)
+        
+        if task_name == 'authorization':
+            objects = list(static_result['authorization_objects'])
+            objects += [obj for obj in llm_result.get('authorization_objects', []) if obj and obj not in objects]
+            return dict(llm_result, authorization_objects=objects)
+        return llm_result or static_result
+    
+    def _complete_field_skeleton(self, field_result: Dict[str, Any],
+                                 skeleton: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Add output structure fields the model skipped, in structure order"""
+        if not skeleton:
+            return field_result
+        mappings = list((field_result or {}).get('field_mappings', []))
+        known = {str(mapping.get('technical_field', '')).lower() for mapping in mappings if isinstance(mapping, dict)}
+        missing = [item for item in skeleton if item['technical_field'] not in known]
+        if not missing:
+            return field_result
+        logger.info(f"Static analysis adds {len(missing)} output fields missing from the LLM field mappings")
+        for item in missing:
+            mappings.append({
+                'display_name': item['technical_field'].upper(),
+                'technical_field': item['technical_field'],
+                'source_table': item['source_table'],
+                'processing_logic': f"Field struktur output ({item['type']})",
+                'processing_type': 'DIRECT'
+            })
+        return dict(field_result or {}, field_mappings=mappings)
+    
+    def _split_code_for_chunked_analysis(self, raw_code: str) -> List[str]:
+        """Code chunks for map-reduce analysis, or an empty list when the program fits in one prompt"""
+        mode = str(self.config.get('chunked_analysis', 'auto')).lower()
+        if mode == 'never' or not raw_code:
+            return []
+        
+        code_tokens = estimate_tokens(raw_code)
+        threshold = int(self.config.get('chunking_token_threshold', 60000))
+        if mode != 'always' and code_tokens <= threshold:
+            return []
+        
+        chunks = split_into_chunks(raw_code, int(self.config.get('chunk_max_tokens', 25000)))
+        if len(chunks) < 2:
+            return []
+        logger.info(f"Chunked analysis: ~{code_tokens} code tokens split into {len(chunks)} chunks")
+        return chunks
+    
+    def _merge_chunk_results(self, task_name: str, chunk_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Merge per-chunk answers of one task, deduplicating list items by their technical key"""
+        list_key, key_fields = CHUNKED_TASK_MERGE_KEYS[task_name]
+        merged = {}
+        for chunk_result in chunk_results:
+            for item in chunk_result.get(list_key) or []:
+                if not isinstance(item, dict):
+                    continue
+                # First non-empty key field wins, e.g. error_code before error_description
+                key = next((str(item.get(field)).strip().lower() for field in key_fields if item.get(field)), None)
+                if key is None:
+                    key = json.dumps(item, sort_keys=True, ensure_ascii=False)
+                existing = merged.get(key)
+                if existing is None:
+                    merged[key] = dict(item)
+                    continue
+                # Same item seen in several chunks: keep the richest value per attribute
+                for attribute, value in item.items():
+                    if value and len(str(value)) > len(str(existing.get(attribute) or '')):
+                        existing[attribute] = value
+        
+        logger.info(f"Merged {len(chunk_results)} chunk results for {task_name}: {len(merged)} {list_key}")
+        return {list_key: list(merged.values())} if merged else {}
+    
+    def _source_block(self, raw_data: Dict[str, Any]) -> str:
+        """ABAP source and comments, laid out identically for every task so it forms a cacheable prompt prefix"""
+        block = f"""Kode ABAP:
+{raw_data.get('raw_code', '')}
+
+Komentar:
+{raw_data.get('raw_comments', '')}
+
+"""
+        if raw_data.get('shared_include_facts'):
+            # Shared includes were analyzed once; their code is replaced by these facts
+            block += f"""Fakta include bersama (kode tidak disertakan, anggap sebagai bagian dari program):
+{json.dumps(raw_data['shared_include_facts'], ensure_ascii=False, indent=1)}
+
+"""
+        return block
+    
+    def _with_source(self, instructions: str, raw_data: Dict[str, Any], include_source: bool = True) -> str:
+        """Prefix task instructions with the ABAP source block"""
+        if not include_source:
+            return instructions
+        return self._source_block(raw_data) + instructions
     
-    def _create_complete_field_mappings_prompt(self, raw_data: Dict[str, Any]) -> str:
+    def _create_fused_prompt(self, raw_data: Dict[str, Any], task_names: tuple, include_source: bool = True) -> str:
+        """Ask for several FSD sections in one structured response, sending the source only once"""
+        builders = dict(self._analysis_prompt_builders())
+        task_sections = "\n".join(
+            f"""
+        ===== TUGAS "{task_name}" =====
+        {builders[task_name](raw_data, include_source=False)}"""
+            for task_name in task_names
+        )
+        instructions = f"""
+        Lakukan BEBERAPA analisis sekaligus terhadap kode ABAP yang sama di bagian awal prompt ini.
+        Setiap tugas di bawah memiliki format JSON sendiri.
+
+        Kembalikan SATU objek JSON dengan key berupa nama tugas dan value berupa objek JSON
+        sesuai format tugas tersebut. Key yang WAJIB ada: {", ".join(task_names)}
+
+        {{
+            "{task_names[0]}": {{ ...format JSON tugas {task_names[0]}... }},
+            ...
+        }}
+        {task_sections}
+
+        **WAJIB: SETIAP TUGAS HARUS DIANALISIS SELENGKAP SEPERTI JIKA DIKERJAKAN SENDIRI!**
+        """
+        return self._with_source(instructions, raw_data, include_source)
+    
+    def _get_analysis_concurrency(self) -> int:
+        """Resolve how many analysis tasks of one file may run at the same time"""
+        if str(self.config.get('analysis_mode', 'concurrent')).lower() == 'sequential':
+            return 1
+        try:
+            return max(1, int(self.config.get('analysis_concurrency', 4)))
+        except (TypeError, ValueError):
+            return 1
+    
+    async def _run_analysis_tasks(self, llm: LLMClient, analysis_tasks: List[tuple]) -> Dict[str, Dict[str, Any]]:
+        """Run analysis tasks with a bounded fan-out, returning results in task order"""
+        semaphore = asyncio.Semaphore(self._get_analysis_concurrency())
+        
+        async def run_task(task_name: str, prompt: str, shared_prefix: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._run_analysis_task(llm, task_name, prompt, shared_prefix)
+        
+        task_results = await asyncio.gather(
+            *(run_task(task_name, prompt, shared_prefix) for task_name, prompt, shared_prefix in analysis_tasks)
+        )
+        
+        # Rebuild in declaration order so mapping stays deterministic regardless of completion order
+        return {task_name: result for (task_name, *_), result in zip(analysis_tasks, task_results)}
+    
+    async def _run_analysis_task(self, llm: LLMClient, task_name: str, prompt: str,
+                                 shared_prefix: str = None) -> Dict[str, Any]:
+        """Run a single analysis task, never letting one failure abort the others"""
+        try:
+            logger.info(f"Analyzing with fixed prompt: {task_name}")
+            return await llm.analyze(prompt, {"task": task_name}, shared_prefix=shared_prefix)
+        except Exception as e:
+            logger.error(f"Failed to analyze {task_name}: {e}")
+            return {}
+    
+    def _create_complete_field_mappings_prompt(self, raw_data: Dict[str, Any], include_source: bool = True) -> str:
         """FIXED: Complete field mappings prompt that captures ALL structure fields"""
-        return f"""
+        instructions = f"""
         Analisis kode ABAP secara MENYELURUH untuk mengekstrak SEMUA field dari struktur output report.
 
         TUGAS ANALISIS SANGAT KOMPREHENSIF:
@@ -1283,16 +2311,20 @@ class IntelligentFSDMapper:
         **WAJIB: ANALISIS HARUS MENCAKUP SEMUA FIELD YANG ADA DI STRUKTUR DATA!**
         **JANGAN LEWATKAN FIELD APAPUN!**
 
-        Kode ABAP:
-        {raw_data.get('raw_code', '')}
+        """
+        static = raw_data.get('static_analysis') or {}
+        if static.get('field_skeleton'):
+            field_lines = "\n".join(f"        - {item['technical_field']} {item['type']}" for item in static['field_skeleton'])
+            instructions += f"""
+        **STRUKTUR OUTPUT {static['output_structure']} (hasil parsing deklarasi, semua field WAJIB ada):**
+{field_lines}
 
-        Komentar:
-        {raw_data.get('raw_comments', '')}
         """
+        return self._with_source(instructions, raw_data, include_source)
     
-    def _create_complete_valid_datasets_prompt(self, raw_data: Dict[str, Any]) -> str:
+    def _create_complete_valid_datasets_prompt(self, raw_data: Dict[str, Any], include_source: bool = True) -> str:
         """FIXED: Complete valid datasets prompt that analyzes actual validation logic"""
-        return f"""
+        instructions = f"""
         Analisis kode ABAP secara MENYELURUH untuk mengidentifikasi aturan dataset valid dan logika validasi.
 
         TUGAS ANALISIS SANGAT KOMPREHENSIF:
@@ -1349,16 +2381,12 @@ class IntelligentFSDMapper:
         **WAJIB: HARUS MENGANALISIS SEMUA INFOTYPE YANG DIDEKLARASIKAN!**
         **KONDISI HARUS BERDASARKAN KODE ACTUAL, BUKAN TEMPLATE GENERIC!**
 
-        Kode ABAP:
-        {raw_data.get('raw_code', '')}
-
-        Komentar:
-        {raw_data.get('raw_comments', '')}
         """
+        return self._with_source(instructions, raw_data, include_source)
     
-    def _create_complete_lookup_forms_prompt(self, raw_data: Dict[str, Any]) -> str:
+    def _create_complete_lookup_forms_prompt(self, raw_data: Dict[str, Any], include_source: bool = True) -> str:
         """FIXED: Complete lookup forms prompt that analyzes all lookup operations"""
-        return f"""
+        instructions = f"""
         Analisis kode ABAP secara MENYELURUH untuk mengidentifikasi SEMUA operasi lookup dan helper logic.
 
         TUGAS ANALISIS SANGAT KOMPREHENSIF:
@@ -1460,17 +2488,13 @@ class IntelligentFSDMapper:
         **WAJIB: HARUS MENGANALISIS SEMUA READ TABLE OPERATIONS!**
         **KONDISI HARUS MENJELASKAN LOGIC ACTUAL DARI KODE!**
 
-        Kode ABAP:
-        {raw_data.get('raw_code', '')}
-
-        Komentar:
-        {raw_data.get('raw_comments', '')}
         """
+        return self._with_source(instructions, raw_data, include_source)
     
     # Keep other existing prompts but enhance them
-    def _create_enhanced_basic_info_prompt(self, raw_data: Dict[str, Any]) -> str:
+    def _create_enhanced_basic_info_prompt(self, raw_data: Dict[str, Any], include_source: bool = True) -> str:
         """Enhanced basic info prompt"""
-        return f"""
+        instructions = f"""
         Analisis kode ABAP secara mendalam untuk mengekstrak semua informasi dasar program.
 
         TUGAS ANALISIS KOMPREHENSIF:
@@ -1497,19 +2521,73 @@ class IntelligentFSDMapper:
             "functional_contact": "nama kontak fungsional dari komentar"
         }}
 
-        Kode ABAP:
-        {raw_data.get('raw_code', '')}
-
-        Komentar:
-        {raw_data.get('raw_comments', '')}
-
         HTML Title: {raw_data.get('html_title', '')}
         HTML Description: {raw_data.get('html_description', '')}
         """
+        return self._with_source(instructions, raw_data, include_source)
+    
+    def _create_include_facts_prompt(self, raw_data: Dict[str, Any], include_source: bool = True) -> str:
+        """Facts of a shared include, reused by every program that includes it"""
+        instructions = f"""
+        Kode di atas adalah INCLUDE {raw_data.get('html_title', '')} yang dipakai bersama oleh beberapa program.
+        Ringkas SEMUA fakta yang dibutuhkan untuk menulis FSD program pemanggilnya, tanpa menyalin kode.
+        Sebutkan nama field, tabel dan kondisi secara persis seperti di kode.
+
+        Kembalikan JSON:
+        {{
+            "purpose": "fungsi include ini",
+            "declarations": [
+                {{"name": "nama_type_data_atau_konstanta", "kind": "TYPES|DATA|CONSTANTS|TABLES", "fields": ["field TYPE referensi"]}}
+            ],
+            "selection_parameters": [
+                {{"name": "nama_parameter", "type": "tipe", "description": "deskripsi", "is_mandatory": true/false}}
+            ],
+            "routines": [
+                {{
+                    "name": "nama FORM/METHOD",
+                    "purpose": "fungsi rutin",
+                    "tables_read": ["tabel yang dibaca dengan kondisi WHERE/READ TABLE"],
+                    "fields_filled": ["struktur-field = sumber atau logika pengisian"],
+                    "conditions": ["kondisi validasi atau filter"],
+                    "messages": ["MESSAGE beserta kondisinya"]
+                }}
+            ],
+            "authorization_objects": ["objek AUTHORITY-CHECK"]
+        }}
+
+        """
+        return self._with_source(instructions, raw_data, include_source)
     
-    def _create_enhanced_selection_screen_prompt(self, raw_data: Dict[str, Any]) -> str:
+    def _create_enhanced_selection_screen_prompt(self, raw_data: Dict[str, Any], include_source: bool = True) -> str:
         """Enhanced selection screen prompt"""
-        return f"""
+        parameters = (raw_data.get('static_analysis') or {}).get('selection_parameters')
+        if parameters:
+            # Declarations are already parsed; only ask for what the source does not state literally
+            instructions = f"""
+        Parameter selection screen berikut SUDAH diekstrak dari deklarasi PARAMETERS/SELECT-OPTIONS:
+        {json.dumps(parameters, ensure_ascii=False)}
+
+        TUGAS: lengkapi HANYA informasi berikut untuk setiap parameter:
+        1. description dari text elements, selection texts, komentar atau inferensi yang akurat
+        2. default_value yang diisi di INITIALIZATION (jika belum ada)
+        3. validation_logic dari AT SELECTION-SCREEN
+        Laporkan juga parameter yang TIDAK ada di daftar di atas (lengkap dengan type).
+
+        Kembalikan JSON dengan format:
+        {{
+            "selection_parameters": [
+                {{
+                    "name": "nama_parameter",
+                    "description": "deskripsi parameter",
+                    "default_value": "nilai_default_dari_INITIALIZATION_jika_ada",
+                    "validation_logic": "logika_validasi_jika_ada"
+                }}
+            ]
+        }}
+
+        """
+            return self._with_source(instructions, raw_data, include_source)
+        instructions = f"""
         Analisis kode ABAP secara komprehensif untuk semua elemen selection screen.
 
         TUGAS ANALISIS KOMPREHENSIF:
@@ -1539,16 +2617,12 @@ class IntelligentFSDMapper:
             ]
         }}
 
-        Kode ABAP:
-        {raw_data.get('raw_code', '')}
-
-        Komentar:
-        {raw_data.get('raw_comments', '')}
         """
+        return self._with_source(instructions, raw_data, include_source)
     
-    def _create_error_handling_prompt(self, raw_data: Dict[str, Any]) -> str:
+    def _create_error_handling_prompt(self, raw_data: Dict[str, Any], include_source: bool = True) -> str:
         """Error handling prompt"""
-        return f"""
+        instructions = f"""
         Analisis kode ABAP secara komprehensif untuk semua skenario penanganan error.
 
         Kembalikan JSON:
@@ -1564,13 +2638,12 @@ class IntelligentFSDMapper:
             ]
         }}
 
-        Kode ABAP:
-        {raw_data.get('raw_code', '')}
         """
+        return self._with_source(instructions, raw_data, include_source)
     
-    def _create_test_scenarios_prompt(self, raw_data: Dict[str, Any]) -> str:
+    def _create_test_scenarios_prompt(self, raw_data: Dict[str, Any], include_source: bool = True) -> str:
         """Test scenarios prompt"""
-        return f"""
+        instructions = f"""
         Berdasarkan analisis kode ABAP, buat skenario pengujian yang sangat komprehensif.
 
         Kembalikan JSON:
@@ -1586,13 +2659,12 @@ class IntelligentFSDMapper:
             ]
         }}
 
-        Kode ABAP:
-        {raw_data.get('raw_code', '')}
         """
+        return self._with_source(instructions, raw_data, include_source)
     
-    def _create_validation_rules_prompt(self, raw_data: Dict[str, Any]) -> str:
+    def _create_validation_rules_prompt(self, raw_data: Dict[str, Any], include_source: bool = True) -> str:
         """Validation rules prompt"""
-        return f"""
+        instructions = f"""
         Analisis kode ABAP secara mendalam untuk semua aturan validasi data dan business rules.
 
         Kembalikan JSON:
@@ -1603,14 +2675,19 @@ class IntelligentFSDMapper:
             ]
         }}
 
-        Kode ABAP:
-        {raw_data.get('raw_code', '')}
         """
+        return self._with_source(instructions, raw_data, include_source)
     
-    def _create_authorization_prompt(self, raw_data: Dict[str, Any]) -> str:
+    def _create_authorization_prompt(self, raw_data: Dict[str, Any], include_source: bool = True) -> str:
         """Authorization prompt"""
-        return f"""
+        objects = (raw_data.get('static_analysis') or {}).get('authorization_objects')
+        known_objects = f"""
+        Objek otorisasi dari AUTHORITY-CHECK sudah diketahui: {", ".join(objects)}
+        Fokus pada peran pengguna dan logika otorisasi; sebutkan objek lain hanya jika diperiksa secara dinamis.
+""" if objects else ""
+        instructions = f"""
         Analisis kode ABAP secara mendalam untuk semua aspek otorisasi dan keamanan.
+{known_objects}
 
         Kembalikan JSON:
         {{
@@ -1619,33 +2696,32 @@ class IntelligentFSDMapper:
             "authorization_logic": "deskripsi implementasi otorisasi yang detail"
         }}
 
-        Kode ABAP:
-        {raw_data.get('raw_code', '')}
         """
+        return self._with_source(instructions, raw_data, include_source)
     
-    async def _map_fixed_results_to_fsd(self, results: Dict[str, Dict[str, Any]]):
+    async def _map_fixed_results_to_fsd(self, fsd_document: FSDDocument, results: Dict[str, Dict[str, Any]]):
         """Map fixed comprehensive results to FSD document"""
         
         # Map basic info
         basic_info = results.get('basic_info', {})
         if basic_info:
-            self.fsd_document.program_name = basic_info.get('program_name', '')
-            self.fsd_document.report_description = basic_info.get('report_description', '')
-            self.fsd_document.desain_report_description = basic_info.get('desain_report_description', '')
-            self.fsd_document.user_requirements = basic_info.get('user_requirements', '')
-            self.fsd_document.assumptions = basic_info.get('assumptions', [])
-            self.fsd_document.transaction_code = basic_info.get('transaction_code', '')
-            self.fsd_document.menu_path = basic_info.get('menu_path', 'N/A')
+            fsd_document.program_name = basic_info.get('program_name', '')
+            fsd_document.report_description = basic_info.get('report_description', '')
+            fsd_document.desain_report_description = basic_info.get('desain_report_description', '')
+            fsd_document.user_requirements = basic_info.get('user_requirements', '')
+            fsd_document.assumptions = basic_info.get('assumptions', [])
+            fsd_document.transaction_code = basic_info.get('transaction_code', '')
+            fsd_document.menu_path = basic_info.get('menu_path', 'N/A')
             
             # Add to related documents and version history
             ricefw_id = basic_info.get('ricefw_id', '')
             if ricefw_id:
-                self.fsd_document.related_documents.append(f"RICEFW ID: {ricefw_id}")
+                fsd_document.related_documents.append(f"RICEFW ID: {ricefw_id}")
             
             created_date = basic_info.get('created_date', '')
             created_by = basic_info.get('created_by', '')
             if created_date and created_by:
-                self.fsd_document.version_history.append({
+                fsd_document.version_history.append({
                     'version': '0.01',
                     'change': 'Initial draft',
                     'author': created_by,
@@ -1654,7 +2730,7 @@ class IntelligentFSDMapper:
             
             functional_contact = basic_info.get('functional_contact', '')
             if functional_contact:
-                self.fsd_document.reviewers.append({
+                fsd_document.reviewers.append({
                     'role': 'Functional Lead',
                     'name': functional_contact
                 })
@@ -1663,7 +2739,7 @@ class IntelligentFSDMapper:
         selection_screen = results.get('selection_screen', {})
         if selection_screen:
             for param_data in selection_screen.get('selection_parameters', []):
-                self.fsd_document.selection_parameters.append(SelectionParameter(
+                fsd_document.selection_parameters.append(SelectionParameter(
                     name=param_data.get('name', ''),
                     type=param_data.get('type', ''),
                     description=param_data.get('description', ''),
@@ -1682,7 +2758,7 @@ class IntelligentFSDMapper:
                 except ValueError:
                     processing_type = FieldProcessingType.DIRECT
                 
-                self.fsd_document.field_mappings.append(FieldMapping(
+                fsd_document.field_mappings.append(FieldMapping(
                     display_name=field_data.get('display_name', ''),
                     technical_field=field_data.get('technical_field', ''),
                     source_table=field_data.get('source_table', ''),
@@ -1696,7 +2772,7 @@ class IntelligentFSDMapper:
         valid_datasets = results.get('complete_valid_datasets', {})
         if valid_datasets:
             for dataset_rule in valid_datasets.get('valid_dataset_rules', []):
-                self.fsd_document.valid_dataset_rules.append(DataConditionRow(
+                fsd_document.valid_dataset_rules.append(DataConditionRow(
                     data=dataset_rule.get('data', ''),
                     condition=dataset_rule.get('condition', '')
                 ))
@@ -1708,7 +2784,7 @@ class IntelligentFSDMapper:
             for company_rule in lookup_forms.get('company_code_lookup', []):
                 condition_text = company_rule.get('condition', '')
                 target_fields = company_rule.get('target_fields', ['BUTXT'])
-                self.fsd_document.country_info.append(DataConditionRow(
+                fsd_document.country_info.append(DataConditionRow(
                     data=' & '.join(target_fields),
                     condition=condition_text
                 ))
@@ -1717,7 +2793,7 @@ class IntelligentFSDMapper:
             for ba_rule in lookup_forms.get('business_area_lookup', []):
                 condition_text = ba_rule.get('condition', '')
                 target_fields = ba_rule.get('target_fields', ['GTEXT'])
-                self.fsd_document.currency_t500c.append(DataConditionRow(
+                fsd_document.currency_t500c.append(DataConditionRow(
                     data=' & '.join(target_fields),
                     condition=condition_text
                 ))
@@ -1726,7 +2802,7 @@ class IntelligentFSDMapper:
             for wt_rule in lookup_forms.get('wage_type_lookup', []):
                 condition_text = wt_rule.get('condition', '')
                 target_fields = wt_rule.get('target_fields', ['LGTXT'])
-                self.fsd_document.currency_t001.append(DataConditionRow(
+                fsd_document.currency_t001.append(DataConditionRow(
                     data=' & '.join(target_fields),
                     condition=condition_text
                 ))
@@ -1736,7 +2812,7 @@ class IntelligentFSDMapper:
                 condition_text = pr_rule.get('condition', '')
                 target_fields = pr_rule.get('target_fields', ['OCRTX'])
                 # Add to currency_t001 or create separate section
-                self.fsd_document.currency_t001.append(DataConditionRow(
+                fsd_document.currency_t001.append(DataConditionRow(
                     data=' & '.join(target_fields),
                     condition=condition_text
                 ))
@@ -1745,7 +2821,7 @@ class IntelligentFSDMapper:
         error_handling = results.get('error_handling', {})
         if error_handling:
             for error_data in error_handling.get('error_scenarios', []):
-                self.fsd_document.error_scenarios.append(ErrorScenario(
+                fsd_document.error_scenarios.append(ErrorScenario(
                     error_description=error_data.get('error_description', ''),
                     resolution=error_data.get('resolution', ''),
                     error_code=error_data.get('error_code', ''),
@@ -1755,7 +2831,7 @@ class IntelligentFSDMapper:
         test_scenarios = results.get('test_scenarios', {})
         if test_scenarios:
             for test_data in test_scenarios.get('test_scenarios', []):
-                self.fsd_document.test_scenarios.append(TestScenario(
+                fsd_document.test_scenarios.append(TestScenario(
                     condition=test_data.get('condition', ''),
                     expected_result=test_data.get('expected_result', ''),
                     test_data=test_data.get('test_data', ''),
@@ -1764,12 +2840,12 @@ class IntelligentFSDMapper:
         
         validation_rules = results.get('validation_rules', {})
         if validation_rules:
-            self.fsd_document.validation_rules.extend(validation_rules.get('validation_rules', []))
+            fsd_document.validation_rules.extend(validation_rules.get('validation_rules', []))
         
         authorization = results.get('authorization', {})
         if authorization:
-            self.fsd_document.authorization_objects.extend(authorization.get('authorization_objects', []))
-            self.fsd_document.user_roles.extend(authorization.get('user_roles', []))
+            fsd_document.authorization_objects.extend(authorization.get('authorization_objects', []))
+            fsd_document.user_roles.extend(authorization.get('user_roles', []))
 
 # ================================
 # ENHANCED INTELLIGENT FSD GENERATOR
@@ -1778,15 +2854,34 @@ class IntelligentFSDMapper:
 class EnhancedIntelligentFSDGenerator:
     """Main orchestrator class for intelligent FSD generation with Word template support"""
     
-    def __init__(self, config_file: str = None):
+    def __init__(self, config_file: str = None, http_client: Optional[SharedHTTPClient] = None,
+                 extraction_cache: Optional[ExtractionCache] = None, render_farm: Optional[DocxRenderFarm] = None):
         self.config = ConfigManager(config_file)
         self.config.validate_required()
-        self.mapper = IntelligentFSDMapper(self.config)
-        self.output_generator = EnhancedOutputGenerator(self.config)
+        self.http_client = http_client
+        self.response_cache = LLMResponseCache.from_config(self.config)
+        self.extraction_cache = extraction_cache or ExtractionCache.from_config(self.config)
+        self.render_farm = render_farm or DocxRenderFarm.from_config(self.config)
+        self.throttle = GeminiThrottle.from_config(self.config)
+        self.hedger = RequestHedger.from_config(self.config)
+        self.mapper = IntelligentFSDMapper(self.config, self.response_cache, http_client, self.throttle, self.hedger,
+                                           self.extraction_cache)
+        self.output_generator = EnhancedOutputGenerator(self.config, self.response_cache, http_client,
+                                                        self.throttle, self.hedger)
     
     async def process_file(self, html_file_path: str, template_path: str = None, 
-                          custom_output_dir: str = None) -> Dict[str, Any]:
+                          custom_output_dir: str = None, analysis_strategy: str = None,
+                          progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                          raw_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Process a single HTML file and generate FSD outputs including Word document"""
+        fsd_document, results = await self._analyze_file(html_file_path, template_path, analysis_strategy,
+                                                         progress_callback, raw_data)
+        return await self._render_file(fsd_document, results, custom_output_dir)
+    
+    async def _analyze_file(self, html_file_path: str, template_path: str = None, analysis_strategy: str = None,
+                            progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                            raw_data: Optional[Dict[str, Any]] = None) -> Tuple[FSDDocument, Dict[str, Any]]:
+        """LLM analysis of one file: the FSD document and its results without output files"""
         logger.info(f"Processing file: {html_file_path}")
         
         if not os.path.exists(html_file_path):
@@ -1798,38 +2893,17 @@ class EnhancedIntelligentFSDGenerator:
             template_path = r"C:\Users\wahyu.perwira\Documents\Project\poc\SAP-AUTOMATE-FD-TD\backend\templates\Template_PLN_SI SSoT_(DAPI ID)_(Module Name)_Functional Specification Design (FSD)_v100_ID.docx"
         
         # Generate FSD document
-        fsd_document = await self.mapper.analyze_and_map(html_file_path)
-        
-        # Generate outputs
-        base_filename = Path(html_file_path).stem
-        if custom_output_dir:
-            original_output_dir = self.output_generator.output_dir
-            self.output_generator.output_dir = Path(custom_output_dir)
-            self.output_generator.output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # output_files = self.output_generator.generate_all_outputs(fsd_document, base_filename, template_path)
-        output_files = self.output_generator.generate_all_outputs(
-            fsd_document,
-            base_filename,
-            template_path
+        usage_tracker = LLMUsageTracker()
+        fsd_document, source_normalization = await self.mapper.analyze_and_map(
+            html_file_path, analysis_strategy, progress_callback, usage_tracker, raw_data
+        )
+        # Polish the requirement texts before rendering, the markdown generation itself stays synchronous
+        await self.output_generator.improve_texts([fsd_document], usage_tracker)
+        llm_usage = usage_tracker.summary()
+        logger.info(
+            f"LLM usage for {os.path.basename(html_file_path)}: {llm_usage['totals']['calls']} calls, "
+            f"{llm_usage['totals']['total_tokens']} tokens, {llm_usage['totals']['wall_time_seconds']}s"
         )
-
-        # Generate final Word document using md_to_docs_converter
-        try:
-            markdown_path = output_files.get('markdown')
-            if markdown_path:
-                converter = TitlePageGenerator(template_path)
-                doc_result = converter.generate_complete_document(
-                    markdown_path,
-                    str(self.output_generator.output_dir)
-                )
-                if doc_result.get('word_path'):
-                    output_files['final_docx'] = doc_result['word_path']
-        except Exception as exc:
-            logger.error(f"Failed to convert markdown to final DOCX: {exc}")
-        
-        if custom_output_dir:
-            self.output_generator.output_dir = original_output_dir
         
         # Compile results
         results = {
@@ -1837,7 +2911,7 @@ class EnhancedIntelligentFSDGenerator:
             'template_file': template_path,
             'fsd_document': dataclass_to_dict(fsd_document),
             # 'output_files': asdict(fsd_document),
-            'output_files': output_files,
+            'output_files': {},
             'analysis_summary': {
                 'program_name': fsd_document.program_name,
                 'description': fsd_document.report_description,
@@ -1848,41 +2922,164 @@ class EnhancedIntelligentFSDGenerator:
                 'test_scenarios_count': len(fsd_document.test_scenarios),
                 'validation_rules_count': len(fsd_document.validation_rules),
                 'authorization_objects_count': len(fsd_document.authorization_objects)
-            }
+            },
+            'llm_usage': llm_usage,
+            'source_normalization': source_normalization
+        }
+        return fsd_document, results
+    
+    async def _render_file(self, fsd_document: FSDDocument, results: Dict[str, Any],
+                           custom_output_dir: str = None) -> Dict[str, Any]:
+        """Render the output files of an analyzed document in the render farm"""
+        html_file_path = results['input_file']
+        output_dir = Path(custom_output_dir) if custom_output_dir else self.output_generator.output_dir
+        job = {
+            'fsd_document': results['fsd_document'],
+            'improved_texts': self.output_generator.improved_texts_for(fsd_document),
+            'config': dict(self.config.config),
+            'base_filename': Path(html_file_path).stem,
+            'output_dir': str(output_dir),
+            'template_path': results['template_file']
         }
+        results['output_files'] = await self.render_farm.render(render_fsd_outputs, job)
         
         logger.info(f"Successfully processed {html_file_path}")
         return results
     
     async def process_multiple_files(self, html_files: List[str], template_path: str = None, 
-                                   output_dir: str = None) -> Dict[str, Any]:
+                                   output_dir: str = None, analysis_strategy: str = None,
+                                   progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                                   resolve_includes: Optional[bool] = None) -> Dict[str, Any]:
         """Process multiple HTML files"""
         logger.info(f"Processing {len(html_files)} files")
         
         results = {}
         successful = 0
         failed = 0
+        included = 0
         
+        if resolve_includes is None:
+            resolve_includes = str(self.config.get('resolve_includes', False)).lower() == 'true'
+        programs, included_in, include_usage = {}, {}, None
+        if resolve_includes:
+            programs, included_in, include_usage = await self._resolve_include_bundle(html_files, progress_callback)
+        
+        # Files are analyzed one after another; each render goes to the render farm right away,
+        # so documents render in parallel while the next files are still being analyzed
+        renders = {}
         for html_file in html_files:
+            if html_file in included_in:
+                # Include listings are analyzed as part of the programs that use them
+                results[html_file] = {'included_in': included_in[html_file]}
+                included += 1
+                continue
             try:
-                file_results = await self.process_file(html_file, template_path, output_dir)
-                results[html_file] = file_results
-                successful += 1
-                logger.info(f"✓ Successfully processed: {os.path.basename(html_file)}")
+                # Prefix task names with the file so batch progress stays unambiguous
+                file_progress = None
+                if progress_callback:
+                    file_progress = lambda task, progress, name=os.path.basename(html_file): \
+                        progress_callback(f"{name}:{task}", progress)
+                fsd_document, file_results = await self._analyze_file(html_file, template_path, analysis_strategy,
+                                                                      file_progress, programs.get(html_file))
+                renders[html_file] = asyncio.create_task(self._render_file(fsd_document, file_results, output_dir))
             except Exception as e:
                 logger.error(f"✗ Failed to process {os.path.basename(html_file)}: {e}")
                 results[html_file] = {'error': str(e)}
                 failed += 1
         
+        rendered = await asyncio.gather(*renders.values(), return_exceptions=True)
+        for html_file, file_results in zip(renders, rendered):
+            if isinstance(file_results, Exception):
+                logger.error(f"✗ Failed to render {os.path.basename(html_file)}: {file_results}")
+                results[html_file] = {'error': str(file_results)}
+                failed += 1
+            else:
+                results[html_file] = file_results
+                successful += 1
+                logger.info(f"✓ Successfully processed: {os.path.basename(html_file)}")
+        # Report files in the order they were submitted
+        results = {html_file: results[html_file] for html_file in html_files if html_file in results}
+        
         summary = {
             'total_files': len(html_files),
             'successful': successful,
             'failed': failed,
-            'results': results
+            'included': included,  # include listings, analyzed as part of their programs
+            'results': results,
+            'llm_usage': combine_usage(
+                [file_results.get('llm_usage') for file_results in results.values()] + [include_usage]
+            )
         }
+        if include_usage:
+            summary['shared_include_usage'] = include_usage
         
-        logger.info(f"Batch processing complete: {successful} successful, {failed} failed")
+        logger.info(f"Batch processing complete: {successful} successful, {failed} failed, {included} included")
         return summary
+    
+    async def _resolve_include_bundle(self, html_files: List[str],
+                                      progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None
+                                      ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, List[str]], Optional[Dict[str, Any]]]:
+        """Logical program raw_data per report file, include files with their users, and the shared-include LLM usage"""
+        engine = self.config.get('extraction_engine')
+        extracted = await asyncio.gather(*(
+            asyncio.to_thread(extract_listing, html_file, engine, self.extraction_cache) for html_file in html_files
+        ))
+        bundle = ListingBundle(dict(zip(html_files, extracted)))
+        if not bundle.has_includes():
+            logger.info("No INCLUDE relationships between the batch files")
+            return {}, {}, None
+        
+        shared = bundle.shared_includes(int(self.config.get('shared_include_min_tokens', 1000)))
+        include_facts, include_usage = {}, None
+        if shared:
+            logger.info(f"Analyzing {len(shared)} shared includes once: {', '.join(shared)}")
+            usage_tracker = LLMUsageTracker()
+            include_progress = None
+            if progress_callback:
+                include_progress = lambda task, progress: progress_callback(f"shared_includes:{task}", progress)
+            include_facts = await self.mapper.analyze_shared_includes(
+                {name: bundle.include_raw_data(name) for name in shared}, include_progress, usage_tracker
+            )
+            include_usage = usage_tracker.summary()
+        
+        programs = {
+            bundle.paths_by_name[name]: bundle.program_raw_data(bundle.paths_by_name[name], include_facts)
+            for name in bundle.program_names()
+        }
+        return programs, bundle.included_in(), include_usage
+
+def render_fsd_outputs(job: Dict[str, Any]) -> Dict[str, str]:
+    """Render markdown, JSON, DOCX, summary and the final DOCX of one serialized FSD document.
+    
+    Runs in a DocxRenderFarm worker process, so everything arrives as plain data.
+    """
+    fsd_document = fsd_document_from_dict(job['fsd_document'])
+    output_generator = EnhancedOutputGenerator(job['config'])
+    output_generator.output_dir = Path(job['output_dir'])
+    output_generator.output_dir.mkdir(parents=True, exist_ok=True)
+    output_generator.improved_texts = dict(job.get('improved_texts') or {})
+    template_path = job['template_path']
+    
+    output_files = output_generator.generate_all_outputs(
+        fsd_document,
+        job['base_filename'],
+        template_path
+    )
+
+    # Generate final Word document using md_to_docs_converter, straight from the document
+    try:
+        converter = TitlePageGenerator(template_path)
+        doc_result = converter.generate_complete_document(
+            output_files.get('markdown'),
+            str(output_generator.output_dir),
+            title_info=output_generator.build_title_info(fsd_document),
+            base_filename=job['base_filename']
+        )
+        if doc_result.get('word_path'):
+            output_files['final_docx'] = doc_result['word_path']
+    except Exception as exc:
+        logger.error(f"Failed to convert markdown to final DOCX: {exc}")
+    return output_files
 
 # ================================
 # FASTAPI INTEGRATION
@@ -1894,12 +3091,18 @@ class ProcessingRequest(BaseModel):
     template_path: Optional[str] = None
     output_dir: Optional[str] = None
     config: Optional[Dict[str, Any]] = None
+    analysis_strategy: Optional[str] = None  # per_task, fused or grouped
+    resolve_includes: Optional[bool] = None  # expand INCLUDEs across the submitted listings
 
 class ConfigurationRequest(BaseModel):
     gemini_api_key: str
     project_name: Optional[str] = "System Integrator for MIS Towards SSoT"
     max_tokens: Optional[int] = 4096
     temperature: Optional[float] = 0.1
+    analysis_concurrency: Optional[int] = 4
+    analysis_strategy: Optional[str] = "per_task"
+    static_analysis: Optional[str] = "enrich"  # off, enrich or replace
+    llm_task_routes: Optional[Dict[str, Dict[str, Any]]] = None  # task name -> model/api_url, max_tokens, temperature
     gemini_api_url: Optional[str] = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro-latest:generateContent"
     requirement_list_excel: Optional[str] = "/Users/wahyu.perwira/Documents/Project/poc/SAP-AUTOMATE-FD-TD/backend/output/database/Requirement-List.xlsx"
 
@@ -1910,6 +3113,8 @@ class ProcessingStatus(BaseModel):
     message: str
     results: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    task_progress: Dict[str, Dict[str, Any]] = {}  # per analysis task, updated while the LLM answers
+    llm_usage: Optional[Dict[str, Any]] = None  # tokens, retries and wall time per task and in total
 
 class FileDeleteRequest(BaseModel):
     path: str
@@ -1943,6 +3148,9 @@ for directory in [UPLOAD_DIR, OUTPUT_DIR, TEMPLATE_DIR, CONFIG_DIR]:
 stored_files = []
 processing_jobs = {}
 fsd_generator = None
+http_client = None  # Shared pooled HTTP session, owned by the app lifecycle
+extraction_cache = None  # Parsed listings by content hash, filled as soon as a file is stored
+render_farm = None  # Worker processes rendering DOCX outputs off the event loop
 
 # Initialize FSD Generator
 async def initialize_fsd_generator(config_data: Dict[str, Any] = None):
@@ -1956,7 +3164,7 @@ async def initialize_fsd_generator(config_data: Dict[str, Any] = None):
             
             # Set environment variables
             for key, value in config_data.items():
-                os.environ[key.upper()] = str(value)
+                os.environ[key.upper()] = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
             
             # Save config to file
             with open(config_file, 'w', encoding='utf-8') as f:
@@ -1965,7 +3173,8 @@ async def initialize_fsd_generator(config_data: Dict[str, Any] = None):
             config_file = None
         
         # Initialize the generator
-        fsd_generator = EnhancedIntelligentFSDGenerator(config_file)
+        fsd_generator = EnhancedIntelligentFSDGenerator(config_file, http_client=http_client,
+                                                        extraction_cache=extraction_cache, render_farm=render_farm)
         logger.info("FSD Generator initialized successfully")
             
     except Exception as e:
@@ -1975,14 +3184,42 @@ async def initialize_fsd_generator(config_data: Dict[str, Any] = None):
 @app.on_event("startup")
 async def startup_event():
     """Initialize the application on startup"""
+    global http_client, extraction_cache, render_farm
     logger.info("Starting Accenture SAP FSD Document Processor")
     
+    # Open and warm the shared HTTP pool before any request needs it
+    try:
+        startup_config = ConfigManager()
+        extraction_cache = ExtractionCache.from_config(startup_config)
+        render_farm = DocxRenderFarm.from_config(startup_config)
+        http_client = SharedHTTPClient.from_config(startup_config)
+        await http_client.start(warm_url=startup_config.get('gemini_api_url', '').strip('"'))
+    except Exception as e:
+        logger.warning(f"Could not start shared HTTP pool: {e}")
+        http_client = None
+    
     # Try to initialize with default config
     try:
         await initialize_fsd_generator()
     except Exception as e:
         logger.warning(f"Could not initialize FSD Generator on startup: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared resources on shutdown"""
+    if http_client:
+        await http_client.close()
+    if render_farm:
+        await asyncio.to_thread(render_farm.close)
+    # Close the SQLite (WAL) connections so their -wal files are checkpointed
+    if fsd_generator and fsd_generator.response_cache:
+        fsd_generator.response_cache.close()
+    if fsd_generator and fsd_generator.extraction_cache not in (None, extraction_cache):
+        # The generator opened its own cache when the app-wide one was unavailable
+        fsd_generator.extraction_cache.close()
+    if extraction_cache:
+        extraction_cache.close()
+
 @app.get("/")
 async def root():
     return {
@@ -2008,6 +3245,10 @@ async def configure_fsd_generator(config: ConfigurationRequest):
             "project_name": config.project_name,
             "max_tokens": config.max_tokens,
             "temperature": config.temperature,
+            "analysis_concurrency": config.analysis_concurrency,
+            "analysis_strategy": config.analysis_strategy,
+            "static_analysis": config.static_analysis,
+            "llm_task_routes": config.llm_task_routes or {},
             "requirement_list_excel": config.requirement_list_excel,
             "default_output_dir": OUTPUT_DIR,
             "template_dir": TEMPLATE_DIR
@@ -2043,6 +3284,15 @@ async def store_file_locally(file: UploadFile = File(...), originalName: str = N
         with open(file_path, "wb") as buffer:
             content = await file.read()
             buffer.write(content)
+        content_hash = hashlib.sha256(content).hexdigest()
+        
+        # Parse now so a later process call starts directly at the analysis stage
+        if extraction_cache is not None:
+            engine = fsd_generator.config.get('extraction_engine') if fsd_generator else None
+            try:
+                await asyncio.to_thread(extract_listing, file_path, engine, extraction_cache, content_hash)
+            except Exception as e:
+                logger.warning(f"Eager extraction failed for {filename}, will parse at processing time: {e}")
         
         # Store file info for tracking
         file_info = {
@@ -2051,6 +3301,7 @@ async def store_file_locally(file: UploadFile = File(...), originalName: str = N
             "filename": filename,
             "path": file_path,
             "size": len(content),
+            "sha256": content_hash,
             "type": file.content_type,
             "uploadedAt": datetime.now().isoformat(),
             "status": "stored"
@@ -2171,7 +3422,9 @@ async def process_files(
             job_id,
             valid_files,
             request.template_path,
-            request.output_dir or OUTPUT_DIR
+            request.output_dir or OUTPUT_DIR,
+            request.analysis_strategy,
+            request.resolve_includes
         )
         
         return JSONResponse(content={
@@ -2185,12 +3438,22 @@ async def process_files(
         logger.error(f"Error starting file processing: {e}")
         raise HTTPException(status_code=500, detail=f"Error starting processing: {str(e)}")
 
+def job_progress_callback(job_id: str) -> Callable[[str, Dict[str, Any]], None]:
+    """Callback that records per-task LLM progress on a processing job"""
+    def update(task_name: str, progress: Dict[str, Any]):
+        job = processing_jobs.get(job_id)
+        if job:
+            job.task_progress[task_name] = progress
+    return update
+
 # Fix 5: Update the background processing function to store serializable results
 async def process_files_background(
     job_id: str,
     file_paths: List[str],
     template_path: Optional[str],
-    output_dir: str
+    output_dir: str,
+    analysis_strategy: Optional[str] = None,
+    resolve_includes: Optional[bool] = None
 ):
     """Background task for processing files with the FSD Generator"""
     try:
@@ -2209,7 +3472,9 @@ async def process_files_background(
             result = await fsd_generator.process_file(
                 file_paths[0], 
                 template_path, 
-                output_dir
+                output_dir,
+                analysis_strategy,
+                job_progress_callback(job_id)
             )
             results = {'single': result}
             
@@ -2221,10 +3486,15 @@ async def process_files_background(
             result = await fsd_generator.process_multiple_files(
                 file_paths, 
                 template_path, 
-                output_dir
+                output_dir,
+                analysis_strategy,
+                job_progress_callback(job_id),
+                resolve_includes
             )
             results = {'batch': result}
         
+        processing_jobs[job_id].llm_usage = result.get('llm_usage')
+        
         # **FIX: Convert results to JSON-serializable format before storing**
         serializable_results = dataclass_to_dict(results)
         
@@ -2267,7 +3537,9 @@ async def get_job_status(job_id: str):
             "progress": job_status.progress,
             "message": job_status.message,
             "results": serializable_results,
-            "error": job_status.error
+            "error": job_status.error,
+            "task_progress": job_status.task_progress,
+            "llm_usage": job_status.llm_usage
         })
         
     except Exception as e:
@@ -2312,12 +3584,19 @@ async def get_job_results(job_id: str):
                 'total_files': batch_result.get('total_files'),
                 'successful': batch_result.get('successful'),
                 'failed': batch_result.get('failed'),
+                'included': batch_result.get('included', 0),
                 'results_summary': []
             }
             
             # Add summary for each file
             for file_path, result in batch_result.get('results', {}).items():
-                if 'error' not in result:
+                if 'included_in' in result:
+                    processed_results['results_summary'].append({
+                        'file': os.path.basename(file_path),
+                        'status': 'included',
+                        'included_in': result.get('included_in')
+                    })
+                elif 'error' not in result:
                     processed_results['results_summary'].append({
                         'file': os.path.basename(file_path),
                         'status': 'success',
@@ -2478,7 +3757,12 @@ async def get_system_info():
         generator_info = {
             "generator_initialized": fsd_generator is not None,
             "active_jobs": len(processing_jobs),
-            "stored_files": len(stored_files)
+            "stored_files": len(stored_files),
+            "llm_cache": fsd_generator.response_cache.stats() if fsd_generator and fsd_generator.response_cache else None,
+            "extraction_cache": fsd_generator.extraction_cache.stats() if fsd_generator and fsd_generator.extraction_cache else None,
+            "docx_render_farm": fsd_generator.render_farm.stats() if fsd_generator else None,
+            "llm_throttle": fsd_generator.throttle.stats() if fsd_generator else None,
+            "llm_hedging": fsd_generator.hedger.stats() if fsd_generator and fsd_generator.hedger else None
         }
         
         return JSONResponse(content={
@@ -2496,8 +3780,20 @@ async def get_system_info():
         raise HTTPException(status_code=500, detail=f"Error getting system info: {str(e)}")
     
 @app.post("/api/process-html")
-async def process_html_file(html_file: UploadFile = File(...)):
-    """Process HTML file directly from upload without storing first."""
+async def process_html_file(html_file: UploadFile = File(...), analysis_strategy: Optional[str] = None,
+                            job_id: Optional[str] = None):
+    """Process HTML file directly from upload without storing first.
+
+    Passing a client-chosen job_id lets the caller poll /api/job-status/{job_id}
+    for per-task progress while this request is still running.
+    """
+    if job_id:
+        processing_jobs[job_id] = ProcessingStatus(
+            job_id=job_id,
+            status="processing",
+            progress=10,
+            message=f"Processing {html_file.filename}"
+        )
     try:
         logger.info(f"📥 Received file upload request: {html_file.filename}")
 
@@ -2536,7 +3832,10 @@ async def process_html_file(html_file: UploadFile = File(...)):
 
         # Process file directly
         logger.info(f"🚀 Processing file: {temp_path}")
-        result = await fsd_generator.process_file(temp_path, None, OUTPUT_DIR)
+        result = await fsd_generator.process_file(
+            temp_path, None, OUTPUT_DIR, analysis_strategy,
+            job_progress_callback(job_id) if job_id else None
+        )
         logger.info("✅ File processed successfully by FSD Generator.")
 
         # Read markdown output (if exists)
@@ -2562,6 +3861,11 @@ async def process_html_file(html_file: UploadFile = File(...)):
         except OSError as del_err:
             logger.warning(f"⚠ Could not delete temp file: {del_err}")
 
+        if job_id:
+            processing_jobs[job_id].status = "completed"
+            processing_jobs[job_id].progress = 100
+            processing_jobs[job_id].message = "Processing completed successfully"
+
         return JSONResponse(content={
             "success": True,
             "filename": html_file.filename,
@@ -2573,6 +3877,10 @@ async def process_html_file(html_file: UploadFile = File(...)):
         })
 
     except Exception as e:
+        if job_id:
+            processing_jobs[job_id].status = "failed"
+            processing_jobs[job_id].message = "Processing failed"
+            processing_jobs[job_id].error = str(e)
         logger.error(f"❌ Error processing HTML file: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
@@ -2748,7 +4056,7 @@ class AdvancedWordTemplateProcessor(WordTemplateProcessor):
         """Fallback manual filling method"""
         try:
             if not self.document:
-                self.document = DocxDocument(self.template_path)
+                self.document = template_document(self.template_path)
             
             # Replace simple placeholders
             simple_replacements = {
@@ -2905,6 +4213,48 @@ Environment Variables:
   TEMPLATE_DIR        - Optional: Template directory path
   MAX_TOKENS          - Optional: Maximum tokens for LLM responses (default: 4096)
   TEMPERATURE         - Optional: LLM temperature (default: 0.1)
+  ANALYSIS_MODE       - Optional: concurrent or sequential analysis tasks (default: concurrent)
+  ANALYSIS_CONCURRENCY - Optional: Max analysis tasks in flight per file (default: 4)
+  ANALYSIS_STRATEGY   - Optional: per_task, fused or grouped LLM calls (default: per_task)
+  EXTRACTION_ENGINE   - Optional: auto, scanner or bs4 HTML extraction (default: auto)
+  RESOLVE_INCLUDES    - Optional: Resolve INCLUDEs across batch listings, shared includes analyzed once (default: false)
+  SHARED_INCLUDE_MIN_TOKENS - Optional: Smaller shared includes are simply inlined (default: 1000)
+  NORMALIZE_SOURCE    - Optional: drop whitespace, commented-out code and duplicate comments (default: true)
+  NORMALIZE_SHORTEN_IDENTIFIERS - Optional: alias long variable names in prompts (default: false)
+  STATIC_ANALYSIS     - Optional: off, enrich or replace LLM tasks with parsed declarations (default: enrich)
+  CODE_SLICING_ENABLED - Optional: Send tasks only the relevant ABAP statements (default: true)
+  CHUNKED_ANALYSIS    - Optional: auto, always or never map-reduce large programs (default: auto)
+  CHUNKING_TOKEN_THRESHOLD - Optional: Estimated code tokens that switch on chunking (default: 60000)
+  CHUNK_MAX_TOKENS    - Optional: Estimated code tokens per chunk (default: 25000)
+  LLM_CACHE_ENABLED   - Optional: Cache Gemini responses on disk (default: true)
+  LLM_CACHE_BYPASS    - Optional: Skip cache lookups but keep refreshing entries (default: false)
+  LLM_CACHE_PATH      - Optional: SQLite file for the response cache
+  LLM_CACHE_MAX_ENTRIES / LLM_CACHE_MAX_MB / LLM_CACHE_TTL_HOURS - Optional: Cache eviction limits
+  EXTRACTION_CACHE_ENABLED - Optional: Reuse parsed HTML listings by content hash (default: true)
+  EXTRACTION_CACHE_PATH / EXTRACTION_CACHE_MAX_ENTRIES - Optional: SQLite file and size of that cache
+  MARKDOWN_OUTPUT     - Optional: Write the <file>_fsd.md artifact (default: true)
+  DOCX_RENDER_WORKERS - Optional: Processes rendering DOCX outputs in parallel (default: CPU count, max 4)
+  DOCX_RENDER_TIMEOUT_SECONDS - Optional: Time limit for one document render (default: 300)
+  HTTP_POOL_LIMIT / HTTP_POOL_LIMIT_PER_HOST - Optional: Shared connection pool size (default: 100 / 20)
+  HTTP_DNS_CACHE_TTL / HTTP_KEEPALIVE_TIMEOUT - Optional: DNS cache and keep-alive seconds (default: 300 / 60)
+  LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE - Optional: Client-side Gemini quota (default: 60 / 1000000)
+  LLM_MAX_RETRIES     - Optional: Retries for 429/5xx/network errors (default: 5)
+  LLM_MIN_CONCURRENCY / LLM_MAX_CONCURRENCY - Optional: Bounds of the adaptive in-flight limit (default: 1 / 32)
+  LLM_STREAMING       - Optional: Use streamGenerateContent with live task progress (default: false)
+  LLM_STREAM_MAX_CHARS - Optional: Abort a streamed answer beyond this many characters (default: 200000)
+  LLM_STREAM_MAX_DUPLICATE_ITEMS - Optional: Abort after this many repeated list items (default: 25)
+  LLM_BACKEND         - Optional: live, record or replay LLM responses (default: live)
+  LLM_RECORDINGS_DIR  - Optional: Directory of recorded responses (default: ./recordings/llm)
+  LLM_REPLAY_LATENCY_SECONDS - Optional: Fixed replay latency; empty uses recorded latency
+  LLM_REPLAY_LATENCY_SCALE - Optional: Multiplier for recorded replay latency (default: 1.0)
+  LLM_HEDGING_ENABLED - Optional: Duplicate unusually slow Gemini calls (default: false)
+  LLM_HEDGE_PERCENTILE - Optional: Latency percentile that triggers a hedge (default: 95)
+  LLM_HEDGE_MIN_SAMPLES - Optional: Latency samples needed before hedging (default: 20)
+  LLM_HEDGE_MAX_PER_MINUTE - Optional: Cap on hedged requests per minute (default: 10)
+  LLM_MAX_CONTINUATIONS - Optional: Follow-up calls for truncated answers (default: 2)
+  LLM_TASK_ROUTES     - Optional: JSON map of task name to model/api_url, max_tokens, temperature
+  LLM_CONTEXT_CACHING - Optional: Explicit Gemini context cache for the shared source prefix (default: false)
+  LLM_CONTEXT_CACHE_TTL_SECONDS / LLM_CONTEXT_CACHE_MIN_TOKENS - Optional: Cache TTL and minimum prefix size
         """
     )
     
@@ -2916,6 +4266,7 @@ Environment Variables:
     single_parser.add_argument('--template', help='Word template file path')
     single_parser.add_argument('--output-dir', help='Custom output directory')
     single_parser.add_argument('--config', help='Configuration file path')
+    single_parser.add_argument('--strategy', choices=ANALYSIS_STRATEGIES, help='LLM analysis strategy')
     
     # Batch processing command
     batch_parser = subparsers.add_parser('batch', help='Process multiple HTML files')
@@ -2923,6 +4274,9 @@ Environment Variables:
     batch_parser.add_argument('--template', help='Word template file path')
     batch_parser.add_argument('--output-dir', help='Custom output directory')
     batch_parser.add_argument('--config', help='Configuration file path')
+    batch_parser.add_argument('--strategy', choices=ANALYSIS_STRATEGIES, help='LLM analysis strategy')
+    batch_parser.add_argument('--resolve-includes', action='store_true', default=None,
+                              help='Treat the files as one bundle: expand INCLUDEs, analyze shared includes once')
     
     # Configuration command
     config_parser = subparsers.add_parser('config', help='Generate sample configuration file')
@@ -2939,7 +4293,8 @@ Environment Variables:
             "default_output_dir": "./output",
             "template_dir": "./Template/FSD",
             "max_tokens": 4096,
-            "temperature": 0.1
+            "temperature": 0.1,
+            "llm_task_routes": SAMPLE_LLM_TASK_ROUTES
         }
         
         with open(args.output, 'w', encoding='utf-8') as f:
@@ -2953,16 +4308,24 @@ Environment Variables:
         parser.print_help()
         return
     
+    cli_config = ConfigManager(getattr(args, 'config', None))
+    cli_http_client = SharedHTTPClient.from_config(cli_config)
+    generator = None
+    
     try:
+        # One pooled session for the whole CLI run
+        await cli_http_client.start(warm_url=cli_config.get('gemini_api_url', '').strip('"'))
+        
         # Initialize generator
-        generator = EnhancedIntelligentFSDGenerator(getattr(args, 'config', None))
+        generator = EnhancedIntelligentFSDGenerator(getattr(args, 'config', None), http_client=cli_http_client)
         
         if args.command == 'single':
             # Process single file
             results = await generator.process_file(
                 args.html_file, 
                 getattr(args, 'template', None), 
-                getattr(args, 'output_dir', None)
+                getattr(args, 'output_dir', None),
+                getattr(args, 'strategy', None)
             )
             
             print("\n=== Processing Results ===")
@@ -2974,6 +4337,16 @@ Environment Variables:
             print(f"Error Scenarios: {summary['error_scenarios_count']}")
             print(f"Test Scenarios: {summary['test_scenarios_count']}")
             
+            print("\n=== LLM Usage ===")
+            for task_name, usage in results['llm_usage']['tasks'].items():
+                print(f"{task_name}: {usage['prompt_tokens']} prompt ({usage['cached_token_rate']:.0%} cached) / "
+                      f"{usage['candidate_tokens']} output tokens, {usage['wall_time_seconds']}s, {usage['retries']} retries")
+            
+            normalization = results.get('source_normalization')
+            if normalization:
+                print(f"Source normalization: ~{normalization['before_tokens']} -> ~{normalization['after_tokens']} "
+                      f"tokens ({normalization['saved_percent']}% less)")
+            
             print("\n=== Generated Files ===")
             for output_type, file_path in results['output_files'].items():
                 print(f"{output_type.upper()}: {file_path}")
@@ -2983,13 +4356,20 @@ Environment Variables:
             results = await generator.process_multiple_files(
                 args.html_files, 
                 getattr(args, 'template', None), 
-                getattr(args, 'output_dir', None)
+                getattr(args, 'output_dir', None),
+                getattr(args, 'strategy', None),
+                resolve_includes=getattr(args, 'resolve_includes', None)
             )
             
             print(f"\n=== Batch Processing Results ===")
             print(f"Total files: {results['total_files']}")
             print(f"Successful: {results['successful']}")
             print(f"Failed: {results['failed']}")
+            if results['included']:
+                print(f"Included in other programs: {results['included']}")
+            usage_totals = results['llm_usage']['totals']
+            print(f"LLM calls: {usage_totals['calls']} ({usage_totals['total_tokens']} tokens, "
+                  f"{usage_totals['wall_time_seconds']}s)")
             
             if results['failed'] > 0:
                 print("\nFailed files:")
@@ -3000,6 +4380,15 @@ Environment Variables:
     except Exception as e:
         logger.error(f"Error: {e}")
         return 1
+    finally:
+        await cli_http_client.close()
+        if generator is not None:
+            generator.render_farm.close()
+            # Close the SQLite (WAL) connections so their -wal files are checkpointed
+            if generator.response_cache:
+                generator.response_cache.close()
+            if generator.extraction_cache:
+                generator.extraction_cache.close()
     
     return 0
 
@@ -3040,6 +4429,7 @@ def create_sample_config():
         "template_dir": "./Template/FSD",
         "max_tokens": 4096,
         "temperature": 0.1,
+        "llm_task_routes": SAMPLE_LLM_TASK_ROUTES,
         "default_template_path": r"C:\Users\wahyu.perwira\Documents\Project\poc\SAP-AUTOMATE-FD-TD\backend\templates\Template_PLN_SI SSoT_(DAPI ID)_(Module Name)_Functional Specification Design (FSD)_v100_ID.docx"
     }
     
@@ -3,19 +3,194 @@ import re
 from datetime import datetime
 from pathlib import Path
 import pypandoc
-from docx import Document as DocxDocument
 from docx.shared import Inches, Pt
 from docx.enum.table import WD_TABLE_ALIGNMENT
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml import parse_xml
 from docx.oxml.ns import nsdecls, qn
 from docxtpl import DocxTemplate
+from docx_template_cache import TemplateCache, ParagraphIndex, compile_replacements, paragraph_at
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def default_title_info() -> dict:
+    """Empty title_info with the defaults the Word generator expects"""
+    return {
+        'program_name': '',
+        'description': '',
+        'ricefw_id': '',
+        'module_name': 'Human Resource',
+        'document_type': 'Functional Specification Design (FSD)',
+        'current_date': datetime.now().strftime('%Y'),
+        'file_name': '',
+        # New fields for second page
+        'project_name': 'System Integrator for Management Information System Towards Single Source of Truth Implementation Program',
+        'document_location': '',
+        'related_documents': [],
+        'reviewers': [],
+        'version_history': [],
+        'generated_date': datetime.now().strftime('%Y-%m-%d'),
+        'generated_time': datetime.now().strftime('%H:%M:%S'),
+        # New fields for table of contents
+        'table_of_contents': [],
+        # New fields for fourth page
+        'user_requirements': '',
+        'assumptions': [],
+        'sap_program_name': '',
+        'transaction_code': '',
+        'menu_path': '',
+        # New fields for DESAIN section
+        'selection_screen_table': [],
+        'detail_processing_table': [],
+        'valid_datasets_table': [],
+        'country_info_table': [],
+        'report_description': '',
+        'authorization_info': '',
+        'design_constraints': '',
+        # New fields for ERROR HANDLING section
+        'error_handling_table': [],
+        # New fields for TESTING REQUIREMENTS section
+        'testing_requirements_table': [],
+        'test_data_location': '',
+        'test_transaction': '',
+        'test_menu_path': '',
+        # ADD THIS NEW FIELD:
+        'design_changes': '',  # Add this line
+        # Additional design tables
+        'valid_datasets_table': [],
+        'country_info_table': [],
+        'currency_t500c_table': [],
+        'currency_t001_table': []
+    }
+
+
+def finalize_title_info(title_info: dict, sections: list) -> dict:
+    """Fill derived fields (RICEFW ID fallback, file name, test defaults, table of contents).
+    
+    sections: [(main section title, [subsection titles])] in document order, numbered sections only.
+    """
+    # If no RICEFW ID found, try to infer from program name pattern
+    if not title_info['ricefw_id'] and title_info['program_name']:
+        # For ZHR_R_IT0015, try to map to RHR pattern
+        if 'IT0015' in title_info['program_name']:
+            title_info['ricefw_id'] = 'RHR006'  # Based on your documents, IT0015 maps to RHR006
+        elif 'IT0267' in title_info['program_name']:
+            title_info['ricefw_id'] = 'RHR018'  # Based on your documents, IT0267 maps to RHR018
+        else:
+            # Default pattern
+            title_info['ricefw_id'] = 'RHR041'
+    
+    # Create file name from program name and description
+    # if title_info['program_name'] and title_info['description']:
+    #     title_info['file_name'] = f"Report of {title_info['description']}"
+    # elif title_info['description']:
+    #     title_info['file_name'] = f"Report of {title_info['description']}"
+    if title_info['description']:
+        # Use description directly for file name to match document heading
+        title_info['file_name'] = title_info['description']
+    else:
+        title_info['file_name'] = 'Document'
+    
+    # If document location not found, create it from program name
+    if not title_info['document_location'] and title_info['program_name']:
+        # Convert ZHR_R_IT0015 to zhr_r_it0015.html
+        doc_name = title_info['program_name'].lower().replace('_', '_')
+        title_info['document_location'] = f"{doc_name}.html"
+    
+    # Set default test values based on extracted information
+    title_info['test_data_location'] = 'Data uji tersedia di environment development SAP'
+    title_info['test_transaction'] = title_info.get('transaction_code', 'N/A')
+    title_info['test_menu_path'] = title_info.get('menu_path', 'N/A')
+    
+    title_info['table_of_contents'] = table_of_contents(sections)
+    return title_info
+
+
+def table_of_contents(sections: list) -> list:
+    """Table of contents entries with section numbers and page estimates"""
+    toc_items = []
+    page_number = 4  # Start from page 4 (after title, doc info, and TOC pages)
+    
+    # Define section mappings (English to Indonesian)
+    # section_mappings = {
+    #     'DOCUMENT INFORMATION': 'INFORMASI DOKUMEN',
+    #     'GENERAL REQUIREMENTS': 'PERSYARATAN UMUM',
+    #     'EXISTING SAP OBJECTS': 'OBJEK SAP EXISTING YANG TERKAIT DENGAN REPORT (Existing SAP Object Related to the Reports)',
+    #     'DESIGN': 'DESAIN',
+    #     'Selection Screen': 'Selection Screen',
+    #     'Detail Processing': 'Detail Processing',
+    #     'ERROR HANDLING': 'PENANGANAN ERROR',
+    #     'DESIGN ALTERNATIVES': 'DESAIN ALTERNATIF',
+    #     'TESTING REQUIREMENTS': 'PERSYARATAN PENGUJIAN',
+    #     'DESIGN CHANGE': 'PERUBAHAN DESAIN'
+    # }
+    
+    section_mappings = {
+        'INFORMASI DOKUMEN': 'INFORMASI DOKUMEN',
+        'PERSYARATAN UMUM': 'PERSYARATAN UMUM',
+        'OBJEK SAP EXISTING YANG TERKAIT DENGAN REPORT (Existing SAP Object Related to the Reports)': 'OBJEK SAP EXISTING YANG TERKAIT DENGAN REPORT (Existing SAP Object Related to the Reports)',
+        'DESAIN': 'DESAIN',
+        'Selection Screen': 'Selection Screen',
+        'Detail Processing': 'Detail Processing',
+        'Detail Process Only valid datasets': 'Detail Process Only valid datasets',
+        'Form Get_Country_Info': 'Form Get_Country_Info',
+        'Form Get_Currency_T500C': 'Form Get_Currency_T500C',
+        'Form Get_Currency_T001': 'Form Get_Currency_T001',
+        'PENANGANAN ERROR': 'PENANGANAN ERROR',
+        'DESAIN ALTERNATIF': 'DESAIN ALTERNATIF',
+        'PERSYARATAN PENGUJIAN': 'PERSYARATAN PENGUJIAN',
+        'PERUBAHAN DESAIN': 'PERUBAHAN DESAIN'
+    }
+    
+    # Add fixed TOC items first
+    toc_items.append({
+        'number': '1',
+        'title': 'INFORMASI DOKUMEN',
+        'page': 2
+    })
+    toc_items.append({
+        'number': '2',
+        'title': 'DAFTAR ISI',
+        'page': 3
+    })
+    
+    section_counter = 3
+    current_main_section = 0
+    
+    # Number the sections and their subsections
+    for original_title, subsections in sections:
+        # Map to Indonesian if available
+        mapped_title = section_mappings.get(original_title.upper(), original_title)
+        
+        toc_items.append({
+            'number': str(section_counter),
+            'title': mapped_title,
+            'page': page_number
+        })
+        
+        current_main_section = section_counter
+        page_number += 1
+        
+        # Add subsections
+        for i, sub_title in enumerate(subsections, 1):
+            # Map subsection to Indonesian if available
+            mapped_sub_title = section_mappings.get(sub_title, sub_title)
+            
+            toc_items.append({
+                'number': f'{current_main_section}.{i}',
+                'title': mapped_sub_title,
+                'page': page_number
+            })
+            page_number += 1
+        
+        section_counter += 1
+    
+    return toc_items
+
+
 class MarkdownTitleExtractor:
     """Extract title page information from markdown"""
     
@@ -26,53 +201,7 @@ class MarkdownTitleExtractor:
         """Extract information needed for title page and document information"""
         lines = self.content.split('\n')
         
-        title_info = {
-            'program_name': '',
-            'description': '',
-            'ricefw_id': '',
-            'module_name': 'Human Resource',
-            'document_type': 'Functional Specification Design (FSD)',
-            'current_date': datetime.now().strftime('%Y'),
-            'file_name': '',
-            # New fields for second page
-            'project_name': 'System Integrator for Management Information System Towards Single Source of Truth Implementation Program',
-            'document_location': '',
-            'related_documents': [],
-            'reviewers': [],
-            'version_history': [],
-            'generated_date': datetime.now().strftime('%Y-%m-%d'),
-            'generated_time': datetime.now().strftime('%H:%M:%S'),
-            # New fields for table of contents
-            'table_of_contents': [],
-            # New fields for fourth page
-            'user_requirements': '',
-            'assumptions': [],
-            'sap_program_name': '',
-            'transaction_code': '',
-            'menu_path': '',
-            # New fields for DESAIN section
-            'selection_screen_table': [],
-            'detail_processing_table': [],
-            'valid_datasets_table': [],
-            'country_info_table': [],
-            'report_description': '',
-            'authorization_info': '',
-            'design_constraints': '',
-            # New fields for ERROR HANDLING section
-            'error_handling_table': [],
-            # New fields for TESTING REQUIREMENTS section
-            'testing_requirements_table': [],
-            'test_data_location': '',
-            'test_transaction': '',
-            'test_menu_path': '',
-            # ADD THIS NEW FIELD:
-            'design_changes': '',  # Add this line
-            # Additional design tables
-            'valid_datasets_table': [],
-            'country_info_table': [],
-            'currency_t500c_table': [],
-            'currency_t001_table': []
-        }
+        title_info = default_title_info()
         
         current_section = None
         in_general_requirements = False
@@ -357,95 +486,11 @@ class MarkdownTitleExtractor:
                 version_info = line.replace('  - ', '').strip()
                 title_info['version_history'].append(version_info)
         
-        # If no RICEFW ID found, try to infer from program name pattern
-        if not title_info['ricefw_id'] and title_info['program_name']:
-            # For ZHR_R_IT0015, try to map to RHR pattern
-            if 'IT0015' in title_info['program_name']:
-                title_info['ricefw_id'] = 'RHR006'  # Based on your documents, IT0015 maps to RHR006
-            elif 'IT0267' in title_info['program_name']:
-                title_info['ricefw_id'] = 'RHR018'  # Based on your documents, IT0267 maps to RHR018
-            else:
-                # Default pattern
-                title_info['ricefw_id'] = 'RHR041'
-        
-        # Create file name from program name and description
-        # if title_info['program_name'] and title_info['description']:
-        #     title_info['file_name'] = f"Report of {title_info['description']}"
-        # elif title_info['description']:
-        #     title_info['file_name'] = f"Report of {title_info['description']}"
-        if title_info['description']:
-            # Use description directly for file name to match document heading
-            title_info['file_name'] = title_info['description']
-        else:
-            title_info['file_name'] = 'Document'
-        
-        # If document location not found, create it from program name
-        if not title_info['document_location'] and title_info['program_name']:
-            # Convert ZHR_R_IT0015 to zhr_r_it0015.html
-            doc_name = title_info['program_name'].lower().replace('_', '_')
-            title_info['document_location'] = f"{doc_name}.html"
-        
-        # Set default test values based on extracted information
-        title_info['test_data_location'] = 'Data uji tersedia di environment development SAP'
-        title_info['test_transaction'] = title_info.get('transaction_code', 'N/A')
-        title_info['test_menu_path'] = title_info.get('menu_path', 'N/A')
-        
-        # Extract table of contents from markdown structure
-        title_info['table_of_contents'] = self._extract_table_of_contents(lines)
-        
-        return title_info
+        # Table of contents from the numbered markdown headings
+        return finalize_title_info(title_info, self._numbered_sections(lines))
     
-    def _extract_table_of_contents(self, lines: list) -> list:
-        """Extract table of contents from markdown headings"""
-        toc_items = []
-        page_number = 4  # Start from page 4 (after title, doc info, and TOC pages)
-        
-        # Define section mappings (English to Indonesian)
-        # section_mappings = {
-        #     'DOCUMENT INFORMATION': 'INFORMASI DOKUMEN',
-        #     'GENERAL REQUIREMENTS': 'PERSYARATAN UMUM',
-        #     'EXISTING SAP OBJECTS': 'OBJEK SAP EXISTING YANG TERKAIT DENGAN REPORT (Existing SAP Object Related to the Reports)',
-        #     'DESIGN': 'DESAIN',
-        #     'Selection Screen': 'Selection Screen',
-        #     'Detail Processing': 'Detail Processing',
-        #     'ERROR HANDLING': 'PENANGANAN ERROR',
-        #     'DESIGN ALTERNATIVES': 'DESAIN ALTERNATIF',
-        #     'TESTING REQUIREMENTS': 'PERSYARATAN PENGUJIAN',
-        #     'DESIGN CHANGE': 'PERUBAHAN DESAIN'
-        # }
-        
-        section_mappings = {
-            'INFORMASI DOKUMEN': 'INFORMASI DOKUMEN',
-            'PERSYARATAN UMUM': 'PERSYARATAN UMUM',
-            'OBJEK SAP EXISTING YANG TERKAIT DENGAN REPORT (Existing SAP Object Related to the Reports)': 'OBJEK SAP EXISTING YANG TERKAIT DENGAN REPORT (Existing SAP Object Related to the Reports)',
-            'DESAIN': 'DESAIN',
-            'Selection Screen': 'Selection Screen',
-            'Detail Processing': 'Detail Processing',
-            'Detail Process Only valid datasets': 'Detail Process Only valid datasets',
-            'Form Get_Country_Info': 'Form Get_Country_Info',
-            'Form Get_Currency_T500C': 'Form Get_Currency_T500C',
-            'Form Get_Currency_T001': 'Form Get_Currency_T001',
-            'PENANGANAN ERROR': 'PENANGANAN ERROR',
-            'DESAIN ALTERNATIF': 'DESAIN ALTERNATIF',
-            'PERSYARATAN PENGUJIAN': 'PERSYARATAN PENGUJIAN',
-            'PERUBAHAN DESAIN': 'PERUBAHAN DESAIN'
-        }
-        
-        # Add fixed TOC items first
-        toc_items.append({
-            'number': '1',
-            'title': 'INFORMASI DOKUMEN',
-            'page': 2
-        })
-        toc_items.append({
-            'number': '2',
-            'title': 'DAFTAR ISI',
-            'page': 3
-        })
-        
-        section_counter = 3
-        current_main_section = 0
-        
+    def _numbered_sections(self, lines: list) -> list:
+        """(title, [subsection titles]) of the numbered markdown headings"""
         # First pass: collect all sections and subsections
         sections_found = []
         
@@ -483,38 +528,7 @@ class MarkdownTitleExtractor:
                         })
                         break
         
-        # Second pass: generate TOC with proper numbering
-        for section in sections_found:
-            original_title = section['title']
-            
-            # Map to Indonesian if available
-            mapped_title = section_mappings.get(original_title.upper(), original_title)
-            
-            toc_items.append({
-                'number': str(section_counter),
-                'title': mapped_title,
-                'page': page_number
-            })
-            
-            current_main_section = section_counter
-            page_number += 1
-            
-            # Add subsections
-            for i, subsection in enumerate(section['subsections'], 1):
-                sub_title = subsection['title']
-                # Map subsection to Indonesian if available
-                mapped_sub_title = section_mappings.get(sub_title, sub_title)
-                
-                toc_items.append({
-                    'number': f'{current_main_section}.{i}',
-                    'title': mapped_sub_title,
-                    'page': page_number
-                })
-                page_number += 1
-            
-            section_counter += 1
-        
-        return toc_items
+        return [(section['title'], [sub['title'] for sub in section['subsections']]) for section in sections_found]
     
     def create_valid_datasets_table_data(self, valid_datasets: list) -> tuple:
         if not valid_datasets:
@@ -835,107 +849,121 @@ class TitlePageWordGenerator:
             if old_text in full_text:
                 # Get the replacement position
                 new_full_text = full_text.replace(old_text, new_text)
-                
-                # Clear existing runs but keep formatting from first run
-                if paragraph.runs:
-                    first_run = paragraph.runs[0]
-                    # Preserve formatting properties
-                    font_name = first_run.font.name
-                    font_size = first_run.font.size
-                    font_bold = first_run.font.bold
-                    font_italic = first_run.font.italic
-                    font_color = first_run.font.color.rgb if first_run.font.color.rgb else None
-                    
-                    # Clear all runs
-                    paragraph.clear()
-                    
-                    # Handle multiline text (for assumptions)
-                    if '\n' in new_full_text:
-                        lines = new_full_text.split('\n')
-                        for i, line in enumerate(lines):
-                            if i > 0:
-                                # Add line break
-                                line_break_run = paragraph.add_run()
-                                line_break_run.add_break()
-                            new_run = paragraph.add_run(line)
-                            if font_name:
-                                new_run.font.name = font_name
-                            if font_size:
-                                new_run.font.size = font_size
-                            if font_bold:
-                                new_run.font.bold = font_bold
-                            if font_italic:
-                                new_run.font.italic = font_italic
-                            if font_color:
-                                new_run.font.color.rgb = font_color
-                    else:
-                        # Single line text
-                        new_run = paragraph.add_run(new_full_text)
-                        if font_name:
-                            new_run.font.name = font_name
-                        if font_size:
-                            new_run.font.size = font_size
-                        if font_bold:
-                            new_run.font.bold = font_bold
-                        if font_italic:
-                            new_run.font.italic = font_italic
-                        if font_color:
-                            new_run.font.color.rgb = font_color
-                else:
-                    # If no runs, just set paragraph text
-                    paragraph.text = new_full_text
-                
+                self._rewrite_preserve_formatting(paragraph, new_full_text)
                 logger.info(f"Replaced '{old_text[:30]}...' with '{new_text[:30]}...' (formatting preserved)")
                 return True
         return False
+
+    def replace_all_preserve_formatting(self, paragraph, text: str, pattern, replacements: dict) -> bool:
+        """Apply every replacement matched by a compile_replacements() pattern in one rewrite"""
+        matched = []
+
+        def substitute(match):
+            matched.append(match.group())
+            return replacements[match.group()]
+
+        new_full_text = pattern.sub(substitute, text)
+        if not matched:
+            return False
+        self._rewrite_preserve_formatting(paragraph, new_full_text)
+        for old_text in dict.fromkeys(matched):
+            logger.info(f"Replaced '{old_text[:30]}...' with '{replacements[old_text][:30]}...' (formatting preserved)")
+        return True
+
+    def _rewrite_preserve_formatting(self, paragraph, new_full_text: str):
+        """Set the paragraph text, keeping the formatting of its first run"""
+        # Clear existing runs but keep formatting from first run
+        if paragraph.runs:
+            first_run = paragraph.runs[0]
+            # Preserve formatting properties
+            font_name = first_run.font.name
+            font_size = first_run.font.size
+            font_bold = first_run.font.bold
+            font_italic = first_run.font.italic
+            font_color = first_run.font.color.rgb if first_run.font.color.rgb else None
+            
+            # Clear all runs
+            paragraph.clear()
+            
+            # Handle multiline text (for assumptions)
+            if '\n' in new_full_text:
+                lines = new_full_text.split('\n')
+                for i, line in enumerate(lines):
+                    if i > 0:
+                        # Add line break
+                        line_break_run = paragraph.add_run()
+                        line_break_run.add_break()
+                    new_run = paragraph.add_run(line)
+                    if font_name:
+                        new_run.font.name = font_name
+                    if font_size:
+                        new_run.font.size = font_size
+                    if font_bold:
+                        new_run.font.bold = font_bold
+                    if font_italic:
+                        new_run.font.italic = font_italic
+                    if font_color:
+                        new_run.font.color.rgb = font_color
+            else:
+                # Single line text
+                new_run = paragraph.add_run(new_full_text)
+                if font_name:
+                    new_run.font.name = font_name
+                if font_size:
+                    new_run.font.size = font_size
+                if font_bold:
+                    new_run.font.bold = font_bold
+                if font_italic:
+                    new_run.font.italic = font_italic
+                if font_color:
+                    new_run.font.color.rgb = font_color
+        else:
+            # If no runs, just set paragraph text
+            paragraph.text = new_full_text
     
-    def find_and_insert_table_after_text(self, doc, search_text: str, table_data: list, headers: list, title: str = None) -> bool:
+    def find_and_insert_table_after_text(self, doc, search_text: str, table_data: list, headers: list, title: str = None,
+                                         index: ParagraphIndex = None) -> bool:
         """Find text and insert table after it"""
         try:
             inserted = False
+            if index is None:
+                index = ParagraphIndex(doc)
             
             # Search through all paragraphs
-            for i, paragraph in enumerate(doc.paragraphs):
-                if search_text in paragraph.text:
-                    logger.info(f"Found search text: '{search_text}' in paragraph {i}")
-                    
-                    # Clear the paragraph or replace it with title
-                    paragraph.clear()
-                    if title:
-                        title_run = paragraph.add_run(title)
-                        title_run.font.bold = True
-                        title_run.font.size = Pt(12)
-                        title_run.font.name = 'Arial'
-                    
-                    # Create the table
-                    table = WordTableManager.create_bordered_table(doc, table_data, headers)
-                    if table:
-                        # Insert table after the paragraph
-                        paragraph._element.addnext(table._element)
-                        logger.info(f"✅ Inserted table with {len(table_data)} rows after '{search_text}'")
-                        inserted = True
-                        break
+            for i in index.find(search_text, index.body()):
+                paragraph = index.paragraphs[i]
+                logger.info(f"Found search text: '{search_text}' in paragraph {i}")
+                
+                # Clear the paragraph or replace it with title
+                paragraph.clear()
+                if title:
+                    title_run = paragraph.add_run(title)
+                    title_run.font.bold = True
+                    title_run.font.size = Pt(12)
+                    title_run.font.name = 'Arial'
+                index.refresh(i)
+                
+                # Create the table
+                table = WordTableManager.create_bordered_table(doc, table_data, headers)
+                if table:
+                    # Insert table after the paragraph
+                    paragraph._element.addnext(table._element)
+                    logger.info(f"✅ Inserted table with {len(table_data)} rows after '{search_text}'")
+                    inserted = True
+                    break
             
             # If not found in paragraphs, search in table cells
             if not inserted:
-                for table in doc.tables:
-                    for row in table.rows:
-                        for cell in row.cells:
-                            for paragraph in cell.paragraphs:
-                                if search_text in paragraph.text:
-                                    # Replace with a summary
-                                    paragraph.clear()
-                                    summary_text = f"{title}: {len(table_data)} items" if title else f"Table with {len(table_data)} rows"
-                                    paragraph.text = summary_text
-                                    logger.info(f"✅ Replaced placeholder in table cell: '{search_text}'")
-                                    inserted = True
-                                    break
-                            if inserted:
-                                break
-                        if inserted:
-                            break
-                    if inserted:
-                        break
+                for i in index.find(search_text, index.cells()):
+                    paragraph = index.paragraphs[i]
+                    # Replace with a summary
+                    paragraph.clear()
+                    summary_text = f"{title}: {len(table_data)} items" if title else f"Table with {len(table_data)} rows"
+                    paragraph.text = summary_text
+                    index.refresh(i)
+                    logger.info(f"✅ Replaced placeholder in table cell: '{search_text}'")
+                    inserted = True
+                    break
             
             return inserted
             
@@ -943,10 +971,13 @@ class TitlePageWordGenerator:
             logger.error(f"❌ Error inserting table after '{search_text}': {e}")
             return False
     
-    def find_and_replace_testing_section(self, doc, testing_data: list, testing_headers: list) -> bool:
+    def find_and_replace_testing_section(self, doc, testing_data: list, testing_headers: list,
+                                         index: ParagraphIndex = None) -> bool:
         """Specifically handle testing requirements section - CLEAN VERSION WITHOUT REDUNDANT TEXT"""
         try:
             inserted = False
+            if index is None:
+                index = ParagraphIndex(doc)
             
             # Look for multiple possible locations for testing requirements
             search_patterns = [
@@ -960,24 +991,25 @@ class TitlePageWordGenerator:
             ]
             
             for pattern in search_patterns:
-                for i, paragraph in enumerate(doc.paragraphs):
-                    if pattern in paragraph.text and not inserted:
-                        logger.info(f"Found testing pattern: '{pattern}' in paragraph {i}")
-                        
-                        # Clear this paragraph completely - NO INTRO TEXT
-                        paragraph.clear()
+                for i in index.find(pattern, index.body()):
+                    paragraph = index.paragraphs[i]
+                    logger.info(f"Found testing pattern: '{pattern}' in paragraph {i}")
+                    
+                    # Clear this paragraph completely - NO INTRO TEXT
+                    paragraph.clear()
+                    index.refresh(i)
+                    
+                    # Create the table directly without any introduction
+                    table = WordTableManager.create_bordered_table(doc, testing_data, testing_headers)
+                    if table:
+                        # Insert table directly
+                        paragraph._element.addnext(table._element)
+                        logger.info(f"✅ Inserted testing requirements table with {len(testing_data)} rows")
+                        inserted = True
                         
-                        # Create the table directly without any introduction
-                        table = WordTableManager.create_bordered_table(doc, testing_data, testing_headers)
-                        if table:
-                            # Insert table directly
-                            paragraph._element.addnext(table._element)
-                            logger.info(f"✅ Inserted testing requirements table with {len(testing_data)} rows")
-                            inserted = True
-                            
-                            # Clean up any remaining testing-related paragraphs - ENHANCED CLEANUP
-                            self._cleanup_testing_paragraphs_aggressive(doc, i)
-                            break
+                        # Clean up any remaining testing-related paragraphs - ENHANCED CLEANUP
+                        self._cleanup_testing_paragraphs_aggressive(doc, i, index)
+                        break
                 
                 if inserted:
                     break
@@ -988,7 +1020,7 @@ class TitlePageWordGenerator:
             logger.error(f"❌ Error replacing testing section: {e}")
             return False
     
-    def _cleanup_testing_paragraphs_aggressive(self, doc, start_index: int):
+    def _cleanup_testing_paragraphs_aggressive(self, doc, start_index: int, index: ParagraphIndex = None):
         """Aggressively clean up ALL testing-related paragraphs that might contain redundant content"""
         cleanup_patterns = [
             'Prioritas Tinggi:',
@@ -1014,31 +1046,32 @@ class TitlePageWordGenerator:
             'performance, edge cases'
         ]
         
+        if index is None:
+            index = ParagraphIndex(doc)
         paragraphs_to_clean = []
         
         # Look for paragraphs that contain ANY of the cleanup patterns - EXPAND SEARCH RANGE
-        for i in range(max(0, start_index - 5), min(start_index + 30, len(doc.paragraphs))):
-            if i < len(doc.paragraphs):
-                paragraph = doc.paragraphs[i]
-                paragraph_text = paragraph.text.strip()
-                
-                # Check if paragraph contains any cleanup pattern
-                for pattern in cleanup_patterns:
-                    if pattern in paragraph_text:
-                        paragraphs_to_clean.append(paragraph)
-                        logger.info(f"Marked for cleanup: '{paragraph_text[:50]}...'")
-                        break
-                
-                # Also clean paragraphs that are mostly just priority breakdowns
-                if len(paragraph_text) > 50 and any(word in paragraph_text.lower() for word in ['prioritas', 'skenario', 'authorization', 'functional']):
-                    if paragraph not in paragraphs_to_clean:
-                        paragraphs_to_clean.append(paragraph)
-                        logger.info(f"Marked priority content for cleanup: '{paragraph_text[:50]}...'")
+        for i in range(max(0, start_index - 5), min(start_index + 30, index.body_count)):
+            paragraph_text = index.texts[i].strip()
+            
+            # Check if paragraph contains any cleanup pattern
+            for pattern in cleanup_patterns:
+                if pattern in paragraph_text:
+                    paragraphs_to_clean.append(i)
+                    logger.info(f"Marked for cleanup: '{paragraph_text[:50]}...'")
+                    break
+            
+            # Also clean paragraphs that are mostly just priority breakdowns
+            if len(paragraph_text) > 50 and any(word in paragraph_text.lower() for word in ['prioritas', 'skenario', 'authorization', 'functional']):
+                if i not in paragraphs_to_clean:
+                    paragraphs_to_clean.append(i)
+                    logger.info(f"Marked priority content for cleanup: '{paragraph_text[:50]}...'")
         
         # Clean the paragraphs
-        for paragraph in paragraphs_to_clean:
-            original_text = paragraph.text[:50] if paragraph.text else "empty"
-            paragraph.clear()
+        for i in paragraphs_to_clean:
+            original_text = index.texts[i][:50] if index.texts[i] else "empty"
+            index.paragraphs[i].clear()
+            index.refresh(i)
             logger.info(f"✅ Cleaned up testing paragraph: '{original_text}...'")
     
     def generate_with_proper_tables(self, title_info: dict, output_path: str) -> bool:
@@ -1048,8 +1081,9 @@ class TitlePageWordGenerator:
             return False
         
         try:
-            # Open the template document
-            doc = DocxDocument(self.template_path)
+            # Clone the parsed template instead of unzipping and parsing it for every document
+            template = TemplateCache.shared().get(self.template_path)
+            doc = template.clone()
             logger.info(f"📄 Opened template: {self.template_path}")
 
             print("[Debug] title_info", title_info)
@@ -1057,8 +1091,11 @@ class TitlePageWordGenerator:
             filename = title_info.get('file_name', '').strip()      # e.g. "Laporan tunjangan & potongan tidak tetap"
             new_heading = f"{ricefw} {filename}"
             print("[Debug] New heading:", new_heading)
-            for paragraph in doc.paragraphs:
-                print("[Debug] paragraph", paragraph.text)
+            # The placeholder index points straight at the body paragraphs carrying the title marker
+            for location in template.locations("(Nama File)"):
+                if location[0] != 'body':
+                    continue
+                paragraph = paragraph_at(doc, location)
                 if paragraph.text.strip().endswith("(Nama File)"):
                     print("[Debug] Found placeholder for title:", paragraph.text.strip().endswith("(Nama File)"))
                     # replace entire placeholder line with our dynamic heading
@@ -1141,51 +1178,21 @@ class TitlePageWordGenerator:
                 '{{menu_path}}': title_info.get('test_menu_path', 'N/A')
             }
 
-            file_pattern = re.compile(r"RHR\d+[^\n]*\(Nama File\)")
-            doc_pattern = re.compile(r"RHR\d+\s*\(DAPI ID\)\s*Functional Specification Design \(FSD\)")
-            
-            # Replace standard text in all paragraphs
-            for paragraph in doc.paragraphs:
-                for old_text, new_text in replacements.items():
-                    if old_text in paragraph.text:
-                        self.replace_text_preserve_formatting(paragraph, old_text, new_text)
-            
-            match_file = file_pattern.search(paragraph.text)
-            if match_file:
-                self.replace_text_preserve_formatting(
-                    paragraph,
-                    match_file.group(),
-                    f"{title_info.get('ricefw_id', 'RHR041')} {title_info.get('file_name', 'Process')}"
-                )
-
-            match_doc = doc_pattern.search(paragraph.text)
-            if match_doc:
-                self.replace_text_preserve_formatting(
-                    paragraph,
-                    match_doc.group(),
-                    title_info.get('document_type', 'Functional Specification Design (FSD)')
-                )
-            # Replace text in table cells
-            for table in doc.tables:
-                for row_idx, row in enumerate(table.rows):
-                    for cell_idx, cell in enumerate(row.cells):
-                        for paragraph in cell.paragraphs:
-                            # Apply standard replacements
-                            for old_text, new_text in replacements.items():
-                                if old_text in paragraph.text:
-                                    self.replace_text_preserve_formatting(paragraph, old_text, new_text)
-                            
-                            # Handle version history date
-                            if ("AI Generated" in paragraph.text or "0.01" in paragraph.text) and paragraph.text.strip() == "":
-                                row_texts = [c.text.strip() for c in row.cells]
-                                if any("0.01" in text or "AI Generated" in text for text in row_texts):
-                                    if cell_idx == len(row.cells) - 1:
-                                        paragraph.text = title_info.get('generated_date', '')
-                            
-                            if paragraph.text.strip() == "":
-                                row_texts = [c.text.strip() for c in row.cells]
-                                if "AI Generated" in " ".join(row_texts) and cell_idx == len(row.cells) - 1:
-                                    paragraph.text = title_info.get('generated_date', '')
+            # One pass over the body and then the table cells, every placeholder matched at once
+            index = ParagraphIndex(doc)
+            replacement_pattern = compile_replacements(replacements)
+            for i, location in enumerate(index.locations):
+                paragraph = index.paragraphs[i]
+                if self.replace_all_preserve_formatting(paragraph, index.texts[i], replacement_pattern, replacements):
+                    index.refresh(i)
+                
+                # Handle version history date: the empty last cell of the "AI Generated" row
+                if location[0] == 'table' and index.texts[i].strip() == "":
+                    _, table_idx, row_idx, cell_idx, _ = location
+                    cells = index.row_cells[(table_idx, row_idx)]
+                    if cell_idx == len(cells) - 1 and "AI Generated" in " ".join(c.text.strip() for c in cells):
+                        paragraph.text = title_info.get('generated_date', '')
+                        index.refresh(i)
             
             # CREATE AND INSERT TABLES - CLEAN VERSION
             
@@ -1198,7 +1205,8 @@ class TitlePageWordGenerator:
                     'Selection Screen', 
                     selection_data, 
                     selection_headers, 
-                    "Selection Screen:"
+                    "Selection Screen:",
+                    index=index
                 )
             
             # 2. Handle Detail Processing table
@@ -1210,7 +1218,8 @@ class TitlePageWordGenerator:
                     'Detail Processing',
                     detail_data,
                     detail_headers,
-                    "Detail Processing:"
+                    "Detail Processing:",
+                    index=index
                 )
 
             # 2b. Handle additional design tables
@@ -1222,7 +1231,8 @@ class TitlePageWordGenerator:
                     'Detail Process Only valid datasets',
                     valid_data,
                     valid_headers,
-                    "Detail Process Only valid datasets:"
+                    "Detail Process Only valid datasets:",
+                    index=index
                 )
 
             country_data, country_headers = self.create_data_condition_table_data(title_info.get('country_info_table', []))
@@ -1233,7 +1243,8 @@ class TitlePageWordGenerator:
                     'Form Get_Country_Info',
                     country_data,
                     country_headers,
-                    "Form Get_Country_Info:"
+                    "Form Get_Country_Info:",
+                    index=index
                 )
 
             c500c_data, c500c_headers = self.create_data_condition_table_data(title_info.get('currency_t500c_table', []))
@@ -1244,7 +1255,8 @@ class TitlePageWordGenerator:
                     'Form Get_Currency_T500C',
                     c500c_data,
                     c500c_headers,
-                    "Form Get_Currency_T500C:"
+                    "Form Get_Currency_T500C:",
+                    index=index
                 )
 
             c001_data, c001_headers = self.create_data_condition_table_data(title_info.get('currency_t001_table', []))
@@ -1255,7 +1267,8 @@ class TitlePageWordGenerator:
                     'Form Get_Currency_T001',
                     c001_data,
                     c001_headers,
-                    "Form Get_Currency_T001:"
+                    "Form Get_Currency_T001:",
+                    index=index
                 )
             
             # 4. Handle Error Handling table
@@ -1269,17 +1282,18 @@ class TitlePageWordGenerator:
                     '{{potensi_error}}', 
                     error_data, 
                     error_headers, 
-                    "Potensi Error:"
+                    "Potensi Error:",
+                    index=index
                 )
                 
                 # Also replace any placeholder for notification procedures
-                for paragraph in doc.paragraphs:
-                    if '[*Masukkan deskripsi tentang error log, laporan, dan/atau pesan yang relevan.*]' in paragraph.text:
-                        self.replace_text_preserve_formatting(
-                            paragraph, 
-                            '[*Masukkan deskripsi tentang error log, laporan, dan/atau pesan yang relevan.*]',
-                            'Error akan dicatat dalam log sistem SAP dan dapat dilihat melalui transaction ST22 (Dump Analysis) atau SLG1 (Application Log).'
-                        )
+                for i in index.find('[*Masukkan deskripsi tentang error log, laporan, dan/atau pesan yang relevan.*]', index.body()):
+                    self.replace_text_preserve_formatting(
+                        index.paragraphs[i], 
+                        '[*Masukkan deskripsi tentang error log, laporan, dan/atau pesan yang relevan.*]',
+                        'Error akan dicatat dalam log sistem SAP dan dapat dilihat melalui transaction ST22 (Dump Analysis) atau SLG1 (Application Log).'
+                    )
+                    index.refresh(i)
             
             # 5. Handle Testing Requirements table - CLEAN VERSION WITH NO REDUNDANT TEXT
             testing_data, testing_headers = self.create_testing_requirements_table_data(title_info.get('testing_requirements_table', []))
@@ -1287,7 +1301,7 @@ class TitlePageWordGenerator:
                 logger.info(f"🔧 Creating Testing Requirements table with {len(testing_data)} rows - CLEAN VERSION")
                 
                 # Use the specialized testing section replacement method that removes redundant text
-                testing_inserted = self.find_and_replace_testing_section(doc, testing_data, testing_headers)
+                testing_inserted = self.find_and_replace_testing_section(doc, testing_data, testing_headers, index)
                 
                 if not testing_inserted:
                     # Fallback: try the regular method
@@ -1296,7 +1310,8 @@ class TitlePageWordGenerator:
                         '{{kondisi_pengujian_tabel}}', 
                         testing_data, 
                         testing_headers, 
-                        None  # NO TITLE to avoid redundancy
+                        None,  # NO TITLE to avoid redundancy
+                        index=index
                     )
             
             # ENHANCED Final cleanup: remove any remaining placeholders and redundant text
@@ -1317,24 +1332,28 @@ class TitlePageWordGenerator:
                 '[*Masukkan kondisi fungsional yang diperlukan untuk pengujian.*]'
             ]
             
-            for paragraph in doc.paragraphs:
-                original_text = paragraph.text
+            removal_pattern = re.compile('|'.join(re.escape(placeholder) for placeholder in placeholders_to_remove))
+            
+            for i in index.body():
+                paragraph = index.paragraphs[i]
+                original_text = text = index.texts[i]
                 should_clear = False
                 
-                for placeholder in placeholders_to_remove:
-                    if placeholder in paragraph.text:
+                for placeholder in (placeholders_to_remove if removal_pattern.search(text) else []):
+                    if placeholder in text:
                         # If the paragraph is mostly the placeholder, clear it entirely
-                        if len(paragraph.text.strip()) <= len(placeholder) + 50:
+                        if len(text.strip()) <= len(placeholder) + 50:
                             should_clear = True
                             break
                         else:
                             # Remove the placeholder but keep other text
-                            paragraph.text = paragraph.text.replace(placeholder, '').strip()
+                            paragraph.text = text.replace(placeholder, '').strip()
+                            text = index.refresh(i)
                 
                 # Clear paragraphs that are mostly redundant testing content
-                if not should_clear and paragraph.text.strip():
-                    text_lower = paragraph.text.lower()
-                    if (len(paragraph.text.strip()) < 200 and 
+                if not should_clear and text.strip():
+                    text_lower = text.lower()
+                    if (len(text.strip()) < 200 and 
                         any(phrase in text_lower for phrase in ['prioritas tinggi', 'prioritas menengah', 'prioritas rendah', 'skenario']) and
                         any(phrase in text_lower for phrase in ['authorization', 'functional', 'performance'])):
                         should_clear = True
@@ -1342,6 +1361,7 @@ class TitlePageWordGenerator:
                 if should_clear:
                     logger.info(f"Clearing redundant paragraph: '{original_text[:50]}...'")
                     paragraph.clear()
+                    index.refresh(i)
             
             # Save the document
             doc.save(output_path)
@@ -1426,25 +1446,35 @@ class TitlePageGenerator:
         self.template_path = template_path
         self.word_generator = TitlePageWordGenerator(template_path)
     
-    def generate_complete_document(self, markdown_path: str, output_dir: str) -> dict:
-        """Generate complete documents with proper Word tables from markdown"""
+    def generate_complete_document(self, markdown_path: str, output_dir: str, title_info: dict = None,
+                                   base_filename: str = None) -> dict:
+        """Generate complete documents with proper Word tables from markdown.
+        
+        With title_info (built straight from the FSD document) the markdown is not read at all.
+        With base_filename the document is named after it, so parallel renders of the
+        same program never write to the same file.
+        """
         try:
             # Create output directory
             Path(output_dir).mkdir(parents=True, exist_ok=True)
             
-            # Read markdown file
-            logger.info(f"📖 Reading markdown file: {markdown_path}")
-            with open(markdown_path, 'r', encoding='utf-8') as f:
-                markdown_content = f.read()
-            
-            # Extract title information
-            logger.info("🔍 Extracting title and document information...")
-            extractor = MarkdownTitleExtractor(markdown_content)
-            title_info = extractor.extract_title_info()
+            if title_info is None:
+                # Read markdown file
+                logger.info(f"📖 Reading markdown file: {markdown_path}")
+                with open(markdown_path, 'r', encoding='utf-8') as f:
+                    markdown_content = f.read()
+                
+                # Extract title information
+                logger.info("🔍 Extracting title and document information...")
+                extractor = MarkdownTitleExtractor(markdown_content)
+                title_info = extractor.extract_title_info()
             
-            # Generate timestamp for unique filenames
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            base_filename = f"FSD_Complete_{title_info.get('program_name', 'Document')}_{timestamp}"
+            if base_filename:
+                base_filename = f"{base_filename}_complete"
+            else:
+                # Generate timestamp for unique filenames
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                base_filename = f"FSD_Complete_{title_info.get('program_name', 'Document')}_{timestamp}"
             
             # Generate Word document with proper tables
             logger.info("📝 Generating Word document with CLEAN bordered tables...")
@@ -0,0 +1,110 @@
+import os
+import logging
+import threading
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+import openpyxl
+
+logger = logging.getLogger(__name__)
+
+ID_COLUMN = 'SAP WRICEF ID'
+
+
+class RequirementListIndex:
+    """Requirement-List workbook indexed in memory by SAP WRICEF ID.
+
+    The active sheet is streamed once in read-only mode into a dict of
+    ID -> {column header: value}. Every lookup compares the file's mtime
+    and size with the loaded snapshot and reloads when the workbook was
+    replaced, so an updated list is picked up without a restart. Use
+    shared() to get the one index per workbook path that all generators
+    and requests share.
+    """
+
+    _shared: Dict[str, "RequirementListIndex"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, excel_path: str):
+        self.excel_path = str(excel_path)
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.loads = 0
+        self._signature: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, excel_path: str) -> "RequirementListIndex":
+        """Process-wide index for a workbook path"""
+        key = os.path.abspath(str(excel_path))
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(key)
+            return cls._shared[key]
+
+    def _current_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.excel_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _ensure_loaded(self) -> Dict[str, Dict[str, Any]]:
+        signature = self._current_signature()
+        with self._lock:
+            if signature is None:
+                self.rows, self._signature = {}, None
+            elif signature != self._signature:
+                self.rows = self._load()
+                self._signature = signature
+            return self.rows
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        rows = {}
+        try:
+            wb = openpyxl.load_workbook(self.excel_path, read_only=True, data_only=True)
+            try:
+                row_values = wb.active.iter_rows(values_only=True)
+                headers = [str(header).strip() if header is not None else '' for header in next(row_values, ())]
+                if ID_COLUMN not in headers:
+                    logger.warning(f"Requirement list {self.excel_path} has no '{ID_COLUMN}' column")
+                    return rows
+                id_idx = headers.index(ID_COLUMN)
+                for row in row_values:
+                    if id_idx >= len(row) or row[id_idx] is None:
+                        continue
+                    # First row wins for duplicated IDs, as the linear scan did
+                    rows.setdefault(str(row[id_idx]).strip(), {
+                        header: value for header, value in zip(headers, row) if header
+                    })
+            finally:
+                wb.close()
+        except Exception as exc:
+            logger.warning(f"Failed to load requirement list {self.excel_path}: {exc}")
+            return rows
+        self.loads += 1
+        logger.info(f"Indexed {len(rows)} requirements from {self.excel_path}")
+        return rows
+
+    def get(self, ricefw_id: str) -> Optional[Dict[str, Any]]:
+        """All columns of the requirement row, or None"""
+        return self._ensure_loaded().get(str(ricefw_id).strip())
+
+    def lookup(self, ricefw_id: str, column: str) -> Optional[str]:
+        """Stripped text of one column for an ID, or None when the ID or value is missing"""
+        row = self.get(ricefw_id)
+        if not row or row.get(column) is None:
+            return None
+        return str(row[column]).strip()
+
+    def lookup_many(self, ricefw_ids: Iterable[str], column: str = None) -> Dict[str, Any]:
+        """Rows (or one column) for several IDs against a single snapshot; unknown IDs are left out"""
+        rows = self._ensure_loaded()
+        results = {}
+        for ricefw_id in ricefw_ids:
+            row = rows.get(str(ricefw_id).strip())
+            if row is None:
+                continue
+            if column is None:
+                results[ricefw_id] = row
+            elif row.get(column) is not None:
+                results[ricefw_id] = str(row[column]).strip()
+        return results
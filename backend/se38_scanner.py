@@ -0,0 +1,161 @@
+import re
+import mmap
+import logging
+from html.entities import html5
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Marker of SAP's SE38 "Code listing for: <program>" HTML export
+SE38_LISTING_MARKER = b'Code listing for:'
+
+# Comments, or a start/end tag with its name and raw attributes
+TAG_PATTERN = re.compile(rb'<!--.*?-->|<(/?)([a-zA-Z][^\s/>]*)([^>]*)>', re.DOTALL)
+CLASS_PATTERN = re.compile(rb'''\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))''', re.IGNORECASE)
+
+# Same reference syntax html.parser reports to BeautifulSoup (the ';' is optional there too)
+CHARREF_PATTERN = re.compile(r'&#([0-9]+|[xX][0-9a-fA-F]+);?|&([a-zA-Z][-.a-zA-Z0-9]*);?')
+
+# html5 entity names without the trailing ';', as BeautifulSoup resolves them
+ENTITY_CHARACTERS = {}
+for _name, _character in sorted(html5.items()):
+    ENTITY_CHARACTERS.setdefault(_name.rstrip(';'), _character)
+
+HEADING_TAGS = ('title', 'h2', 'h3')
+
+
+def _resolve_reference(match: re.Match) -> str:
+    number, name = match.groups()
+    if name is not None:
+        # Unknown entities keep their name but lose the ';', like BeautifulSoup's html.parser builder
+        return ENTITY_CHARACTERS.get(name, f"&{name}")
+    code_point = int(number[1:], 16) if number[0] in 'xX' else int(number)
+    if code_point < 256:
+        try:
+            return bytes([code_point]).decode('windows-1252')
+        except UnicodeDecodeError:
+            pass
+    try:
+        return chr(code_point)
+    except (ValueError, OverflowError):
+        return '\N{REPLACEMENT CHARACTER}'
+
+
+def _decode_text(data: bytes) -> str:
+    """Text node bytes as BeautifulSoup would hand them out for a UTF-8 file read in text mode"""
+    text = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    return CHARREF_PATTERN.sub(_resolve_reference, text) if '&' in text else text
+
+
+def _classes(attributes: bytes) -> List[bytes]:
+    match = CLASS_PATTERN.search(attributes)
+    if not match:
+        return []
+    value = next(group for group in match.groups() if group is not None)
+    return value.split() or [value]
+
+
+def is_se38_listing(file_path: str, sniff_bytes: int = 65536) -> bool:
+    """True when the file head carries the SE38 export marker"""
+    with open(file_path, 'rb') as f:
+        return SE38_LISTING_MARKER in f.read(sniff_bytes)
+
+
+class SE38ListingScanner:
+    """Single-pass scanner for SE38 "Code listing for:" HTML exports.
+
+    The file is memory-mapped and walked tag by tag without building a DOM;
+    only text inside div.code / div.codeComment and the first title/h2/h3
+    is decoded. Text, entity and newline handling follow BeautifulSoup's
+    html.parser builder so the result matches the DOM-based extraction for
+    the well-formed markup SAP writes. Markup outside that layout (unclosed
+    or implicitly closed elements) is not repaired like a full parser would.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def scan(self) -> Dict[str, str]:
+        with open(self.file_path, 'rb') as f:
+            if not f.seek(0, 2):
+                return self._result([], [], {})
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return self._scan(data)
+
+    def _scan(self, data) -> Dict[str, str]:
+        # Captures are [kind, start position, text pieces]; nested captures all receive the text
+        code_blocks, comment_blocks = [], []
+        headings: Dict[str, List[str]] = {}
+        div_stack: List[Optional[list]] = []
+        open_heading: Optional[list] = None
+        active: List[list] = []
+        position = 0
+
+        for match in TAG_PATTERN.finditer(data):
+            if active and match.start() > position:
+                text = _decode_text(data[position:match.start()])
+                for capture in active:
+                    capture[2].append(text)
+            position = match.end()
+
+            tag_name = match.group(2)
+            if tag_name is None:
+                continue  # comment, never part of get_text()
+            tag_name = tag_name.lower().decode('ascii', 'replace')
+            closing = bool(match.group(1))
+            attributes = match.group(3)
+
+            if tag_name == 'div':
+                if closing:
+                    capture = div_stack.pop() if div_stack else None
+                    if capture is not None:
+                        active.remove(capture)
+                        (code_blocks if capture[0] == 'code' else comment_blocks).append(capture)
+                elif not attributes.rstrip().endswith(b'/'):
+                    classes = _classes(attributes)
+                    kind = 'code' if b'code' in classes else 'comment' if b'codeComment' in classes else None
+                    capture = [kind, match.start(), []] if kind else None
+                    div_stack.append(capture)
+                    if capture is not None:
+                        active.append(capture)
+            elif tag_name in HEADING_TAGS:
+                if not closing and open_heading is None and tag_name not in headings:
+                    open_heading = [tag_name, match.start(), []]
+                    active.append(open_heading)
+                elif closing and open_heading is not None and open_heading[0] == tag_name:
+                    active.remove(open_heading)
+                    headings[tag_name] = open_heading[2]
+                    open_heading = None
+
+        # Unclosed elements run to the end of the document
+        if active and len(data) > position:
+            text = _decode_text(data[position:])
+            for capture in active:
+                capture[2].append(text)
+        for capture in active:
+            if capture is open_heading:
+                headings[capture[0]] = capture[2]
+            else:
+                (code_blocks if capture[0] == 'code' else comment_blocks).append(capture)
+        return self._result(code_blocks, comment_blocks, headings)
+
+    @staticmethod
+    def _result(code_blocks: List[list], comment_blocks: List[list], headings: Dict[str, List[str]]) -> Dict[str, str]:
+        # Document order is the order of the start tags, as with find_all()
+        def joined(blocks: List[list]) -> str:
+            return '\n'.join(''.join(block[2]) for block in sorted(blocks, key=lambda block: block[1]))
+
+        heading_text = {name: ''.join(pieces) for name, pieces in headings.items()}
+        if 'title' in heading_text:
+            title = heading_text['title'].strip()
+        elif 'h2' in heading_text:
+            title = heading_text['h2'].replace('Code listing for: ', '').strip()
+        else:
+            title = ''
+        description = heading_text['h3'].replace('Description: ', '').strip() if 'h3' in heading_text else ''
+        return {
+            'raw_code': joined(code_blocks),
+            'raw_comments': joined(comment_blocks),
+            'html_title': title,
+            'html_description': description
+        }